@@ -0,0 +1,123 @@
+import argparse
+import statistics
+import threading
+import time
+
+from benchmarks.load_test import percentile
+from src.batching import MicroBatcher
+
+"""
+Load generator comparing the llm called request by request with the llm
+behind a MicroBatcher. Run it from the LLM_GALLERY folder:
+    python -m benchmarks.batching_benchmark --concurrency 16
+By default it uses a fake llm whose cost is mostly per decoding step, like a
+GPU bound model. Pass --model with a small huggingface model (for instance
+sshleifer/tiny-gpt2) to benchmark a real pipeline on CPU.
+"""
+
+
+class FakeLLM:
+    """Simulate a text-generation pipeline: each decoding step costs
+    step_s whatever the batch size, plus a small cost per sequence
+    """
+
+    tokenizer = None
+
+    def __init__(self, new_tokens: int = 32, step_s: float = 0.002):
+        self.new_tokens = new_tokens
+        self.step_s = step_s
+        # a single GPU runs one generation at a time
+        self._device = threading.Lock()
+
+    def __call__(self, inputs, batch_size: int = 1, **generate_kwargs):
+        batch = inputs if isinstance(inputs, list) else [inputs]
+        with self._device:
+            time.sleep(self.new_tokens * self.step_s * (1 + 0.05 * (len(batch) - 1)))
+        outputs = [
+            [{"generated_text": " ".join(["token"] * self.new_tokens)}]
+            for _ in batch
+        ]
+        return outputs if isinstance(inputs, list) else outputs[0]
+
+
+def run_load(llm, count_tokens, concurrency: int, requests: int, prompt: str) -> dict:
+    """Send `requests` calls from `concurrency` threads and measure them"""
+    latencies = []
+    tokens = []
+    lock = threading.Lock()
+    remaining = iter(range(requests))
+
+    def worker():
+        while True:
+            with lock:
+                if next(remaining, None) is None:
+                    return
+            start = time.perf_counter()
+            output = llm(prompt, max_new_tokens=32, return_full_text=False)
+            latency = time.perf_counter() - start
+            with lock:
+                latencies.append(latency)
+                tokens.append(count_tokens(output[0]["generated_text"]))
+
+    start = time.perf_counter()
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    duration = time.perf_counter() - start
+    return {
+        "requests": len(latencies),
+        "p50_s": statistics.median(latencies),
+        "p99_s": percentile(latencies, 99),
+        "tokens_per_s": sum(tokens) / duration,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Compare the llm latency with and without micro-batching"
+    )
+    parser.add_argument("--model", default=None, help="huggingface model id")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--requests", type=int, default=128)
+    parser.add_argument("--max-batch-size", type=int, default=8)
+    parser.add_argument("--max-wait-ms", type=float, default=10)
+    parser.add_argument("--padding-side", default="left")
+    args = parser.parse_args()
+
+    if args.model is None:
+        llm = FakeLLM()
+
+        def count_tokens(text):
+            return len(text.split())
+
+    else:
+        from transformers import pipeline
+
+        llm = pipeline("text-generation", model=args.model)
+
+        def count_tokens(text):
+            return len(llm.tokenizer.encode(text))
+
+    prompt = "Quel est le plus gros animal au monde?"
+    baseline = run_load(llm, count_tokens, args.concurrency, args.requests, prompt)
+    batcher = MicroBatcher(
+        llm,
+        max_batch_size=args.max_batch_size,
+        max_wait_ms=args.max_wait_ms,
+        padding_side=args.padding_side,
+    )
+    batched = run_load(batcher, count_tokens, args.concurrency, args.requests, prompt)
+
+    for name, result in [("without batching", baseline), ("with batching", batched)]:
+        print(
+            f"{name:>17}: p50 {result['p50_s'] * 1000:.1f}ms "
+            f"p99 {result['p99_s'] * 1000:.1f}ms "
+            f"{result['tokens_per_s']:.1f} tokens/s"
+        )
+    print("batches:", batcher.stats)
+
+
+if __name__ == "__main__":
+    main()
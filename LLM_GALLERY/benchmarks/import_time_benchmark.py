@@ -0,0 +1,122 @@
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+"""
+Measure with python -X importtime how long importing the gallery modules
+takes, and check that it imports neither torch nor transformers nor
+huggingface_hub and loads no model. Run it from the LLM_GALLERY folder:
+    python -m benchmarks.import_time_benchmark --max-ms 300
+Each import runs --repeat times in a new process and the median is kept.
+The command fails when a module does not import, takes more than --max-ms
+or imports a heavy package, so it can guard against regressions, and --output writes
+the results as json to compare runs. With --heavy, the import time of the
+heavy packages installed is also given, for reference.
+"""
+
+HEAVY_MODULES = ("torch", "transformers", "huggingface_hub", "bitsandbytes")
+
+MODULES = {
+    "src.endpoint": "import src.endpoint",
+    "src.deploy_llm_easy": "import src.deploy_llm_easy",
+}
+for folder in sorted(os.listdir("pipelines")):
+    if os.path.exists(os.path.join("pipelines", folder, "func_used.py")):
+        # func_used.py is run from its folder by the platform
+        MODULES[f"{folder}/func_used"] = (
+            f"import sys; sys.path.insert(0, 'pipelines/{folder}'); import func_used"
+        )
+
+
+def import_time(code: str, module: str) -> dict:
+    """This function runs an import in a new process under -X importtime
+
+    Args:
+        code (str): python code importing the module
+        module (str): name of the top-level module imported
+
+    Returns:
+        dict: ms, the cumulative import time of the module, and the
+            heavy modules it imported
+    """
+    env = dict(os.environ, LLM_WARMUP="off", LLM_WARMUP_MODELS="")
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        capture_output=True,
+        text=True,
+        env=env,
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"{code} failed:\n{result.stderr[-2000:]}")
+    ms = None
+    imported = set()
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line.split("|")
+        name = name.strip()
+        imported.add(name.split(".")[0])
+        if name == module:
+            ms = int(cumulative) / 1000
+    return {"ms": ms, "heavy": sorted(imported & set(HEAVY_MODULES))}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the import time")
+    parser.add_argument("--max-ms", type=float, default=300)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--heavy", action="store_true")
+    parser.add_argument("--output", default=None)
+    args = parser.parse_args()
+
+    modules = dict(MODULES)
+    if args.heavy:
+        for name in HEAVY_MODULES:
+            modules[name] = f"import {name}"
+
+    results = {}
+    failures = []
+    print(f"{'module':>35} {'median ms':>10} {'max ms':>8}  heavy imports")
+    for name, code in modules.items():
+        top_module = code.split("import ")[-1]
+        try:
+            runs = [import_time(code, top_module) for _ in range(args.repeat)]
+        except RuntimeError as e:
+            print(f"{name:>35} not importable: {str(e).splitlines()[-1]}")
+            # a heavy package may be missing, a gallery module must import
+            if name not in HEAVY_MODULES:
+                failures.append(f"{name} fails to import")
+            continue
+        times = [run["ms"] for run in runs]
+        results[name] = {
+            "median_ms": statistics.median(times),
+            "max_ms": max(times),
+            "heavy": runs[0]["heavy"],
+        }
+        print(
+            f"{name:>35} {results[name]['median_ms']:>10.1f} "
+            f"{results[name]['max_ms']:>8.1f}  {', '.join(runs[0]['heavy']) or '-'}"
+        )
+        if name in HEAVY_MODULES:
+            continue
+        if results[name]["median_ms"] > args.max_ms:
+            failures.append(f"{name} takes {results[name]['median_ms']:.0f}ms")
+        if results[name]["heavy"]:
+            failures.append(f"{name} imports {', '.join(results[name]['heavy'])}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+    if failures:
+        print(f"import regression (limit {args.max_ms:.0f}ms):")
+        for failure in failures:
+            print(f"- {failure}")
+        sys.exit(1)
+    print(f"all the gallery modules import in less than {args.max_ms:.0f}ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,274 @@
+import argparse
+import importlib
+import json
+import os
+import random
+import resource
+import sys
+import threading
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+"""
+Load test of the gallery endpoints. Run it from the LLM_GALLERY folder:
+    python -m benchmarks.load_test fake --mode closed --concurrency 8
+    python -m benchmarks.load_test func:pipelines.llama3_8B_deploy.func_used:stream_llama_easy
+    python -m benchmarks.load_test stub --mode open --rate 20
+    python -m benchmarks.load_test http://host/endpoints/llm-llama3-8b --token $TOKEN
+    python -m benchmarks.load_test sdk:llm-llama3-8b
+In closed loop mode, `concurrency` workers send a new request as soon as
+their previous one is answered. In open loop mode, requests arrive at
+`rate` per second following a Poisson process whatever the answer times,
+and latencies count from the scheduled arrival.
+The results are printed as json, written to --output when it is given, and
+can be compared with a previous run with --compare.
+"""
+
+QUESTIONS = [
+    "Quel est le plus gros animal au monde?",
+    "What is the capital of France?",
+    "Explain in a few sentences how a transformer model works.",
+    "Give me three ideas of names for a bakery.",
+]
+
+
+def percentile(values: list, q: float) -> float:
+    if not values:
+        return None
+    values = sorted(values)
+    index = min(len(values) - 1, max(0, round(q / 100 * (len(values) - 1))))
+    return values[index]
+
+
+def count_tokens(text) -> int:
+    """Approximate token count of an answer, by whitespace splitting"""
+    return len(str(text).split())
+
+
+def _fake_target(delay_s: float = 0.05):
+    def call(message: str) -> dict:
+        time.sleep(delay_s * random.uniform(0.5, 1.5))
+        return {"results": "token " * 32}
+
+    return call
+
+
+def function_target(path: str):
+    """Import the endpoint function module:function. A function returning
+    an iterator (like stream_llama_easy) is measured chunk by chunk.
+    """
+    module_name, function_name = path.rsplit(":", 1)
+    return getattr(importlib.import_module(module_name), function_name)
+
+
+def http_target(url: str, token: str = None, timeout_s: float = 600):
+    headers = {"Content-Type": "application/json"}
+    if token:
+        headers["Authorization"] = f"EndpointToken {token}"
+
+    def call(message: str) -> dict:
+        request = urllib.request.Request(
+            url, data=json.dumps({"message": message}).encode(), headers=headers
+        )
+        with urllib.request.urlopen(request, timeout=timeout_s) as response:
+            return json.load(response)
+
+    return call
+
+
+def sdk_target(deployment_name: str):
+    from craft_ai_sdk import CraftAiSdk
+
+    sdk = CraftAiSdk(
+        sdk_token=os.environ.get("CRAFT_AI_SDK_TOKEN"),
+        environment_url=os.environ.get("CRAFT_AI_ENVIRONMENT_URL"),
+    )
+    token = sdk.get_deployment(deployment_name)["endpoint_token"]
+
+    def call(message: str) -> dict:
+        return sdk.trigger_endpoint(
+            deployment_name, token, inputs={"message": message}
+        )
+
+    return call
+
+
+def start_stub_server(delay_s: float = 0.05, port: int = 0) -> ThreadingHTTPServer:
+    """Start a local HTTP server answering like a gallery endpoint"""
+
+    class StubHandler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            time.sleep(delay_s * random.uniform(0.5, 1.5))
+            body = json.dumps({"outputs": {"results": "token " * 32}}).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", port), StubHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def measure(call, message: str, scheduled: float) -> dict:
+    """Run one request, measuring the time to first chunk for streams"""
+    start = time.perf_counter()
+    ttft = None
+    try:
+        output = call(message)
+        if hasattr(output, "__iter__") and not isinstance(output, (dict, str, list)):
+            text = ""
+            for chunk in output:
+                if ttft is None:
+                    ttft = time.perf_counter() - scheduled
+                text += chunk
+            output = text
+        elif isinstance(output, dict):
+            output = output.get("outputs", output).get("results", output)
+        end = time.perf_counter()
+        return {
+            "latency_s": end - scheduled,
+            "service_s": end - start,
+            "ttft_s": ttft if ttft is not None else end - scheduled,
+            "tokens": count_tokens(output),
+            "error": None,
+        }
+    except Exception as e:
+        return {"latency_s": time.perf_counter() - scheduled, "error": repr(e)}
+
+
+def run_closed_loop(call, concurrency: int, requests: int) -> list:
+    results = []
+    lock = threading.Lock()
+    remaining = iter(range(requests))
+
+    def worker():
+        while True:
+            with lock:
+                index = next(remaining, None)
+            if index is None:
+                return
+            message = QUESTIONS[index % len(QUESTIONS)]
+            result = measure(call, message, time.perf_counter())
+            with lock:
+                results.append(result)
+
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+
+def run_open_loop(call, rate: float, requests: int, max_workers: int) -> list:
+    futures = []
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        scheduled = time.perf_counter()
+        for index in range(requests):
+            scheduled += random.expovariate(rate)
+            time.sleep(max(0.0, scheduled - time.perf_counter()))
+            futures.append(
+                executor.submit(
+                    measure, call, QUESTIONS[index % len(QUESTIONS)], scheduled
+                )
+            )
+    return [future.result() for future in futures]
+
+
+def peak_memory() -> dict:
+    memory = {"peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024}
+    torch = sys.modules.get("torch")
+    if torch is not None and torch.cuda.is_available():
+        memory["peak_gpu_mb"] = torch.cuda.max_memory_allocated() / 1024**2
+    return memory
+
+
+def summarize(results: list, duration_s: float) -> dict:
+    succeeded = [result for result in results if result["error"] is None]
+    latencies = [result["latency_s"] for result in succeeded]
+    ttfts = [result["ttft_s"] for result in succeeded]
+    summary = {
+        "requests": len(results),
+        "errors": len(results) - len(succeeded),
+        "error_rate": (len(results) - len(succeeded)) / len(results) if results else 0,
+        "duration_s": duration_s,
+        "throughput_rps": len(succeeded) / duration_s,
+        "tokens_per_s": sum(result["tokens"] for result in succeeded) / duration_s,
+    }
+    for name, values in [("latency", latencies), ("ttft", ttfts)]:
+        for q in (50, 90, 99):
+            summary[f"{name}_p{q}_s"] = percentile(values, q)
+    summary.update(peak_memory())
+    return summary
+
+
+def compare(summary: dict, baseline: dict):
+    """Print the relative change of each metric against a previous run"""
+    for name, value in summary.items():
+        if name in ("requests", "concurrency", "rate"):
+            continue
+        previous = baseline.get(name)
+        if isinstance(value, (int, float)) and isinstance(previous, (int, float)):
+            change = (value - previous) / previous * 100 if previous else 0.0
+            print(f"{name:>16}: {previous:.4g} -> {value:.4g} ({change:+.1f}%)")
+
+
+def get_target(args):
+    if args.target == "fake":
+        return _fake_target(), None
+    if args.target == "stub":
+        server = start_stub_server()
+        url = f"http://127.0.0.1:{server.server_address[1]}/"
+        return http_target(url), server
+    if args.target.startswith("func:"):
+        return function_target(args.target[len("func:") :]), None
+    if args.target.startswith("sdk:"):
+        return sdk_target(args.target[len("sdk:") :]), None
+    return http_target(args.target, token=args.token), None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test a gallery endpoint")
+    parser.add_argument(
+        "target", help="fake, stub, func:module:function, sdk:deployment or a url"
+    )
+    parser.add_argument("--mode", choices=["closed", "open"], default="closed")
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--rate", type=float, default=2, help="open loop requests/s")
+    parser.add_argument("--requests", type=int, default=50)
+    parser.add_argument("--token", default=None, help="endpoint token of a url")
+    parser.add_argument("--output", default=None, help="results json to write")
+    parser.add_argument("--compare", default=None, help="previous results json")
+    args = parser.parse_args()
+
+    call, server = get_target(args)
+    start = time.perf_counter()
+    if args.mode == "closed":
+        results = run_closed_loop(call, args.concurrency, args.requests)
+    else:
+        results = run_open_loop(call, args.rate, args.requests, args.concurrency * 16)
+    summary = summarize(results, time.perf_counter() - start)
+    if server is not None:
+        server.shutdown()
+
+    summary.update({"target": args.target, "mode": args.mode})
+    summary.update({"concurrency": args.concurrency, "rate": args.rate})
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(summary, f, indent=2)
+    print(json.dumps(summary, indent=2))
+    if args.compare:
+        with open(args.compare) as f:
+            compare(summary, json.load(f))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+import argparse
+import random
+import time
+
+from src.model_server import ModelServer
+
+"""
+Route a random mix of requests to several models co-hosted by a
+ModelServer under a memory budget, and print the loads, evictions and
+latencies of each model. Run it from the LLM_GALLERY folder:
+    python -m benchmarks.model_server_benchmark --budget-gb 10
+By default the models are fake: each one declares the size of a 4 bit
+gallery model, takes load_s to load and step_s per request. Pass --models
+with small huggingface models (for instance sshleifer/tiny-gpt2) to load
+real pipelines on CPU, with a budget in GB of their real footprint.
+"""
+
+FAKE_MODELS = {"llama3-8b": 4.0, "mistral-7b": 3.5, "gemma2-9b": 4.5}
+
+
+class FakeLLM:
+    """Stand-in for a loaded model of a given size"""
+
+    def __init__(self, size_gb: float, step_s: float):
+        self.size_gb = size_gb
+        self.step_s = step_s
+
+    def __call__(self, prompt, **generate_kwargs):
+        time.sleep(self.step_s)
+        return [{"generated_text": prompt + " answer"}]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the model server")
+    parser.add_argument("--models", nargs="+", default=None, help="huggingface ids")
+    parser.add_argument("--budget-gb", type=float, default=10)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--load-s", type=float, default=0.5)
+    parser.add_argument("--step-s", type=float, default=0.01)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    if args.models is None:
+        names = list(FAKE_MODELS)
+
+        def loader(model_name):
+            time.sleep(args.load_s)
+            return FakeLLM(FAKE_MODELS[model_name], args.step_s)
+
+        server = ModelServer(
+            loader,
+            memory_budget_gb=args.budget_gb,
+            estimate_gb=FAKE_MODELS.get,
+            memory_fn=lambda llm: int(llm.size_gb * 1024**3),
+        )
+    else:
+        from transformers import pipeline
+
+        names = args.models
+
+        def loader(model_name):
+            return pipeline("text-generation", model=model_name)
+
+        server = ModelServer(loader, memory_budget_gb=args.budget_gb)
+
+    rng = random.Random(args.seed)
+    # a skewed traffic: the first model gets most of the requests
+    weights = [2 ** (len(names) - i) for i in range(len(names))]
+    start = time.perf_counter()
+    for _ in range(args.requests):
+        model_name = rng.choices(names, weights)[0]
+        with server.use(model_name) as llm:
+            llm("Quel est le plus gros animal au monde?", max_new_tokens=8)
+    duration = time.perf_counter() - start
+
+    stats = server.stats()
+    print(
+        f"{args.requests} requests in {duration:.1f}s, "
+        f"{stats['memory_used_gb']:.2f}GB loaded of {stats['memory_budget_gb']}GB: "
+        f"{stats['loaded']}"
+    )
+    print(f"{'model':>40} {'loads':>6} {'evictions':>9} {'requests':>8} {'p50 s':>7} {'p95 s':>7}")
+    for model_name, model in sorted(stats["models"].items()):
+        print(
+            f"{model_name:>40} {model['loads']:>6} {model['evictions']:>9} "
+            f"{model['requests']:>8} {model['p50_s']:>7.3f} {model['p95_s']:>7.3f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
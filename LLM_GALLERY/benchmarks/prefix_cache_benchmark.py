@@ -0,0 +1,59 @@
+import argparse
+
+from src.prefix_cache import PrefixCachedLLM
+from src.registry import chat_messages
+from src import PREPROMPT
+
+"""
+Compare the prefill time of a small causal LM on CPU with and without the
+reuse of the system prompt key/values. Run it from the LLM_GALLERY folder:
+    python -m benchmarks.prefix_cache_benchmark
+The generation is greedy so both answers must be the same.
+"""
+
+QUESTIONS = [
+    "Quel est le plus gros animal au monde?",
+    "What is the capital of France?",
+    "Quel est le plus gros animal au monde?",
+    "How many legs does a spider have?",
+    "What is the capital of France?",
+]
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Measure the prefill saved by the prefix cache"
+    )
+    parser.add_argument("--model", default="HuggingFaceTB/SmolLM2-135M-Instruct")
+    parser.add_argument("--max-new-tokens", type=int, default=16)
+    args = parser.parse_args()
+
+    from transformers import pipeline
+
+    llm = pipeline("text-generation", model=args.model)
+
+    def format_message(message):
+        return chat_messages(message, PREPROMPT)
+
+    cached_llm = PrefixCachedLLM(llm, format_message)
+    # same generation path without any cached prefix, as a baseline
+    baseline_llm = PrefixCachedLLM(
+        llm, format_message, max_cache_mb=0, cache_system_prompt=False
+    )
+    generate_kwargs = {"max_new_tokens": args.max_new_tokens, "do_sample": False}
+
+    for question in QUESTIONS:
+        expected = baseline_llm(format_message(question), **generate_kwargs)
+        output = cached_llm(format_message(question), **generate_kwargs)
+        if output[0]["generated_text"][-1] != expected[0]["generated_text"][-1]:
+            print("different answers for", question)
+
+    baseline = baseline_llm.metrics()
+    metrics = cached_llm.metrics()
+    print(f"mean prefill without prefix cache: {baseline['mean_prefill_s']}s")
+    print(f"mean prefill with prefix cache: {metrics['mean_prefill_s']}s")
+    print("prefix cache:", metrics)
+
+
+if __name__ == "__main__":
+    main()
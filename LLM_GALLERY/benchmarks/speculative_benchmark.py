@@ -0,0 +1,57 @@
+import argparse
+
+from src.speculative import SpeculativeLLM, check_greedy_equivalence
+
+"""
+Check speculative decoding on CPU with a tiny pair of models sharing a
+tokenizer. Run it from the LLM_GALLERY folder:
+    python -m benchmarks.speculative_benchmark --num-draft-tokens 3 5 8
+For each number of draft tokens, every prompt is generated greedily with
+and without the draft model: the outputs must be the same token for token.
+It reports the acceptance rate of the draft tokens and the tokens/s speedup.
+"""
+
+PROMPTS = [
+    "The largest animal in the world is",
+    "Here is a short story about a cat who learns to fly:",
+    "def fibonacci(n):",
+    "The capital of France is Paris. The capital of Italy is",
+]
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Measure the speedup and acceptance of speculative decoding"
+    )
+    parser.add_argument("--model", default="HuggingFaceTB/SmolLM2-360M-Instruct")
+    parser.add_argument("--draft-model", default="HuggingFaceTB/SmolLM2-135M-Instruct")
+    parser.add_argument("--num-draft-tokens", type=int, nargs="+", default=[3, 5, 8])
+    parser.add_argument("--max-new-tokens", type=int, default=64)
+    args = parser.parse_args()
+
+    from transformers import AutoModelForCausalLM, pipeline
+
+    print(
+        f"{'draft tokens':>12} {'equivalent':>10} {'acceptance':>10} "
+        f"{'target tok/s':>12} {'spec tok/s':>10} {'speedup':>8}"
+    )
+    for num_draft_tokens in args.num_draft_tokens:
+        # new models for each setting, so the forward counters start at 0
+        llm = SpeculativeLLM(
+            pipeline("text-generation", model=args.model),
+            AutoModelForCausalLM.from_pretrained(args.draft_model),
+            num_draft_tokens=num_draft_tokens,
+        )
+        report = check_greedy_equivalence(llm, PROMPTS, args.max_new_tokens)
+        print(
+            f"{num_draft_tokens:>12} {str(report['equivalent']):>10} "
+            f"{report['acceptance_rate']:>10.2f} "
+            f"{report['target_tokens_per_s']:>12.1f} "
+            f"{report['speculative_tokens_per_s']:>10.1f} {report['speedup']:>8.2f}"
+        )
+        if report["mismatches"]:
+            print("  different outputs for:", report["mismatches"])
+
+
+if __name__ == "__main__":
+    main()
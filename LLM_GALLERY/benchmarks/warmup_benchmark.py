@@ -0,0 +1,85 @@
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+import time
+
+from src import PREPROMPT
+from src.registry import chat_messages
+from src.warmup import run_warmup
+
+"""
+Compare the latency of the first request of a freshly loaded model with
+the steady-state latency, with and without the warm-up. Run it from the
+LLM_GALLERY folder:
+    python -m benchmarks.warmup_benchmark
+Each case runs in a new process, so the one-off costs are paid again.
+Use a GPU and a real gallery model to see the CUDA kernel selection cost.
+"""
+
+QUESTIONS = [
+    "Quel est le plus gros animal au monde?",
+    "What is the capital of France?",
+    "How many legs does a spider have?",
+    "Quelle est la plus haute montagne du monde?",
+    "What is the speed of light?",
+]
+
+
+def measure(model: str, warm: bool, max_new_tokens: int) -> dict:
+    """Load the model, optionally warm it up, then time the questions"""
+    from transformers import pipeline
+
+    start = time.perf_counter()
+    llm = pipeline("text-generation", model=model, device_map="auto")
+    result = {"load_s": time.perf_counter() - start}
+
+    def format_message(message):
+        return chat_messages(message, PREPROMPT)
+
+    if warm:
+        runs = run_warmup(llm, format_message, max_new_tokens=max_new_tokens)
+        result["warmup_s"] = sum(run["latency_s"] for run in runs)
+    latencies = []
+    for question in QUESTIONS:
+        start = time.perf_counter()
+        llm(format_message(question), max_new_tokens=max_new_tokens, do_sample=False)
+        latencies.append(time.perf_counter() - start)
+    result["first_request_s"] = latencies[0]
+    result["steady_state_p50_s"] = statistics.median(latencies[1:])
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Measure the first request latency with and without warm-up"
+    )
+    parser.add_argument("--model", default="HuggingFaceTB/SmolLM2-135M-Instruct")
+    parser.add_argument("--max-new-tokens", type=int, default=16)
+    parser.add_argument("--child", choices=["cold", "warm"], help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        result = measure(args.model, args.child == "warm", args.max_new_tokens)
+        print(json.dumps(result))
+        return
+
+    print(f"{'case':>5} {'load s':>8} {'warm-up s':>10} {'first s':>8} {'p50 s':>8}")
+    for case in ("cold", "warm"):
+        output = subprocess.run(
+            [sys.executable, "-m", "benchmarks.warmup_benchmark", "--child", case]
+            + ["--model", args.model, "--max-new-tokens", str(args.max_new_tokens)],
+            check=True,
+            capture_output=True,
+            text=True,
+        ).stdout
+        result = json.loads(output.strip().splitlines()[-1])
+        print(
+            f"{case:>5} {result['load_s']:>8.2f} {result.get('warmup_s', 0):>10.2f} "
+            f"{result['first_request_s']:>8.3f} {result['steady_state_p50_s']:>8.3f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
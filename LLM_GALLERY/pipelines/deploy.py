@@ -0,0 +1,433 @@
+import argparse
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from craft_ai_sdk import CraftAiSdk
+from craft_ai_sdk.exceptions import SdkException
+from craft_ai_sdk.io import Output, OutputDestination, Input, InputSource
+from dotenv import load_dotenv
+
+from LLM_GALLERY.src.registry import MODELS, get_model_spec
+
+
+""" Running this script will create all the necessary Craft.AI objects to
+deploy quantized models of the registry (LLM_GALLERY/src/registry.py)
+on the Craft.AI platform, for instance:
+    python3 -m LLM_GALLERY.pipelines.deploy mistral-7b llama3-8b
+Several models are deployed concurrently. A fake sdk keeping its
+resources in memory allows to run the orchestration without a platform:
+    python3 -m LLM_GALLERY.pipelines.deploy mistral-7b llama3-8b --fake
+From this, feel free to use the associated endpoints as you wish and make
+good use of your LLMs!
+"""
+load_dotenv(override=True)
+
+# different questions, so they are not answered by the response cache
+STEADY_MESSAGES = [
+    "Quelle est la plus haute montagne du monde?",
+    "Quel est le plus long fleuve du monde?",
+    "Quelle est la plus grande planète du système solaire?",
+]
+
+
+def get_sdk() -> CraftAiSdk:
+    """sdk instantiation from the environment variables"""
+    return CraftAiSdk(
+        sdk_token=os.environ.get("CRAFT_AI_SDK_TOKEN"),
+        environment_url=os.environ.get("CRAFT_AI_ENVIRONMENT_URL"),
+    )
+
+
+class FakeSdk:
+    """In-memory sdk with the pipeline, deployment and endpoint methods used
+    by the deployment, each call taking latency_s. A deployment is up after
+    pending_polls status calls, or creation_failed when its name is in
+    failing.
+
+    Args:
+        latency_s (float): duration of each call
+        pending_polls (int): status calls answering creation_pending
+        failing (list): names of the deployments whose creation fails
+    """
+
+    def __init__(self, latency_s: float = 0.05, pending_polls: int = 2, failing=()):
+        self.latency_s = latency_s
+        self.pending_polls = pending_polls
+        self.failing = set(failing)
+        self.environment_variables = {}
+        self.pipelines = {}
+        self.deployments = {}
+        self.calls = []
+        self._lock = threading.Lock()
+
+    def _call(self, method: str, name: str = None):
+        time.sleep(self.latency_s)
+        with self._lock:
+            self.calls.append((method, name))
+
+    def create_or_update_environment_variable(
+        self, environment_variable_name, environment_variable_value
+    ):
+        self._call("create_or_update_environment_variable", environment_variable_name)
+        self.environment_variables[environment_variable_name] = (
+            environment_variable_value
+        )
+
+    def delete_deployment(self, deployment_name):
+        self._call("delete_deployment", deployment_name)
+        with self._lock:
+            if self.deployments.pop(deployment_name, None) is None:
+                raise SdkException(f"deployment {deployment_name} not found", 404)
+
+    def delete_pipeline(self, pipeline_name, force_deployments_deletion=False):
+        self._call("delete_pipeline", pipeline_name)
+        with self._lock:
+            if self.pipelines.pop(pipeline_name, None) is None:
+                raise SdkException(f"pipeline {pipeline_name} not found", 404)
+
+    def create_pipeline(self, pipeline_name, **kwargs):
+        self._call("create_pipeline", pipeline_name)
+        with self._lock:
+            self.pipelines[pipeline_name] = kwargs
+
+    def create_deployment(self, deployment_name, pipeline_name, **kwargs):
+        self._call("create_deployment", deployment_name)
+        with self._lock:
+            if pipeline_name not in self.pipelines:
+                raise SdkException(f"pipeline {pipeline_name} not found", 404)
+            self.deployments[deployment_name] = dict(
+                kwargs, pipeline_name=pipeline_name, polls=0, triggers=[]
+            )
+
+    def get_deployment(self, deployment_name):
+        self._call("get_deployment", deployment_name)
+        with self._lock:
+            deployment = self.deployments[deployment_name]
+            deployment["polls"] += 1
+            if deployment["polls"] <= self.pending_polls:
+                status = "creation_pending"
+            elif deployment_name in self.failing:
+                status = "creation_failed"
+            else:
+                status = "up"
+        return {
+            "name": deployment_name,
+            "status": status,
+            "endpoint_token": f"token-{deployment_name}",
+        }
+
+    def trigger_endpoint(self, endpoint_name, endpoint_token, inputs=None, **kwargs):
+        self._call("trigger_endpoint", endpoint_name)
+        with self._lock:
+            if endpoint_token != f"token-{endpoint_name}":
+                raise SdkException(f"invalid token of {endpoint_name}", 401)
+            self.deployments[endpoint_name]["triggers"].append(inputs)
+        return {"outputs": {"results": "fake answer"}}
+
+
+@contextmanager
+def timed(report: dict, phase: str):
+    """Record the duration of a deployment phase in the report"""
+    start = time.time()
+    try:
+        yield
+    finally:
+        report[phase] = time.time() - start
+
+
+def wait_for_deployment(
+    sdk,
+    deployment_name: str,
+    initial_delay_s: float = 2,
+    max_delay_s: float = 60,
+    timeout_s: float = 7200,
+    sleep=time.sleep,
+    clock=time.time,
+) -> dict:
+    """This function waits for a deployment to be up, polling its status
+    with an exponential backoff and full jitter
+
+    Args:
+        sdk (CraftAiSdk): the sdk, or any object with a get_deployment method
+        deployment_name (str): name of the deployment
+        initial_delay_s (float): first delay between two status calls
+        max_delay_s (float): maximum delay between two status calls
+        timeout_s (float): maximum waiting time
+        sleep (callable): sleeping function, to be replaced in tests
+        clock (callable): current time in seconds, to be replaced in tests
+
+    Returns:
+        dict: the deployment information once it is up
+    """
+    start = clock()
+    delay = initial_delay_s
+    while True:
+        # a single status call per iteration
+        deployment = sdk.get_deployment(deployment_name)
+        status = deployment["status"]
+        print(f"waiting endpoint {deployment_name} ready...", status)
+        if status == "up":
+            return deployment
+        if "fail" in status:
+            raise RuntimeError(f"deployment {deployment_name} is {status}")
+        if clock() - start > timeout_s:
+            raise TimeoutError(f"deployment {deployment_name} is still {status}")
+        sleep(random.uniform(0, delay))
+        delay = min(max_delay_s, delay * 2)
+
+
+def build_pipeline_deploy(
+    model_name: str,
+    sdk=None,
+    sleep=time.sleep,
+    steady_calls: int = 0,
+    warm_up: bool = True,
+) -> dict:
+    """To deploy a model of the registry on the Craft.AI platform,
+    make sure your environment has at least the VRAM and disk given
+    by its registry entry (vram_gb and disk_gb).
+
+    Args:
+        model_name (str): key of the model in the registry
+        sdk (CraftAiSdk): the sdk to use, built from the environment
+            variables by default
+        sleep (callable): sleeping function used while polling
+        steady_calls (int): calls after the first one, up to
+            len(STEADY_MESSAGES), whose mean duration is the steady-state
+            latency, none by default
+        warm_up (bool): constant warm_up input of the deployment, the
+            model is warmed up before its first request
+
+    Returns:
+        dict: duration of each phase of the deployment
+    """
+    spec = get_model_spec(model_name)
+    print(
+        f"Deploying {spec.hf_model_name}: it needs {spec.vram_gb}Go of VRAM "
+        f"and {spec.disk_gb}Go of disk"
+    )
+    if spec.draft_gb:
+        print(f"and {spec.draft_gb}Go more with speculative decoding")
+    # set the name of your deployment
+    deployment_name = spec.deployment_name
+    report = {"model": model_name}
+    if sdk is None:
+        sdk = get_sdk()
+        # add your huggingface token into craft platform
+        sdk.create_or_update_environment_variable(
+            environment_variable_name="HUGGINGFACE_ACCESS_TOKEN",
+            environment_variable_value=os.environ["HUGGINGFACE_ACCESS_TOKEN"],
+        )
+    with timed(report, "cleanup_s"):
+        try:
+            print("Deleting deployment...")
+            sdk.delete_deployment(deployment_name)
+        except SdkException:
+            pass
+        try:
+            print("Deleting pipeline...")
+            sdk.delete_pipeline(deployment_name)
+        except SdkException:
+            pass
+
+    # Setting up the necessary configurations for pipeline creation
+    container_config = {
+        "local_folder": os.environ["LOCAL_DIRECTORY"],
+        "language": "python-cuda:3.10-12.1",
+        "requirements_path": "requirements.txt",
+        "included_folders": ["/"],
+    }
+    inputs = [
+        Input(name="message", data_type="string"),
+        Input(name="warm_up", data_type="boolean", is_required=False),
+    ]
+    inputs_mapping = [
+        InputSource(
+            pipeline_input_name="message",
+            endpoint_input_name="message",
+        ),
+        # the warm-up is a setting of this deployment, not of the environment
+        InputSource(pipeline_input_name="warm_up", constant_value=warm_up),
+    ]
+    # the generic endpoint function gets the model to load as a constant input
+    if spec.function_name == "deploy_llm":
+        inputs.append(Input(name="model_name", data_type="string"))
+        inputs_mapping.append(
+            InputSource(pipeline_input_name="model_name", constant_value=model_name)
+        )
+
+    # Creating the pipeline to deploy the model
+    print("Creating pipeline...")
+    with timed(report, "create_pipeline_s"):
+        sdk.create_pipeline(
+            pipeline_name=deployment_name,
+            function_path=spec.function_path,
+            function_name=spec.function_name,
+            container_config=container_config,
+            outputs=[
+                Output(name="results", data_type="json"),
+            ],
+            inputs=inputs,
+            timeout_s=7200,
+        )
+
+    # Deploying the pipeline using an endpoint
+    print("Deploying Pipeline ...")
+    with timed(report, "create_deployment_s"):
+        sdk.create_deployment(
+            deployment_name=deployment_name,
+            pipeline_name=deployment_name,
+            execution_rule="endpoint",
+            mode="low_latency",
+            inputs_mapping=inputs_mapping,
+            outputs_mapping=[
+                OutputDestination(
+                    pipeline_output_name="results", endpoint_output_name="results"
+                ),
+            ],
+            timeout_s=6000,
+        )
+    print("deployment has been created")
+    with timed(report, "wait_up_s"):
+        deployment = wait_for_deployment(sdk, deployment_name, sleep=sleep)
+    print(f"Deployment creation duration: {report['wait_up_s']}")
+    print("Done!")
+
+    print("Run deployment...")
+    # with warm_up, the first call loads and warms the model up, so the
+    # requests after it don't pay the one-off costs
+    with timed(report, "first_call_s"):
+        sdk.trigger_endpoint(
+            deployment_name,
+            deployment["endpoint_token"],
+            inputs={
+                "message": "Quel est le plus gros animal au monde?",
+            },
+        )
+    # optional probes, each one is a full generation
+    report["steady_call_s"] = None
+    if steady_calls:
+        start = time.time()
+        for message in STEADY_MESSAGES[:steady_calls]:
+            sdk.trigger_endpoint(
+                deployment_name,
+                deployment["endpoint_token"],
+                inputs={"message": message},
+            )
+        report["steady_call_s"] = (time.time() - start) / len(
+            STEADY_MESSAGES[:steady_calls]
+        )
+    print(f"Deployment {deployment_name} is up and run well!!!")
+    return report
+
+
+def deploy_models(
+    model_names: list,
+    sdk=None,
+    max_workers: int = None,
+    sleep=time.sleep,
+    steady_calls: int = 0,
+    warm_up: bool = True,
+) -> list:
+    """This function deploys several models of the registry concurrently,
+    so the total time is the longest deployment instead of their sum
+
+    Args:
+        model_names (list): keys of the models in the registry
+        sdk (CraftAiSdk): the sdk to use, built from the environment
+            variables by default
+        max_workers (int): number of concurrent deployments,
+            all of them by default
+        sleep (callable): sleeping function used while polling
+        steady_calls (int): steady-state probes of each deployment
+        warm_up (bool): warm the models up before their first request
+
+    Returns:
+        list: the phase timing report of each deployment
+    """
+    if sdk is None:
+        sdk = get_sdk()
+        # add your huggingface token into craft platform, once for all models
+        sdk.create_or_update_environment_variable(
+            environment_variable_name="HUGGINGFACE_ACCESS_TOKEN",
+            environment_variable_value=os.environ["HUGGINGFACE_ACCESS_TOKEN"],
+        )
+    start = time.time()
+    with ThreadPoolExecutor(max_workers=max_workers or len(model_names)) as executor:
+        futures = {
+            model_name: executor.submit(
+                build_pipeline_deploy, model_name, sdk, sleep, steady_calls, warm_up
+            )
+            for model_name in model_names
+        }
+    reports = []
+    for model_name, future in futures.items():
+        try:
+            reports.append(future.result())
+        except Exception as e:
+            reports.append({"model": model_name, "error": repr(e)})
+    print_report(reports, time.time() - start)
+    return reports
+
+
+def print_report(reports: list, total_s: float):
+    """Print the phase durations of the deployments"""
+    phases = [
+        "cleanup_s",
+        "create_pipeline_s",
+        "create_deployment_s",
+        "wait_up_s",
+        "first_call_s",
+        "steady_call_s",
+    ]
+    print("model".ljust(12) + "".join(phase.ljust(21) for phase in phases))
+    for report in reports:
+        if "error" in report:
+            print(report["model"].ljust(12) + "failed: " + report["error"])
+            continue
+        print(
+            report["model"].ljust(12)
+            + "".join(
+                ("-" if report[phase] is None else f"{report[phase]:.1f}").ljust(21)
+                for phase in phases
+            )
+        )
+    print(f"all deployments took {total_s:.1f}s")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Deploy models of the LLM gallery registry"
+    )
+    parser.add_argument("model_names", nargs="+", choices=sorted(MODELS))
+    parser.add_argument("--max-workers", type=int, default=None)
+    parser.add_argument(
+        "--steady-calls",
+        type=int,
+        default=0,
+        help=f"calls after the first one, up to {len(STEADY_MESSAGES)}, to "
+        "measure the steady-state latency",
+    )
+    parser.add_argument(
+        "--no-warm-up",
+        action="store_true",
+        help="the models load on their first request, without warm-up",
+    )
+    parser.add_argument(
+        "--fake", action="store_true", help="deploy on a FakeSdk, without a platform"
+    )
+    args = parser.parse_args()
+    sdk = None
+    if args.fake:
+        sdk = FakeSdk()
+        os.environ.setdefault("LOCAL_DIRECTORY", ".")
+    deploy_models(
+        args.model_names,
+        sdk=sdk,
+        max_workers=args.max_workers,
+        steady_calls=args.steady_calls,
+        warm_up=not args.no_warm_up,
+    )
@@ -1,31 +1,52 @@
-import time
-from src.deploy_llm_easy import get_quant_model
+from src import warmup
+from src.endpoint import generate, stream
 
-# get the huggingface id of the model
-model_name = "google/gemma-2-9b-it"
-# get the llm quantized ready to be called
-llm = get_quant_model(model_name)
+# get the registry key of the model, the llm is quantized, loaded and
+# warmed up when this module is imported in a step of the platform, so the
+# deployment is up once it is warm. Elsewhere, it is loaded on its first call
+# or its explicit warm-up, unless LLM_WARMUP is set
+model_name = "gemma2-9b"
+warmup.start(model_name)
 
 
-def deploy_gemma2_easy(message: str) -> dict:
+def deploy_gemma2_easy(message: str, warm_up: bool = False) -> dict:
     """This function aims to generate text with gemma2 9B
     from a query
     Args :
         message (str) : the query
+        warm_up (bool) : warm the model up before its first request
     Returns:
         dict: result from text generation
     """
+    if warm_up:
+        warmup.warmup(model_name)
+    return generate(model_name, message)
 
-    # generate text from llm
-    start = time.time()
-    message = [
-        {"role": "user", "content": message},
-    ]
-    output = llm(message)
-    print(output)
-    end = time.time()
-    print(f"generation ended and took {end - start}s")
-    results = output[0]["generated_text"][-1]
-    print(results)
-    results = results["content"].replace("\n", "")
-    return {"results": results}
+
+def stream_gemma2_easy(message: str):
+    """This function aims to stream the text generated by gemma2 9B
+    from a query, chunk by chunk
+    Args :
+        message (str) : the query
+    Returns:
+        TokenStream: iterator over the generated text chunks
+    """
+    return stream(model_name, message)
+
+
+def status_gemma2_easy() -> dict:
+    """This function aims to tell whether gemma2 9B is warmed up and ready,
+    with the latency of its first request against the next ones
+    Returns:
+        dict: readiness and latencies
+    """
+    return warmup.status(model_name)
+
+
+def warmup_gemma2_easy() -> dict:
+    """This function aims to load gemma2 9B and warm it up before its
+    first request, once: the next calls give the same report
+    Returns:
+        dict: durations of the load and of the warm-up generations
+    """
+    return warmup.warmup(model_name)
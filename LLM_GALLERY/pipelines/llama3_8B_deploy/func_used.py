@@ -1,41 +1,52 @@
-import time
-from src import PREPROMPT
-from src.deploy_llm_easy import get_quant_model
+from src import warmup
+from src.endpoint import generate, stream
 
-# get the huggingface id of the model
-model_name = "meta-llama/Meta-Llama-3-8B-Instruct"
-# get the llm quantized ready to be called
-llm = get_quant_model(model_name)
+# get the registry key of the model, the llm is quantized, loaded and
+# warmed up when this module is imported in a step of the platform, so the
+# deployment is up once it is warm. Elsewhere, it is loaded on its first call
+# or its explicit warm-up, unless LLM_WARMUP is set
+model_name = "llama3-8b"
+warmup.start(model_name)
 
 
-def deploy_llama_easy(message: str):
+def deploy_llama_easy(message: str, warm_up: bool = False) -> dict:
     """This function aims to generate text with llama3 8B
     from a query
     Args :
         message (str) : the query
+        warm_up (bool) : warm the model up before its first request
     Returns:
         dict: result from text generation
     """
+    if warm_up:
+        warmup.warmup(model_name)
+    return generate(model_name, message)
 
-    # formatting the input
-    message = [
-        {
-            "role": "system",
-            "content": PREPROMPT,
-        },
-        {"role": "user", "content": message},
-    ]
-    # generate text from llm
-    start = time.time()
-
-    output = llm(
-        message,
-        top_k=10,
-        max_new_tokens=1024,
-        do_sample=True,
-    )
-    end = time.time()
-    print(f"generation ended and took {end - start}s")
-    generated_text = output[0]["generated_text"][-1]
-    results = generated_text["content"].replace("\n", "")
-    return {"results": results}
+
+def stream_llama_easy(message: str):
+    """This function aims to stream the text generated by llama3 8B
+    from a query, chunk by chunk
+    Args :
+        message (str) : the query
+    Returns:
+        TokenStream: iterator over the generated text chunks
+    """
+    return stream(model_name, message)
+
+
+def status_llama_easy() -> dict:
+    """This function aims to tell whether llama3 8B is warmed up and ready,
+    with the latency of its first request against the next ones
+    Returns:
+        dict: readiness and latencies
+    """
+    return warmup.status(model_name)
+
+
+def warmup_llama_easy() -> dict:
+    """This function aims to load llama3 8B and warm it up before its
+    first request, once: the next calls give the same report
+    Returns:
+        dict: durations of the load and of the warm-up generations
+    """
+    return warmup.warmup(model_name)
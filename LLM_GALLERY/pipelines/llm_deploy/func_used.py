@@ -0,0 +1,36 @@
+import os
+
+from src import warmup
+from src.endpoint import generate
+
+# the models to warm up when this module is imported (in a step of the
+# platform or with LLM_WARMUP=on), as a comma separated list of registry
+# keys, the others load on their first call
+for model_name in filter(None, os.environ.get("LLM_WARMUP_MODELS", "").split(",")):
+    warmup.start(model_name.strip())
+
+
+def deploy_llm(message: str, model_name: str, warm_up: bool = False) -> dict:
+    """This function aims to generate text with any model of the registry
+    from a query. Only the requested model is loaded, on its first call.
+    Args :
+        message (str) : the query
+        model_name (str) : key of the model in src/registry.py
+        warm_up (bool) : warm the model up before its first request
+    Returns:
+        dict: result from text generation
+    """
+    if warm_up:
+        warmup.warmup(model_name)
+    return generate(model_name, message)
+
+
+def warmup_llm(model_name: str) -> dict:
+    """This function aims to load a model of the registry and warm it up
+    before its first request, once: the next calls give the same report
+    Args :
+        model_name (str) : key of the model in src/registry.py
+    Returns:
+        dict: durations of the load and of the warm-up generations
+    """
+    return warmup.warmup(model_name)
@@ -1,35 +1,52 @@
-import time
-from src.deploy_llm_easy import get_quant_model
-from src import PREPROMPT
+from src import warmup
+from src.endpoint import generate, stream
 
+# get the registry key of the model, the llm is quantized, loaded and
+# warmed up when this module is imported in a step of the platform, so the
+# deployment is up once it is warm. Elsewhere, it is loaded on its first call
+# or its explicit warm-up, unless LLM_WARMUP is set
+model_name = "mistral-7b"
+warmup.start(model_name)
 
-# get the huggingface id of the model
-model_name = "mistralai/Mistral-7B-Instruct-v0.2"
-# get the llm quantized ready to be called
-llm = get_quant_model(model_name)
 
-
-def deploy_mistral_easy(message: str) -> dict:
+def deploy_mistral_easy(message: str, warm_up: bool = False) -> dict:
     """This function aims to generate text with mistral7B V0.2
     from a query
     Args :
         message (str) : the query
+        warm_up (bool) : warm the model up before its first request
     Returns:
         dict: result from text generation
     """
+    if warm_up:
+        warmup.warmup(model_name)
+    return generate(model_name, message)
+
+
+def stream_mistral_easy(message: str):
+    """This function aims to stream the text generated by mistral7B V0.2
+    from a query, chunk by chunk
+    Args :
+        message (str) : the query
+    Returns:
+        TokenStream: iterator over the generated text chunks
+    """
+    return stream(model_name, message)
 
-    # formatting the input
-    message = f"<s>[INST] {PREPROMPT}\nquestion: {message} [/INST]"
-    # generate text from llm
-    start = time.time()
-    output = llm(
-        message,
-        top_k=10,
-        num_return_sequences=1,
-        do_sample=True,
-    )
-    end = time.time()
-    print(f"generation ended and took {end - start}s")
-    generated_text = output[0]["generated_text"]
-    results = generated_text.split("[/INST]")[1].replace("\n", "")
-    return {"results": results}
+
+def status_mistral_easy() -> dict:
+    """This function aims to tell whether mistral7B V0.2 is warmed up and ready,
+    with the latency of its first request against the next ones
+    Returns:
+        dict: readiness and latencies
+    """
+    return warmup.status(model_name)
+
+
+def warmup_mistral_easy() -> dict:
+    """This function aims to load mistral7B V0.2 and warm it up before its
+    first request, once: the next calls give the same report
+    Returns:
+        dict: durations of the load and of the warm-up generations
+    """
+    return warmup.warmup(model_name)
@@ -0,0 +1,138 @@
+import json
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+from .speculative import SpeculativeLLM
+
+"""
+Dynamic micro-batching in front of a text-generation pipeline.
+Concurrent calls are gathered for up to max_wait_ms or max_batch_size
+requests and run as one padded batch, then each caller gets its own result.
+"""
+
+
+class MicroBatcher:
+    """Drop-in replacement of the llm pipeline batching concurrent calls
+
+    Args:
+        llm: the text-generation pipeline returned by get_quant_model
+        max_batch_size (int): maximum number of requests in one batch
+        max_wait_ms (float): how long the first request of a batch waits
+            for other requests to join it
+        padding_side (str): side on which the prompts of a batch are padded,
+            "left" for decoder only models
+    """
+
+    def __init__(
+        self,
+        llm,
+        max_batch_size: int = 8,
+        max_wait_ms: float = 10,
+        padding_side: str = "left",
+    ):
+        self.llm = llm
+        self.max_batch_size = max_batch_size
+        self.max_wait_s = max_wait_ms / 1000
+        tokenizer = getattr(llm, "tokenizer", None)
+        self.tokenizer = tokenizer
+        if tokenizer is not None:
+            tokenizer.padding_side = padding_side
+            # a batch needs a padding token, most chat models don't define one
+            if tokenizer.pad_token is None:
+                tokenizer.pad_token = tokenizer.eos_token
+        self.stats = {"requests": 0, "batches": 0, "max_batch_size_seen": 0}
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def __call__(self, inputs, **generate_kwargs):
+        """Queue one request and wait for its own result"""
+        future = Future()
+        self._queue.put((inputs, generate_kwargs, future))
+        return future.result()
+
+    def close(self):
+        """Stop the batching thread once the queued requests are served,
+        so that the llm can be freed
+        """
+        self._queue.put(None)
+
+    def _collect(self) -> list:
+        request = self._queue.get()
+        if request is None:
+            return None
+        batch = [request]
+        deadline = time.monotonic() + self.max_wait_s
+        while len(batch) < self.max_batch_size:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                request = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                break
+            if request is None:
+                # served after this batch
+                self._queue.put(None)
+                break
+            batch.append(request)
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            if batch is None:
+                return
+            # only requests with the same generation parameters share a batch
+            groups = {}
+            for request in batch:
+                key = json.dumps(request[1], sort_keys=True, default=str)
+                groups.setdefault(key, []).append(request)
+            for group in groups.values():
+                self._generate(group)
+
+    def _generate(self, group: list):
+        inputs = [request[0] for request in group]
+        generate_kwargs = group[0][1]
+        self.stats["requests"] += len(group)
+        self.stats["batches"] += 1
+        self.stats["max_batch_size_seen"] = max(
+            self.stats["max_batch_size_seen"], len(group)
+        )
+        try:
+            outputs = self.llm(inputs, batch_size=len(group), **generate_kwargs)
+        except Exception as e:
+            for request in group:
+                request[2].set_exception(e)
+            return
+        for request, output in zip(group, outputs):
+            request[2].set_result(output)
+
+
+def with_batching(llm):
+    """This function wraps the llm into a MicroBatcher when batching
+    is enabled through the environment variables:
+    - LLM_MAX_BATCH_SIZE: maximum batch size, batching is off when 1 (default)
+    - LLM_MAX_WAIT_MS: maximum wait of a request before its batch runs
+    - LLM_PADDING_SIDE: padding side of the batched prompts
+    Speculative decoding generates one sequence at a time, so an llm with
+    a draft model is never batched.
+
+    Args:
+        llm: the text-generation pipeline
+
+    Returns:
+        the llm itself or its batched version
+    """
+    max_batch_size = int(os.environ.get("LLM_MAX_BATCH_SIZE", 1))
+    if max_batch_size <= 1 or isinstance(llm, SpeculativeLLM):
+        return llm
+    return MicroBatcher(
+        llm,
+        max_batch_size=max_batch_size,
+        max_wait_ms=float(os.environ.get("LLM_MAX_WAIT_MS", 10)),
+        padding_side=os.environ.get("LLM_PADDING_SIDE", "left"),
+    )
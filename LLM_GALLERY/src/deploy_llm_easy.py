@@ -1,38 +1,99 @@
 # get packages
 import os
-import time
-from transformers import (
-    AutoTokenizer,
-    AutoModelForCausalLM,
-    pipeline,
-    BitsAndBytesConfig,
-)
-import torch
-from huggingface_hub import login
-
-# get huggingface_token from environment variables
+import re
+from .instrumentation import span
+from .model_cache import QuantModelCache, get_cached_model
+from .speculative import SpeculativeLLM, load_draft_model
+
+"""
+torch, transformers and huggingface_hub take seconds to import, so they are
+imported by get_quant_model, when a model is loaded, and not with this
+module.
 """
-you need to generate a Hugging Face token and add it as a environement variable.
-Make sure you have permission to access to the reposetory 
-of the model you want to deploy.
+
+
+def get_huggingface_token() -> str:
+    """This function aims to get your Hugging Face token from the
+    environment variables.
+    you need to generate a Hugging Face token and add it as a environement variable.
+    Make sure you have permission to access to the reposetory
+    of the model you want to deploy.
+
+    Returns:
+        str: the Hugging Face token
     """
-try:
-    huggingface_token = os.environ["HUGGINGFACE_ACCESS_TOKEN"]
-except Exception as e:
-    raise ("generate and add your Hugging Face token as a environmment variable", e)
+    try:
+        return os.environ["HUGGINGFACE_ACCESS_TOKEN"]
+    except KeyError as e:
+        raise EnvironmentError(
+            "generate and add your Hugging Face token as the environment "
+            "variable HUGGINGFACE_ACCESS_TOKEN"
+        ) from e
+
 
+def resolve_revision(hf_model_name: str, revision: str) -> str:
+    """This function aims to give the commit hash of a revision of a model,
+    so the cache of the quantized models is keyed by the weights it holds
+    and not by a branch like "main" that moves with each new commit.
 
-def get_quant_model(hf_model_name: str):
+    Args:
+        hf_model_name (str): huggingface id of the model
+        revision (str): branch, tag or commit of the model
+
+    Returns:
+        str: the commit hash, or the revision itself when the hub is not
+            reachable
+    """
+    if re.fullmatch(r"[0-9a-f]{40}", revision):
+        return revision
+    from huggingface_hub import HfApi
+
+    try:
+        return HfApi().model_info(
+            hf_model_name,
+            revision=revision,
+            token=os.environ.get("HUGGINGFACE_ACCESS_TOKEN"),
+        ).sha
+    except Exception as e:
+        print(f"revision {revision} of {hf_model_name} not resolved:", e)
+        return revision
+
+
+def get_quant_model(
+    hf_model_name: str,
+    revision: str = "main",
+    cache: QuantModelCache = None,
+    draft_model_name: str = None,
+    num_draft_tokens: int = 5,
+):
     """This function aims to get your model from Hugging Face,
     quantized the model into 4 bit with nf4 method
-    and return the llm ready to be call
+    and return the llm ready to be call.
+    The quantized model is kept in an on-disk cache so the next
+    cold starts reload it instead of quantizing it again.
 
     Args:
         hf_model_name (str): huggingface id of the model
+        revision (str): revision of the model, "main" by default, resolved
+            to its commit hash
+        cache (QuantModelCache): cache of the quantized models,
+            configured from the environment by default
+        draft_model_name (str): huggingface id of a small draft model with
+            the same tokenizer, to run speculative decoding
+        num_draft_tokens (int): tokens proposed by the draft model per step
 
     Returns:
-        llm: llm ready to be call
+        llm: llm ready to be call, a SpeculativeLLM with a draft model
     """
+    import torch
+    from huggingface_hub import login
+    from transformers import (
+        AutoTokenizer,
+        AutoModelForCausalLM,
+        pipeline,
+        BitsAndBytesConfig,
+    )
+
     # configure the quantization of the llm model
     quantization_config = BitsAndBytesConfig(
         load_in_4bit=True,
@@ -40,39 +101,79 @@ def get_quant_model(hf_model_name: str):
         bnb_4bit_use_double_quant=True,
         bnb_4bit_compute_dtype=torch.bfloat16,
     )
-    # add your huggingface to have access to the model repo
-    login(token=huggingface_token)
-    # get the tokenizer of the model
-    try:
-        tokenizer = AutoTokenizer.from_pretrained(
-            hf_model_name,
-        )
-    except Exception as e:
-        print(
-            """you don't have access to the model you want to reach. 
-              please request access by accessing the model page via 
-              Hugging Face.
-              """,
-            e,
-        )
-    # quantize the model
-    start = time.time()
-    quant_model = AutoModelForCausalLM.from_pretrained(
+    if cache is None:
+        cache = QuantModelCache()
+    # the weights of a commit never change, the ones of a branch do
+    revision = resolve_revision(hf_model_name, revision)
+
+    def quantize():
+        # add your huggingface to have access to the model repo
+        login(token=get_huggingface_token())
+        # get the tokenizer of the model
+        try:
+            with span("tokenizer_load", model=hf_model_name):
+                tokenizer = AutoTokenizer.from_pretrained(
+                    hf_model_name,
+                    revision=revision,
+                )
+        except Exception as e:
+            print(
+                """you don't have access to the model you want to reach. 
+                  please request access by accessing the model page via 
+                  Hugging Face.
+                  """,
+                e,
+            )
+            raise
+        # quantize the model
+        with span("quantization", model=hf_model_name):
+            quant_model = AutoModelForCausalLM.from_pretrained(
+                hf_model_name,
+                revision=revision,
+                quantization_config=quantization_config,
+                device_map="auto",
+            )
+        return quant_model, tokenizer
+
+    def load(folder):
+        # the quantization config is saved with the weights
+        with span("tokenizer_load", model=hf_model_name, cache="hit"):
+            tokenizer = AutoTokenizer.from_pretrained(folder)
+        with span("weight_load", model=hf_model_name, cache="hit"):
+            quant_model = AutoModelForCausalLM.from_pretrained(
+                folder, device_map="auto"
+            )
+        return quant_model, tokenizer
+
+    quant_model, tokenizer, report = get_cached_model(
+        cache,
         hf_model_name,
-        quantization_config=quantization_config,
-        device_map="auto",
+        revision,
+        quantization_config.to_dict(),
+        quantize_fn=quantize,
+        load_fn=load,
     )
-    end = time.time()
-    print(f"quantization ended and took {end - start}s")
+    print(f"quantized model loaded (cache {report['cache']}): {report}")
     # get the llm
-    llm = pipeline(
-        "text-generation",
-        model=quant_model,
-        tokenizer=tokenizer,
-        torch_dtype=torch.float16,
-        device_map="auto",
-        max_new_tokens=1024,
-    )
+    with span("pipeline_build", model=hf_model_name):
+        llm = pipeline(
+            "text-generation",
+            model=quant_model,
+            tokenizer=tokenizer,
+            torch_dtype=torch.float16,
+            device_map="auto",
+            max_new_tokens=1024,
+        )
+    if draft_model_name is not None:
+        with span("draft_load", model=draft_model_name):
+            # the quantized cache skips the login, the token is given directly
+            draft_model = load_draft_model(
+                draft_model_name,
+                quantization_config=quantization_config,
+                token=os.environ.get("HUGGINGFACE_ACCESS_TOKEN"),
+            )
+        llm = SpeculativeLLM(llm, draft_model, num_draft_tokens=num_draft_tokens)
+        print(f"speculative decoding with {draft_model_name}")
     print("finish to get the llm. let's generate text")
 
     return llm
@@ -0,0 +1,253 @@
+import sys
+import threading
+import time
+
+from . import instrumentation, warmup
+from .batching import MicroBatcher, with_batching
+from .generation_limits import GenerationLimits, count_prompt_tokens
+from .instrumentation import FirstTokenTimer, record_span, span
+from .model_server import ModelServer, memory_budget_gb
+from .prefix_cache import with_prefix_cache
+from .registry import get_model_spec, memory_estimate_gb
+from .response_cache import get_response_cache
+from .speculative import draft_model_name, num_draft_tokens, speculative_enabled
+from .streaming import CachedStream, TokenStream
+
+"""
+Generic endpoint of the gallery models.
+A model is only loaded the first time it is called, so importing this
+module, or a func_used.py built on it, costs nothing for the models that
+are never called. The models called are co-hosted by a ModelServer, which
+evicts the least recently used ones beyond LLM_MEMORY_BUDGET_GB.
+"""
+
+_load_lock = threading.Lock()
+_seed_lock = threading.Lock()
+_UNSET = object()
+_response_cache = _UNSET
+
+
+def load_llm(model_name: str):
+    """This function quantizes and loads the llm of a registry model
+
+    Args:
+        model_name (str): key of the model in the registry
+
+    Returns:
+        llm: llm ready to be call
+    """
+    spec = get_model_spec(model_name)
+    # torch and transformers are only imported with the first model
+    from .deploy_llm_easy import get_quant_model
+
+    with span("model_load", model=model_name):
+        llm = with_prefix_cache(
+            get_quant_model(
+                spec.hf_model_name,
+                draft_model_name=draft_model_name(spec.draft_model_name),
+                num_draft_tokens=num_draft_tokens(),
+            ),
+            spec.format_message,
+            has_system_prompt=spec.system_prompt is not None,
+        )
+    return with_batching(llm)
+
+
+server = ModelServer(
+    load_llm,
+    memory_budget_gb=memory_budget_gb(),
+    estimate_gb=lambda model_name: memory_estimate_gb(
+        get_model_spec(model_name), with_draft=speculative_enabled()
+    ),
+)
+
+
+class SeededLLM:
+    """llm whose calls are seeded. The random state of torch is global to
+    the process, so the seeded calls run one at a time, outside of the
+    micro-batches, and the random state of the other requests is restored
+    after each of them.
+
+    Args:
+        llm: the llm returned by load_llm
+        seed (int): seed of each call
+    """
+
+    def __init__(self, llm, seed: int):
+        # a batch mixes the random draws of its requests
+        self.llm = llm.llm if isinstance(llm, MicroBatcher) else llm
+        self.tokenizer = llm.tokenizer
+        self.seed = seed
+
+    def __call__(self, inputs, **generate_kwargs):
+        import torch
+        from transformers import set_seed
+
+        devices = range(torch.cuda.device_count())
+        with _seed_lock, torch.random.fork_rng(devices=devices):
+            set_seed(self.seed)
+            return self.llm(inputs, **generate_kwargs)
+
+
+def get_llm(model_name: str):
+    """This function returns the llm of a registry model,
+    quantizing and loading it on the first call only
+
+    Args:
+        model_name (str): key of the model in the registry
+
+    Returns:
+        llm: llm ready to be call
+    """
+    return server.get(model_name)
+
+
+def get_cache():
+    """This function returns the response cache configured by the
+    environment, built on the first call, or None when it is off
+    """
+    global _response_cache
+    if _response_cache is _UNSET:
+        with _load_lock:
+            if _response_cache is _UNSET:
+                _response_cache = get_response_cache()
+    return _response_cache
+
+
+def generate(model_name: str, message: str) -> dict:
+    """This function aims to generate text with a registry model
+    from a query
+
+    Args:
+        model_name (str): key of the model in the registry
+        message (str): the query
+
+    Returns:
+        dict: result from text generation
+    """
+    with span("request", model=model_name) as request_span:
+        spec = get_model_spec(model_name)
+        cache = get_cache()
+        if cache is not None:
+            results = cache.get(model_name, message, spec.generate_kwargs)
+            request_span.set(response_cache="miss" if results is None else "hit")
+            if results is not None:
+                return {"results": results}
+        # requests wait for the warm-up started by func_used.py, if any
+        warmup.wait_until_ready(model_name)
+        # the model can't be evicted while it serves the request
+        with server.use(model_name) as llm:
+            generate_kwargs = dict(spec.generate_kwargs)
+            seed = generate_kwargs.pop("seed", None)
+            if seed is not None:
+                # a seeded sampled generation is reproducible, hence cacheable
+                llm = SeededLLM(llm, seed)
+            with span("prompt_templating"):
+                prompt = spec.format_message(message)
+                limits = GenerationLimits(
+                    message,
+                    count_prompt_tokens(llm.tokenizer, prompt),
+                    max_new_tokens=generate_kwargs.get("max_new_tokens", 1024),
+                    stop_strings=spec.stop_strings,
+                )
+            # a batch is padded, its prompt length is found by the criteria
+            generate_kwargs.update(
+                limits.generate_kwargs(
+                    llm.tokenizer,
+                    prompt_length=(
+                        None if isinstance(llm, MicroBatcher) else limits.prompt_tokens
+                    ),
+                )
+            )
+            # the first sampled token splits the generation into prefill and decode,
+            # batched calls are timed as a whole
+            timer = None
+            if instrumentation.enabled() and not isinstance(llm, MicroBatcher):
+                from transformers import LogitsProcessorList
+
+                timer = FirstTokenTimer()
+                generate_kwargs["logits_processor"] = LogitsProcessorList([timer])
+            # generate text from llm
+            start = time.perf_counter()
+            output = llm(prompt, **generate_kwargs)
+            end = time.perf_counter()
+        warmup.record_request(model_name, end - start)
+        with span("post_processing"):
+            results = spec.parse_output(output)
+            new_tokens = len(llm.tokenizer.encode(results, add_special_tokens=False))
+            results, limit_metrics = limits.finish(results, new_tokens)
+        request_span.set(**limit_metrics)
+        if instrumentation.enabled():
+            if timer is not None and timer.end is not None:
+                record_span("prefill", start, timer.end)
+                record_span("decode", timer.end, end, new_tokens=new_tokens)
+            else:
+                record_span("generation", start, end, new_tokens=new_tokens)
+        # an answer cut by the wall time limit is not cached
+        if cache is not None and limit_metrics["stopped_by"] != "max_time":
+            cache.set(model_name, message, spec.generate_kwargs, results)
+        return {"results": results}
+
+
+def stream(model_name: str, message: str):
+    """This function aims to stream the text generated by a registry model
+    from a query, chunk by chunk. The stream goes through the same
+    response cache, prefix cache, limits and accounting as generate.
+
+    Args:
+        model_name (str): key of the model in the registry
+        message (str): the query
+
+    Returns:
+        TokenStream: iterator over the generated text chunks
+    """
+    spec = get_model_spec(model_name)
+    cache = get_cache()
+    if cache is not None:
+        results = cache.get(model_name, message, spec.generate_kwargs)
+        if results is not None:
+            return CachedStream(results)
+    generate_kwargs = dict(spec.generate_kwargs)
+    seed = generate_kwargs.pop("seed", None)
+    warmup.wait_until_ready(model_name)
+    # the model can't be evicted until the generation of the stream ends
+    usage = server.use(model_name)
+    llm = usage.__enter__()
+    try:
+        prompt = spec.format_message(message)
+        limits = GenerationLimits(
+            message,
+            count_prompt_tokens(llm.tokenizer, prompt),
+            max_new_tokens=generate_kwargs.get("max_new_tokens", 1024),
+            stop_strings=spec.stop_strings,
+        )
+        generate_kwargs.update(
+            limits.generate_kwargs(llm.tokenizer, prompt_length=limits.prompt_tokens)
+        )
+        tokenizer = llm.tokenizer
+
+        def complete(token_stream):
+            new_tokens = len(
+                tokenizer.encode(token_stream.raw_text, add_special_tokens=False)
+            )
+            results, limit_metrics = limits.finish(token_stream.raw_text, new_tokens)
+            warmup.record_request(model_name, token_stream.total_s)
+            if cache is not None and limit_metrics["stopped_by"] != "max_time":
+                cache.set(model_name, message, spec.generate_kwargs, results)
+
+        # the streamer works on a single generation: only the batcher is bypassed
+        if isinstance(llm, MicroBatcher):
+            llm = llm.llm
+        if seed is not None:
+            llm = SeededLLM(llm, seed)
+        return TokenStream(
+            llm,
+            prompt,
+            on_finish=lambda: usage.__exit__(None, None, None),
+            on_complete=complete,
+            stop_strings=limits.stop_strings,
+            **generate_kwargs,
+        )
+    except BaseException:
+        usage.__exit__(*sys.exc_info())
+        raise
@@ -0,0 +1,276 @@
+import os
+import re
+import threading
+import time
+
+"""
+Per-request generation limits.
+Instead of letting every request run to max_new_tokens, each query gets a
+token budget from its class (short question, explanation, long writing)
+bounded by the room its prompt leaves in the context window. The
+generation also stops on the stop strings of the model (the end of turn
+markers that are not its EOS token) and after a maximum wall time, which
+returns the text generated so far. The tokens generated against the
+budget and the reason of each stop are counted, so the GPU time of a
+request stays bounded and predictable.
+"""
+
+DEFAULT_BUDGETS = {"short": 256, "explain": 512, "long": 1024}
+LONG_WORDS = re.compile(
+    r"\b(write|story|essay|article|code|list|detail|detailed|rédige|écris|"
+    r"histoire|liste|détaill\w*)\b",
+    re.IGNORECASE,
+)
+EXPLAIN_WORDS = re.compile(
+    r"\b(explain|why|how(?! many| much)|describe|compare|explique|pourquoi|"
+    r"comment|décris)\b",
+    re.IGNORECASE,
+)
+SHORT_QUESTION_WORDS = 25
+
+
+def token_budgets() -> dict:
+    """LLM_TOKEN_BUDGETS: budget of each class, e.g. short=256,explain=512"""
+    budgets = dict(DEFAULT_BUDGETS)
+    for item in filter(None, os.environ.get("LLM_TOKEN_BUDGETS", "").split(",")):
+        name, value = item.split("=")
+        budgets[name.strip()] = int(value)
+    return budgets
+
+
+def classify(message: str) -> str:
+    """Class of a query: long writing, explanation or short question"""
+    if LONG_WORDS.search(message):
+        return "long"
+    if EXPLAIN_WORDS.search(message) or len(message.split()) > SHORT_QUESTION_WORDS:
+        return "explain"
+    return "short"
+
+
+def count_prompt_tokens(tokenizer, prompt) -> int:
+    """Number of tokens of a prompt given as text or as chat messages, the
+    bos token of a prompt starting with it is counted once
+    """
+    if isinstance(prompt, str):
+        bos_token = getattr(tokenizer, "bos_token", None)
+        add_special_tokens = not (bos_token and prompt.startswith(bos_token))
+        return len(tokenizer.encode(prompt, add_special_tokens=add_special_tokens))
+    return len(tokenizer.apply_chat_template(prompt, add_generation_prompt=True))
+
+
+def token_budget(message: str, prompt_tokens: int, max_new_tokens: int) -> tuple:
+    """This function gives the token budget of a query
+
+    Args:
+        message (str): the query
+        prompt_tokens (int): number of tokens of the prompt
+        max_new_tokens (int): upper bound of the model
+
+    Returns:
+        tuple: the class of the query and its budget, at least 1 token
+    """
+    query_class = classify(message)
+    context_tokens = int(os.environ.get("LLM_CONTEXT_TOKENS", 8192))
+    budget = min(
+        token_budgets()[query_class], max_new_tokens, context_tokens - prompt_tokens
+    )
+    return query_class, max(budget, 1)
+
+
+class StopStringCriteria:
+    """Stopping criteria ending a sequence once its last generated tokens
+    contain one of the stop strings. Special tokens are kept when decoding,
+    so end of turn markers like <|eot_id|> are seen. Only the tokens past
+    the prompt are decoded: the chat templates end with the same markers.
+    Without a prompt length, it is recorded on the first call and includes
+    the padding of a batch, which only holds when that call comes after a
+    single generated token: assisted generation can accept several tokens
+    in its first step, so it needs the prompt length.
+
+    Args:
+        tokenizer: tokenizer of the model
+        stop_strings (list): strings ending the generation
+        window (int): number of last tokens decoded at each step
+        prompt_length (int): number of tokens of the prompt
+    """
+
+    def __init__(
+        self,
+        tokenizer,
+        stop_strings: list,
+        window: int = 8,
+        prompt_length: int = None,
+    ):
+        self.tokenizer = tokenizer
+        self.stop_strings = list(stop_strings)
+        self.window = window
+        self.prompt_length = prompt_length
+
+    def __repr__(self):
+        # the micro-batcher groups the requests with the same criteria
+        return f"StopStringCriteria({self.stop_strings})"
+
+    def stopped(self, input_ids) -> list:
+        """This function checks which sequences end with a stop string
+
+        Args:
+            input_ids: the prompt and generated tokens, one row per sequence
+
+        Returns:
+            list: True for the sequences to stop
+        """
+        length = input_ids.shape[1]
+        if self.prompt_length is None:
+            self.prompt_length = length - 1
+        start = max(self.prompt_length, length - self.window)
+        if start >= length:
+            return [False] * input_ids.shape[0]
+        texts = self.tokenizer.batch_decode(input_ids[:, start:])
+        return [any(stop in text for stop in self.stop_strings) for text in texts]
+
+    def __call__(self, input_ids, scores, **kwargs):
+        import torch
+
+        return torch.tensor(self.stopped(input_ids), device=input_ids.device)
+
+
+class WallTimeCriteria:
+    """Stopping criteria ending the generation after max_time_s, the
+    text generated so far is returned
+    """
+
+    def __init__(self, max_time_s: float):
+        self.max_time_s = max_time_s
+        self.start = time.perf_counter()
+
+    def __repr__(self):
+        return f"WallTimeCriteria({self.max_time_s})"
+
+    def __call__(self, input_ids, scores, **kwargs):
+        return time.perf_counter() - self.start > self.max_time_s
+
+
+def trim_stop_strings(text: str, stop_strings: list) -> str:
+    """Text before the first stop string"""
+    for stop in stop_strings:
+        text = text.split(stop)[0]
+    return text
+
+
+class GenerationLimits:
+    """Limits of one request: token budget, stop strings and wall time
+
+    Args:
+        message (str): the query
+        prompt_tokens (int): number of tokens of the prompt
+        max_new_tokens (int): upper bound of the model
+        stop_strings (list): stop strings of the model
+        max_time_s (float): maximum wall time of the generation,
+            from LLM_MAX_WALL_TIME_S by default, None or 0 for no limit
+    """
+
+    def __init__(
+        self,
+        message: str,
+        prompt_tokens: int,
+        max_new_tokens: int = 1024,
+        stop_strings: list = None,
+        max_time_s: float = None,
+    ):
+        self.prompt_tokens = prompt_tokens
+        self.query_class, self.budget = token_budget(
+            message, prompt_tokens, max_new_tokens
+        )
+        self.stop_strings = list(stop_strings or [])
+        if max_time_s is None:
+            max_time_s = float(os.environ.get("LLM_MAX_WALL_TIME_S", 120))
+        self.max_time_s = max_time_s or None
+        self.start = None
+
+    def generate_kwargs(self, tokenizer, prompt_length: int = None) -> dict:
+        """Generation parameters applying the limits, the stop strings are
+        looked for past prompt_length tokens (past the first call without it)
+        """
+        from transformers import StoppingCriteriaList
+
+        criteria = StoppingCriteriaList()
+        if self.stop_strings and tokenizer is not None:
+            criteria.append(
+                StopStringCriteria(
+                    tokenizer, self.stop_strings, prompt_length=prompt_length
+                )
+            )
+        if self.max_time_s:
+            criteria.append(WallTimeCriteria(self.max_time_s))
+        self.start = time.perf_counter()
+        kwargs = {"max_new_tokens": self.budget}
+        if criteria:
+            kwargs["stopping_criteria"] = criteria
+        return kwargs
+
+    def finish(self, text: str, new_tokens: int) -> tuple:
+        """This function trims the stop strings of the generated text and
+        records why the generation stopped
+
+        Args:
+            text (str): the generated text
+            new_tokens (int): number of generated tokens
+
+        Returns:
+            tuple: the trimmed text and the metrics of the request
+        """
+        trimmed = trim_stop_strings(text, self.stop_strings)
+        duration = time.perf_counter() - (self.start or time.perf_counter())
+        if trimmed != text:
+            trimmed = trimmed.rstrip()
+            stopped_by = "stop_string"
+        elif new_tokens >= self.budget:
+            stopped_by = "budget"
+        elif self.max_time_s and duration >= self.max_time_s:
+            stopped_by = "max_time"
+        else:
+            stopped_by = "eos"
+        metrics = {
+            "query_class": self.query_class,
+            "budget": self.budget,
+            "new_tokens": new_tokens,
+            "stopped_by": stopped_by,
+        }
+        stats.record(metrics)
+        return trimmed, metrics
+
+
+class GenerationStats:
+    """Tokens generated against the budgets, and the stop reasons"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.requests = 0
+        self.budget_tokens = 0
+        self.new_tokens = 0
+        self.stopped_by = {}
+
+    def record(self, metrics: dict):
+        with self._lock:
+            self.requests += 1
+            self.budget_tokens += metrics["budget"]
+            self.new_tokens += metrics["new_tokens"]
+            reason = metrics["stopped_by"]
+            self.stopped_by[reason] = self.stopped_by.get(reason, 0) + 1
+
+    def metrics(self) -> dict:
+        return {
+            "requests": self.requests,
+            "new_tokens": self.new_tokens,
+            "budget_tokens": self.budget_tokens,
+            "budget_used": (
+                self.new_tokens / self.budget_tokens if self.budget_tokens else None
+            ),
+            "stopped_by": dict(self.stopped_by),
+        }
+
+
+stats = GenerationStats()
@@ -0,0 +1,237 @@
+import atexit
+import contextvars
+import functools
+import json
+import os
+import resource
+import sys
+import threading
+import time
+
+"""
+Structured spans of the model load and generation hot path.
+Spans are emitted to a pluggable sink chosen by the LLM_TRACE_SINK
+environment variable:
+- unset or "off": no tracing, span() returns a shared no-op object
+- "log": one json line per span printed in the logs
+- "jsonl:<path>": one json line per span appended to a file
+- "prometheus:<path>": count, sum and max of each span in Prometheus text
+  format, rewritten every few seconds
+"""
+
+_current_span = contextvars.ContextVar("current_span", default=None)
+
+
+def memory_high_water() -> dict:
+    """Peak memory of the process and, when torch uses a GPU, of the GPU"""
+    memory = {"peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024}
+    # only look at the GPU when torch is already imported by the model
+    torch = sys.modules.get("torch")
+    if torch is not None and torch.cuda.is_available():
+        memory["peak_gpu_mb"] = torch.cuda.max_memory_allocated() / 1024**2
+    return memory
+
+
+class LogSink:
+    def emit(self, record: dict):
+        print(json.dumps(record, default=str))
+
+
+class JsonLinesSink:
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def emit(self, record: dict):
+        line = json.dumps(record, default=str) + "\n"
+        with self._lock:
+            with open(self.path, "a") as f:
+                f.write(line)
+
+
+class PrometheusTextSink:
+    """Aggregate the spans by name and write them in Prometheus text
+    format, to be read by a node exporter textfile collector
+    """
+
+    def __init__(self, path: str, flush_interval_s: float = 5):
+        self.path = path
+        self.flush_interval_s = flush_interval_s
+        self._metrics = {}
+        self._last_flush = 0.0
+        self._lock = threading.Lock()
+        atexit.register(self.flush)
+
+    def emit(self, record: dict):
+        with self._lock:
+            count, total, maximum = self._metrics.get(record["name"], (0, 0.0, 0.0))
+            duration = record["duration_s"]
+            self._metrics[record["name"]] = (
+                count + 1,
+                total + duration,
+                max(maximum, duration),
+            )
+            if time.time() - self._last_flush < self.flush_interval_s:
+                return
+        self.flush()
+
+    def flush(self):
+        with self._lock:
+            self._last_flush = time.time()
+            lines = [
+                "# TYPE llm_span_seconds summary",
+                "# TYPE llm_span_seconds_max gauge",
+            ]
+            for name, (count, total, maximum) in sorted(self._metrics.items()):
+                lines += [
+                    f'llm_span_seconds_count{{span="{name}"}} {count}',
+                    f'llm_span_seconds_sum{{span="{name}"}} {total}',
+                    f'llm_span_seconds_max{{span="{name}"}} {maximum}',
+                ]
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, "w") as f:
+                f.write("\n".join(lines) + "\n")
+            os.replace(tmp_path, self.path)
+
+
+def sink_from_env():
+    """Build the sink configured by LLM_TRACE_SINK, None when tracing is off"""
+    setting = os.environ.get("LLM_TRACE_SINK", "off")
+    if setting == "off":
+        return None
+    if setting == "log":
+        return LogSink()
+    kind, _, path = setting.partition(":")
+    if kind == "jsonl" and path:
+        return JsonLinesSink(path)
+    if kind == "prometheus" and path:
+        return PrometheusTextSink(path)
+    raise ValueError(f"unknown LLM_TRACE_SINK {setting}")
+
+
+_sink = sink_from_env()
+
+
+def configure(sink):
+    """Replace the sink of the spans, None turns tracing off"""
+    global _sink
+    _sink = sink
+
+
+def enabled() -> bool:
+    return _sink is not None
+
+
+class _NoopSpan:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def set(self, **attributes):
+        pass
+
+
+_NOOP_SPAN = _NoopSpan()
+
+
+class Span:
+    def __init__(self, name: str, attributes: dict):
+        self.name = name
+        self.attributes = attributes
+
+    def set(self, **attributes):
+        """Add attributes known during the span, like token counts"""
+        self.attributes.update(attributes)
+
+    def __enter__(self):
+        self._parent = _current_span.get()
+        self._token = _current_span.set(self)
+        self._wall_start = time.time()
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        duration = time.perf_counter() - self._start
+        _current_span.reset(self._token)
+        if exc_type is not None:
+            self.attributes["error"] = repr(exc)
+        _emit(
+            self.name,
+            self._wall_start,
+            duration,
+            self._parent.name if self._parent is not None else None,
+            self.attributes,
+        )
+        return False
+
+
+def _emit(name, start, duration, parent, attributes):
+    sink = _sink
+    if sink is None:
+        return
+    record = {"name": name, "start": start, "duration_s": duration, "parent": parent}
+    record.update(memory_high_water())
+    record.update(attributes)
+    sink.emit(record)
+
+
+def span(name: str, **attributes):
+    """Context manager timing a step of the hot path
+
+    Args:
+        name (str): name of the step
+        attributes: information attached to the span
+
+    Returns:
+        the span, whose set method adds attributes before it ends
+    """
+    if _sink is None:
+        return _NOOP_SPAN
+    return Span(name, attributes)
+
+
+def record_span(name: str, start: float, end: float, **attributes):
+    """Emit a span measured elsewhere, from two time.perf_counter() values"""
+    if _sink is None:
+        return
+    parent = _current_span.get()
+    wall_start = time.time() - (time.perf_counter() - start)
+    _emit(
+        name,
+        wall_start,
+        end - start,
+        parent.name if parent is not None else None,
+        attributes,
+    )
+
+
+def traced(name: str):
+    """Decorator wrapping each call of a function in a span"""
+
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if _sink is None:
+                return function(*args, **kwargs)
+            with Span(name, {}):
+                return function(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+class FirstTokenTimer:
+    """Logits processor noting when the first token is sampled,
+    that is when the prefill of the prompt is over
+    """
+
+    def __init__(self):
+        self.end = None
+
+    def __call__(self, input_ids, scores):
+        if self.end is None:
+            self.end = time.perf_counter()
+        return scores
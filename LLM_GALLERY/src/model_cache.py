@@ -0,0 +1,248 @@
+import hashlib
+import json
+import os
+import shutil
+import time
+
+"""
+On-disk cache of already quantized models.
+Each entry is a folder named after a hash of the model id, the revision
+(a commit hash, so that a moving branch does not serve stale weights) and
+the quantization config, so a cold start can reload the 4 bit weights
+directly instead of downloading and quantizing the raw model again. The
+manifest of an entry lists the size of its files: an entry whose files
+are missing or truncated, or that fails to load, is removed and the model
+is quantized again.
+"""
+
+MANIFEST_NAME = "manifest.json"
+DEFAULT_CACHE_DIR = os.path.join(
+    os.path.expanduser("~"), ".cache", "llm_gallery", "quantized"
+)
+DEFAULT_MAX_SIZE_GB = 50
+
+
+def cache_key(hf_model_name: str, revision: str, quantization_config: dict) -> str:
+    """This function builds the content address of a cache entry
+
+    Args:
+        hf_model_name (str): huggingface id of the model
+        revision (str): revision (branch, tag or commit) of the model
+        quantization_config (dict): the quantization parameters
+
+    Returns:
+        str: sha256 hex digest identifying the entry
+    """
+    payload = json.dumps(
+        {
+            "model": hf_model_name,
+            "revision": revision,
+            "quantization": quantization_config,
+        },
+        sort_keys=True,
+        default=str,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def _folder_files(path: str) -> dict:
+    """Size of each file of a folder, by path relative to the folder"""
+    files = {}
+    for root, _, file_names in os.walk(path):
+        for file_name in file_names:
+            file_path = os.path.join(root, file_name)
+            try:
+                files[os.path.relpath(file_path, path)] = os.path.getsize(file_path)
+            except OSError:
+                pass
+    files.pop(MANIFEST_NAME, None)
+    return files
+
+
+class QuantModelCache:
+    """Content addressed folder cache with size based LRU eviction
+
+    Args:
+        cache_dir (str): folder holding the cache entries
+        max_size_bytes (int): size above which the least recently used
+            entries are removed
+    """
+
+    def __init__(self, cache_dir: str = None, max_size_bytes: int = None):
+        if cache_dir is None:
+            cache_dir = os.environ.get("LLM_QUANT_CACHE_DIR", DEFAULT_CACHE_DIR)
+        if max_size_bytes is None:
+            max_size_gb = float(
+                os.environ.get("LLM_QUANT_CACHE_MAX_GB", DEFAULT_MAX_SIZE_GB)
+            )
+            max_size_bytes = int(max_size_gb * 1024**3)
+        self.cache_dir = cache_dir
+        self.max_size_bytes = max_size_bytes
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    def path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key)
+
+    def lookup(self, key: str):
+        """Return the folder of a complete entry, or None on a miss.
+        A hit refreshes the entry for the LRU eviction, a corrupted entry
+        is removed.
+        """
+        manifest_path = os.path.join(self.path(key), MANIFEST_NAME)
+        if not os.path.isfile(manifest_path):
+            return None
+        try:
+            with open(manifest_path) as f:
+                files = json.load(f).get("files")
+        except ValueError:
+            files = None
+        else:
+            # the entries written before the file list are trusted
+            if files is None or _folder_files(self.path(key)) == files:
+                os.utime(manifest_path)
+                return self.path(key)
+        print(f"cache entry {key} is corrupted, it is removed")
+        self.remove(key)
+        return None
+
+    def remove(self, key: str):
+        shutil.rmtree(self.path(key), ignore_errors=True)
+
+    def store(self, key: str, write_fn, metadata: dict = None) -> str:
+        """Write a new entry with write_fn(folder) and publish it atomically
+
+        Args:
+            key (str): key returned by cache_key
+            write_fn (callable): function saving the artifacts into a folder
+            metadata (dict): extra information kept in the manifest
+
+        Returns:
+            str: folder of the stored entry
+        """
+        final_path = self.path(key)
+        tmp_path = f"{final_path}.tmp-{os.getpid()}"
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        os.makedirs(tmp_path)
+        try:
+            write_fn(tmp_path)
+            manifest = dict(metadata or {})
+            files = _folder_files(tmp_path)
+            manifest.update(
+                {
+                    "key": key,
+                    "created_at": time.time(),
+                    "size": sum(files.values()),
+                    "files": files,
+                }
+            )
+            with open(os.path.join(tmp_path, MANIFEST_NAME), "w") as f:
+                json.dump(manifest, f, default=str)
+            # another process may have published the same entry meanwhile
+            shutil.rmtree(final_path, ignore_errors=True)
+            os.rename(tmp_path, final_path)
+        except Exception:
+            shutil.rmtree(tmp_path, ignore_errors=True)
+            raise
+        self.evict(keep=key)
+        return final_path
+
+    def entries(self) -> list:
+        """List the complete entries as (key, last_used, size), oldest first"""
+        entries = []
+        for key in os.listdir(self.cache_dir):
+            manifest_path = os.path.join(self.path(key), MANIFEST_NAME)
+            if not os.path.isfile(manifest_path):
+                continue
+            try:
+                with open(manifest_path) as f:
+                    size = json.load(f).get("size", 0)
+            except ValueError:
+                size = 0
+            entries.append((key, os.path.getmtime(manifest_path), size))
+        return sorted(entries, key=lambda entry: entry[1])
+
+    def evict(self, keep: str = None) -> list:
+        """Remove the least recently used entries until the cache fits
+        in max_size_bytes. The entry `keep` is never removed.
+
+        Returns:
+            list: keys of the removed entries
+        """
+        entries = self.entries()
+        total_size = sum(size for _, _, size in entries)
+        removed = []
+        for key, _, size in entries:
+            if total_size <= self.max_size_bytes:
+                break
+            if key == keep:
+                continue
+            self.remove(key)
+            total_size -= size
+            removed.append(key)
+        return removed
+
+
+def get_cached_model(
+    cache: QuantModelCache,
+    hf_model_name: str,
+    revision: str,
+    quantization_config: dict,
+    quantize_fn,
+    load_fn,
+):
+    """This function returns the quantized model and tokenizer from the cache,
+    quantizing and storing them first on a miss
+
+    Args:
+        cache (QuantModelCache): the cache to use
+        hf_model_name (str): huggingface id of the model
+        revision (str): revision of the model, a commit hash
+        quantization_config (dict): the quantization parameters
+        quantize_fn (callable): quantize_fn() -> (model, tokenizer),
+            called on a miss
+        load_fn (callable): load_fn(folder) -> (model, tokenizer),
+            called on a hit
+
+    Returns:
+        tuple: (model, tokenizer, report) where report gives the
+        cache status and the duration of each step
+    """
+    key = cache_key(hf_model_name, revision, quantization_config)
+    report = {"model": hf_model_name, "revision": revision, "key": key}
+    start = time.time()
+    path = cache.lookup(key)
+    if path is not None:
+        try:
+            model, tokenizer = load_fn(path)
+        except Exception as e:
+            print(f"cache entry {key} does not load, it is removed:", e)
+            cache.remove(key)
+            start = time.time()
+        else:
+            report.update({"cache": "hit", "load_s": time.time() - start})
+            return model, tokenizer, report
+
+    model, tokenizer = quantize_fn()
+    quantized = time.time()
+
+    def write_fn(folder):
+        model.save_pretrained(folder)
+        tokenizer.save_pretrained(folder)
+
+    try:
+        cache.store(
+            key,
+            write_fn,
+            metadata={"model": hf_model_name, "revision": revision},
+        )
+    except OSError as e:
+        # a full disk must not prevent the model from being served
+        print("could not store the quantized model in the cache", e)
+    report.update(
+        {
+            "cache": "miss",
+            "quantize_s": quantized - start,
+            "save_s": time.time() - quantized,
+        }
+    )
+    return model, tokenizer, report
@@ -0,0 +1,205 @@
+import gc
+import os
+import statistics
+import sys
+import threading
+import time
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+
+"""
+Several quantized models co-hosted in one process.
+A 4 bit gallery model only uses 4 to 4.5GB, far less than a GPU. The
+server loads a model on its first request and keeps it while the models
+loaded fit in the memory budget. When a new model does not fit, the least
+recently used models that are not serving a request are evicted first.
+"""
+
+
+def model_memory_bytes(llm) -> int:
+    """Memory of the weights of an llm, draft model included, as given by
+    transformers, 0 when unknown
+    """
+    total = 0
+    while llm is not None:
+        for model in (getattr(llm, "model", None), getattr(llm, "draft_model", None)):
+            if hasattr(model, "get_memory_footprint"):
+                total += model.get_memory_footprint()
+        if total:
+            return total
+        # a wrapper, like the micro-batcher, keeps the llm it wraps
+        llm = getattr(llm, "llm", None)
+    return total
+
+
+def free_memory():
+    """Give the memory of the evicted models back to the GPU"""
+    gc.collect()
+    torch = sys.modules.get("torch")
+    if torch is not None and torch.cuda.is_available():
+        torch.cuda.empty_cache()
+
+
+class ModelServer:
+    """LRU set of loaded models under a memory budget, routed by name
+
+    Args:
+        loader (callable): loader(model_name) -> llm
+        memory_budget_gb (float): memory of the loaded models, None for no
+            limit
+        estimate_gb (callable): estimate_gb(model_name) -> expected memory of
+            a model before it is loaded, or None
+        memory_fn (callable): memory_fn(llm) -> bytes used by a loaded llm
+        latency_window (int): number of latencies kept per model
+    """
+
+    def __init__(
+        self,
+        loader,
+        memory_budget_gb: float = None,
+        estimate_gb=None,
+        memory_fn=model_memory_bytes,
+        latency_window: int = 1000,
+    ):
+        self.loader = loader
+        self.memory_budget = (
+            None if memory_budget_gb is None else memory_budget_gb * 1024**3
+        )
+        self.estimate_gb = estimate_gb
+        self.memory_fn = memory_fn
+        self.latency_window = latency_window
+        self._models = OrderedDict()
+        self._sizes = {}
+        self._in_use = {}
+        self._latencies = {}
+        self._counts = {}
+        self._lock = threading.Lock()
+        self._load_lock = threading.Lock()
+
+    def __contains__(self, model_name: str) -> bool:
+        return model_name in self._models
+
+    def _count(self, model_name: str, event: str):
+        counts = self._counts.setdefault(model_name, {"loads": 0, "evictions": 0})
+        counts[event] += 1
+
+    @property
+    def memory_used(self) -> int:
+        return sum(self._sizes.values())
+
+    def _evict_for(self, needed: int, keep: str = None):
+        """Evict the least recently used idle models until needed bytes fit"""
+        if self.memory_budget is None:
+            return
+        evicted = []
+        with self._lock:
+            for name in list(self._models):
+                if self.memory_used + needed <= self.memory_budget:
+                    break
+                if name == keep or self._in_use.get(name):
+                    continue
+                llm = self._models.pop(name)
+                self._sizes.pop(name)
+                self._count(name, "evictions")
+                evicted.append((name, llm))
+        for name, llm in evicted:
+            close = getattr(llm, "close", None)
+            if close is not None:
+                close()
+            print(f"model {name} evicted to free memory")
+        if evicted:
+            del llm, evicted
+            free_memory()
+        if self.memory_used + needed > self.memory_budget:
+            print(
+                f"memory budget exceeded: {self.memory_used / 1024**3:.1f}GB loaded "
+                f"and {needed / 1024**3:.1f}GB needed, the models in use are kept"
+            )
+
+    def get(self, model_name: str):
+        """This function returns the llm of a model, loading it on its first
+        request and evicting the least recently used models if needed
+
+        Args:
+            model_name (str): name of the model
+
+        Returns:
+            llm: llm ready to be call
+        """
+        with self._lock:
+            if model_name in self._models:
+                self._models.move_to_end(model_name)
+                return self._models[model_name]
+        # one load at a time, so two loads don't count on the same free memory
+        with self._load_lock:
+            with self._lock:
+                if model_name in self._models:
+                    self._models.move_to_end(model_name)
+                    return self._models[model_name]
+            estimate = self.estimate_gb(model_name) if self.estimate_gb else None
+            self._evict_for(int((estimate or 0) * 1024**3))
+            llm = self.loader(model_name)
+            size = self.memory_fn(llm) or int((estimate or 0) * 1024**3)
+            with self._lock:
+                self._models[model_name] = llm
+                self._sizes[model_name] = size
+                self._count(model_name, "loads")
+            # the estimate may be lower than the memory really used
+            self._evict_for(0, keep=model_name)
+        return llm
+
+    @contextmanager
+    def use(self, model_name: str):
+        """Context manager giving the llm of a model, which can't be evicted
+        until the context exits, and recording the latency of the request
+        """
+        with self._lock:
+            self._in_use[model_name] = self._in_use.get(model_name, 0) + 1
+        start = time.perf_counter()
+        try:
+            yield self.get(model_name)
+        finally:
+            latency = time.perf_counter() - start
+            with self._lock:
+                self._in_use[model_name] -= 1
+                self._latencies.setdefault(
+                    model_name, deque(maxlen=self.latency_window)
+                ).append(latency)
+
+    def stats(self) -> dict:
+        """This function gives the loaded models, the memory they use, and
+        the loads, evictions and latency of each model
+
+        Returns:
+            dict: loaded, memory_used_gb, memory_budget_gb and per model
+                loads, evictions, requests, p50_s and p95_s
+        """
+        with self._lock:
+            models = {}
+            for name in set(self._counts) | set(self._latencies):
+                latencies = sorted(self._latencies.get(name, []))
+                model = dict(self._counts.get(name, {"loads": 0, "evictions": 0}))
+                model["requests"] = len(latencies)
+                model["p50_s"] = statistics.median(latencies) if latencies else None
+                model["p95_s"] = (
+                    latencies[min(len(latencies) - 1, int(0.95 * len(latencies)))]
+                    if latencies
+                    else None
+                )
+                models[name] = model
+            return {
+                "loaded": list(self._models),
+                "memory_used_gb": self.memory_used / 1024**3,
+                "memory_budget_gb": (
+                    None if self.memory_budget is None else self.memory_budget / 1024**3
+                ),
+                "models": models,
+            }
+
+
+def memory_budget_gb():
+    """LLM_MEMORY_BUDGET_GB: memory of the models co-hosted by a process,
+    no limit by default
+    """
+    budget = os.environ.get("LLM_MEMORY_BUDGET_GB")
+    return float(budget) if budget else None
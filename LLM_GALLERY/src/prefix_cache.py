@@ -0,0 +1,263 @@
+import copy
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from .instrumentation import FirstTokenTimer
+from .speculative import SpeculativeLLM
+
+"""
+Reuse of the key/values of prompt prefixes shared by many requests.
+The system prompt prefix is encoded once when the model is loaded, and the
+prompts seen several times are kept in a memory bounded LRU cache. A request
+starting with a cached prefix only needs the prefill of its remaining tokens.
+"""
+
+
+def _cache_nbytes(past_key_values) -> int:
+    if hasattr(past_key_values, "layers"):
+        tensors = []
+        for layer in past_key_values.layers:
+            tensors += [layer.keys, layer.values]
+    elif isinstance(past_key_values, (tuple, list)):
+        # legacy format: one (key, value) tuple per layer
+        tensors = [tensor for layer in past_key_values for tensor in layer]
+    else:
+        tensors = list(past_key_values.key_cache) + list(past_key_values.value_cache)
+    return sum(t.numel() * t.element_size() for t in tensors if t is not None)
+
+
+def _common_prefix(a: list, b: list) -> list:
+    length = 0
+    for x, y in zip(a, b):
+        if x != y:
+            break
+        length += 1
+    return a[:length]
+
+
+class PrefixCache:
+    """Memory bounded LRU cache of prefix key/values, keyed by token ids.
+    Pinned entries, like the system prompt, are never evicted.
+
+    Args:
+        max_bytes (int): memory bound of the non pinned entries
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self._entries = OrderedDict()
+        self._pinned = set()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def match(self, ids: list):
+        """Return (prefix length, copy of the key/values) of the longest
+        cached prefix of ids leaving at least one token to encode,
+        or (0, None)
+        """
+        with self._lock:
+            best = None
+            for prefix in self._entries:
+                if len(prefix) < len(ids) and tuple(ids[: len(prefix)]) == prefix:
+                    if best is None or len(prefix) > len(best):
+                        best = prefix
+            if best is None:
+                return 0, None
+            self._entries.move_to_end(best)
+            # generate extends the cache in place, each request gets its own copy
+            return len(best), copy.deepcopy(self._entries[best][0])
+
+    def add(self, ids: list, past_key_values, pinned: bool = False):
+        key = tuple(ids)
+        nbytes = _cache_nbytes(past_key_values)
+        with self._lock:
+            if key in self._entries:
+                return
+            if not pinned and nbytes > self.max_bytes:
+                return
+            self._entries[key] = (past_key_values, nbytes)
+            if pinned:
+                self._pinned.add(key)
+                return
+            self.nbytes += nbytes
+            for other in list(self._entries):
+                if self.nbytes <= self.max_bytes:
+                    break
+                if other not in self._pinned:
+                    self.nbytes -= self._entries.pop(other)[1]
+
+
+class PrefixCachedLLM:
+    """Replacement of the llm pipeline reusing the key/values of the
+    cached prompt prefixes. It is called like the pipeline and returns
+    outputs of the same shape.
+
+    Args:
+        llm: the text-generation pipeline returned by get_quant_model
+        format_message (callable): prompt formatting of the model, used to
+            find the system prompt prefix
+        max_cache_mb (float): memory bound of the frequent prefixes
+        min_hits (int): number of times a prompt is seen before
+            its key/values are cached
+        cache_system_prompt (bool): encode the system prompt prefix at load
+    """
+
+    def __init__(
+        self,
+        llm,
+        format_message,
+        max_cache_mb: float = 256,
+        min_hits: int = 2,
+        cache_system_prompt: bool = True,
+    ):
+        self.llm = llm
+        self.model = llm.model
+        self.tokenizer = llm.tokenizer
+        self.cache = PrefixCache(int(max_cache_mb * 1024**2))
+        self.min_hits = min_hits
+        self.stats = {"hits": 0, "misses": 0, "prefill_s": 0.0, "cached_tokens": 0}
+        self._seen = {}
+        # the requests of the endpoint threads share the counters
+        self._lock = threading.Lock()
+        # the system prompt prefix is what two different queries have in common
+        system_prefix = _common_prefix(
+            self._encode(format_message("Hello")),
+            self._encode(format_message("Bonjour")),
+        )
+        if system_prefix and cache_system_prompt:
+            start = time.perf_counter()
+            self.cache.add(system_prefix, self._prefill(system_prefix), pinned=True)
+            print(
+                f"system prompt prefix of {len(system_prefix)} tokens "
+                f"encoded in {time.perf_counter() - start}s"
+            )
+
+    def _encode(self, inputs) -> list:
+        if isinstance(inputs, str):
+            # the prompt may already start with the bos token
+            bos_token = self.tokenizer.bos_token
+            add_special_tokens = not (bos_token and inputs.startswith(bos_token))
+            return self.tokenizer(inputs, add_special_tokens=add_special_tokens)[
+                "input_ids"
+            ]
+        return self.tokenizer.apply_chat_template(inputs, add_generation_prompt=True)
+
+    def _prefill(self, ids: list):
+        import torch
+
+        with torch.no_grad():
+            output = self.model(
+                torch.tensor([ids], device=self.model.device), use_cache=True
+            )
+        return output.past_key_values
+
+    def __call__(self, inputs, **generate_kwargs):
+        if isinstance(inputs, list) and inputs and not isinstance(inputs[0], dict):
+            return [self(one, **generate_kwargs) for one in inputs]
+        import torch
+        from transformers import LogitsProcessorList
+
+        generate_kwargs.pop("batch_size", None)
+        if generate_kwargs.pop("num_return_sequences", 1) != 1:
+            raise ValueError("PrefixCachedLLM generates one sequence per prompt")
+        return_full_text = generate_kwargs.pop("return_full_text", True)
+        # same limit as the pipeline built by get_quant_model
+        generate_kwargs.setdefault("max_new_tokens", 1024)
+
+        ids = self._encode(inputs)
+        prefix_length, past_key_values = self.cache.match(ids)
+        timer = FirstTokenTimer()
+        logits_processor = generate_kwargs.pop("logits_processor", None)
+        logits_processor = LogitsProcessorList(logits_processor or [])
+        logits_processor.append(timer)
+        start = time.perf_counter()
+        with torch.no_grad():
+            output = self.model.generate(
+                torch.tensor([ids], device=self.model.device),
+                attention_mask=torch.ones(
+                    1, len(ids), dtype=torch.long, device=self.model.device
+                ),
+                past_key_values=past_key_values,
+                logits_processor=logits_processor,
+                return_dict_in_generate=True,
+                pad_token_id=self.tokenizer.pad_token_id or self.tokenizer.eos_token_id,
+                **generate_kwargs,
+            )
+        self._record(prefix_length, (timer.end or time.perf_counter()) - start)
+        self._remember(ids, output.past_key_values)
+
+        text = self.tokenizer.decode(
+            output.sequences[0, len(ids) :], skip_special_tokens=True
+        )
+        if isinstance(inputs, str):
+            return [{"generated_text": inputs + text if return_full_text else text}]
+        if not return_full_text:
+            return [{"generated_text": text}]
+        return [
+            {"generated_text": list(inputs) + [{"role": "assistant", "content": text}]}
+        ]
+
+    def _record(self, prefix_length: int, prefill_s: float):
+        with self._lock:
+            self.stats["hits" if prefix_length else "misses"] += 1
+            self.stats["cached_tokens"] += prefix_length
+            self.stats["prefill_s"] += prefill_s
+
+    def _remember(self, ids: list, past_key_values):
+        # keep the key/values of the prompts seen often enough
+        if not hasattr(past_key_values, "crop"):
+            return
+        key = tuple(ids[:-1])
+        with self._lock:
+            if len(self._seen) > 10000:
+                self._seen.clear()
+            hits = self._seen.pop(key, 0) + 1
+            if hits < self.min_hits:
+                self._seen[key] = hits
+                return
+        # the key/values belong to this request, the cache has its own lock
+        past_key_values.crop(len(key))
+        self.cache.add(list(key), past_key_values)
+
+    def metrics(self) -> dict:
+        """Hit rate and prefill time of the prefix cache"""
+        with self._lock:
+            stats = dict(self.stats)
+        calls = stats["hits"] + stats["misses"]
+        return dict(
+            stats,
+            hit_rate=stats["hits"] / calls if calls else None,
+            mean_prefill_s=stats["prefill_s"] / calls if calls else None,
+            cache_entries=len(self.cache),
+            cache_bytes=self.cache.nbytes,
+        )
+
+
+def with_prefix_cache(llm, format_message, has_system_prompt: bool):
+    """This function wraps the llm into a PrefixCachedLLM for the models
+    with a system prompt. It is configured by the environment variables:
+    - LLM_PREFIX_CACHE_MB: memory bound of the frequent prefixes,
+      the prefix cache is off when 0 (default 256)
+    It is not used with request batching, whose padded batches don't share
+    a common prefix, nor with speculative decoding.
+
+    Args:
+        llm: the text-generation pipeline
+        format_message (callable): prompt formatting of the model
+        has_system_prompt (bool): whether the prompts share a system prompt
+
+    Returns:
+        the llm itself or its prefix cached version
+    """
+    max_cache_mb = float(os.environ.get("LLM_PREFIX_CACHE_MB", 256))
+    batching = int(os.environ.get("LLM_MAX_BATCH_SIZE", 1)) > 1
+    if max_cache_mb <= 0 or batching or not has_system_prompt:
+        return llm
+    if isinstance(llm, SpeculativeLLM):
+        return llm
+    return PrefixCachedLLM(llm, format_message, max_cache_mb=max_cache_mb)
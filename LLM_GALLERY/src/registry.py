@@ -0,0 +1,163 @@
+from dataclasses import dataclass, field
+
+from . import PREPROMPT
+
+"""
+Declarative registry of the gallery models.
+Each entry gives everything needed to deploy and call a model: its
+Hugging Face id, how to build its prompt, how to read its output, its
+generation defaults and its memory footprint. Adding a model to the
+gallery only takes a new entry in MODELS.
+"""
+
+
+def chat_messages(message: str, system_prompt: str = None) -> list:
+    """Chat messages for models whose tokenizer has a chat template"""
+    messages = [{"role": "user", "content": message}]
+    if system_prompt is not None:
+        messages.insert(0, {"role": "system", "content": system_prompt})
+    return messages
+
+
+def mistral_instruction(message: str, system_prompt: str = None) -> str:
+    """Mistral instruction prompt, the system prompt goes in the instruction"""
+    if system_prompt is None:
+        return f"<s>[INST] {message} [/INST]"
+    return f"<s>[INST] {system_prompt}\nquestion: {message} [/INST]"
+
+
+def last_chat_message(output: list) -> str:
+    """Content of the answer appended to the chat messages"""
+    return output[0]["generated_text"][-1]["content"].replace("\n", "")
+
+
+def after_instruction(output: list) -> str:
+    """Text generated after the [/INST] tag of the prompt"""
+    return output[0]["generated_text"].split("[/INST]")[1].replace("\n", "")
+
+
+CHAT_TEMPLATES = {
+    "chat": chat_messages,
+    "mistral_instruction": mistral_instruction,
+}
+OUTPUT_PARSERS = {
+    "last_chat_message": last_chat_message,
+    "after_instruction": after_instruction,
+}
+
+
+@dataclass
+class ModelSpec:
+    """Configuration of one gallery model
+
+    Args:
+        hf_model_name (str): huggingface id of the model
+        deployment_name (str): name of the pipeline and deployment
+        chat_template (str): key of CHAT_TEMPLATES formatting the query
+        output_parser (str): key of OUTPUT_PARSERS reading the answer
+        system_prompt (str): system prompt added to every query, if any
+        generate_kwargs (dict): generation defaults of the model, a "seed"
+            makes the sampled generations reproducible
+        vram_gb (float): VRAM needed to quantize the model and run it
+        disk_gb (float): disk needed to download and quantize the model
+        quantized_gb (float): size of the model quantized into 4 bits
+        draft_gb (float): size of the draft model quantized into 4 bits,
+            loaded next to the model with speculative decoding
+        function_path (str): file of the endpoint function in the container
+        function_name (str): name of the endpoint function
+        draft_model_name (str): small model with the same tokenizer, used
+            for speculative decoding when LLM_SPECULATIVE is on
+        stop_strings (list): strings ending the generation, like the end of
+            turn markers that are not the EOS token of the model
+    """
+
+    hf_model_name: str
+    deployment_name: str
+    chat_template: str = "chat"
+    output_parser: str = "last_chat_message"
+    system_prompt: str = None
+    generate_kwargs: dict = field(default_factory=dict)
+    vram_gb: float = None
+    disk_gb: float = None
+    quantized_gb: float = None
+    draft_gb: float = None
+    function_path: str = "/pipelines/llm_deploy/func_used.py"
+    function_name: str = "deploy_llm"
+    draft_model_name: str = None
+    stop_strings: list = field(default_factory=list)
+
+    def format_message(self, message: str):
+        return CHAT_TEMPLATES[self.chat_template](message, self.system_prompt)
+
+    def parse_output(self, output: list) -> str:
+        return OUTPUT_PARSERS[self.output_parser](output)
+
+
+MODELS = {
+    "llama3-8b": ModelSpec(
+        hf_model_name="meta-llama/Meta-Llama-3-8B-Instruct",
+        deployment_name="llm-llama3-8b",
+        system_prompt=PREPROMPT,
+        generate_kwargs={"top_k": 10, "max_new_tokens": 1024, "do_sample": True},
+        vram_gb=7.5,
+        disk_gb=20,
+        quantized_gb=4,
+        function_path="/pipelines/llama3_8B_deploy/func_used.py",
+        function_name="deploy_llama_easy",
+        draft_model_name="meta-llama/Llama-3.2-1B-Instruct",
+        draft_gb=1.1,
+        stop_strings=["<|eot_id|>", "<|start_header_id|>"],
+    ),
+    "mistral-7b": ModelSpec(
+        hf_model_name="mistralai/Mistral-7B-Instruct-v0.2",
+        deployment_name="llm-mistral-7b",
+        chat_template="mistral_instruction",
+        output_parser="after_instruction",
+        system_prompt=PREPROMPT,
+        generate_kwargs={"top_k": 10, "num_return_sequences": 1, "do_sample": True},
+        vram_gb=6,
+        disk_gb=18,
+        quantized_gb=3.5,
+        function_path="/pipelines/mistral_7b_deploy/func_used.py",
+        function_name="deploy_mistral_easy",
+        stop_strings=["[INST]"],
+    ),
+    "gemma2-9b": ModelSpec(
+        hf_model_name="google/gemma-2-9b-it",
+        deployment_name="llm-gemma2-9b",
+        vram_gb=8,
+        disk_gb=22,
+        quantized_gb=4.5,
+        function_path="/pipelines/gemma2_9b_deploy/func_used.py",
+        function_name="deploy_gemma2_easy",
+        draft_model_name="google/gemma-2-2b-it",
+        draft_gb=2.2,
+        stop_strings=["<end_of_turn>"],
+    ),
+}
+
+
+def memory_estimate_gb(spec: ModelSpec, with_draft: bool = False) -> float:
+    """Memory of a quantized model, with its draft model when it is loaded"""
+    if spec.quantized_gb is None:
+        return None
+    if with_draft and spec.draft_model_name is not None:
+        return spec.quantized_gb + (spec.draft_gb or 0)
+    return spec.quantized_gb
+
+
+def get_model_spec(model_name: str) -> ModelSpec:
+    """This function returns the registry entry of a model
+
+    Args:
+        model_name (str): key of the model in MODELS
+
+    Returns:
+        ModelSpec: the configuration of the model
+    """
+    try:
+        return MODELS[model_name]
+    except KeyError:
+        raise ValueError(
+            f"unknown model {model_name}, available models: {', '.join(MODELS)}"
+        )
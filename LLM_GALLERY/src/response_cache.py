@@ -0,0 +1,284 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+"""
+Cache of the answers of the gallery endpoints.
+A query is first looked up by exact match of its normalized prompt and
+generation parameters, then optionally by embedding similarity with the
+queries already answered. Sampled generations without a seed are not
+reproducible and always bypass the cache.
+"""
+
+
+def normalize_prompt(message: str) -> str:
+    """Case and whitespace insensitive form of a query"""
+    return " ".join(message.split()).casefold()
+
+
+def response_key(model_name: str, message: str, generate_kwargs: dict) -> str:
+    payload = json.dumps(
+        {
+            "model": model_name,
+            "message": normalize_prompt(message),
+            "generate_kwargs": generate_kwargs,
+        },
+        sort_keys=True,
+        default=str,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def is_cacheable(generate_kwargs: dict) -> bool:
+    """A sampled generation can only be cached when it is seeded"""
+    return not generate_kwargs.get("do_sample") or (
+        generate_kwargs.get("seed") is not None
+    )
+
+
+class MemoryStore:
+    """In-process store with TTL and LRU eviction
+
+    Args:
+        max_entries (int): number of entries above which the least
+            recently used one is removed
+        ttl_s (float): lifetime of an entry in seconds, None to keep it forever
+    """
+
+    def __init__(self, max_entries: int = 1024, ttl_s: float = None):
+        self.max_entries = max_entries
+        self.ttl_s = ttl_s
+        self._entries = OrderedDict()
+
+    def get(self, key: str):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        created_at, value = entry
+        if self.ttl_s is not None and time.time() - created_at > self.ttl_s:
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    def set(self, key: str, value):
+        self._entries[key] = (time.time(), value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+
+class FileStore:
+    """Local folder store, one json file per entry, with TTL and LRU
+    eviction. It survives restarts and can be shared by several processes.
+
+    Args:
+        cache_dir (str): folder of the entries
+        max_entries (int): number of entries above which the least
+            recently used ones are removed
+        ttl_s (float): lifetime of an entry in seconds, None to keep it forever
+    """
+
+    def __init__(self, cache_dir: str, max_entries: int = 1024, ttl_s: float = None):
+        self.cache_dir = cache_dir
+        self.max_entries = max_entries
+        self.ttl_s = ttl_s
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f"{key}.json")
+
+    def get(self, key: str):
+        path = self._path(key)
+        try:
+            with open(path) as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if self.ttl_s is not None and time.time() - entry["created_at"] > self.ttl_s:
+            os.remove(path)
+            return None
+        # the modification time orders the entries for the LRU eviction
+        os.utime(path)
+        return entry["value"]
+
+    def set(self, key: str, value):
+        tmp_path = f"{self._path(key)}.tmp-{os.getpid()}-{threading.get_ident()}"
+        with open(tmp_path, "w") as f:
+            json.dump({"created_at": time.time(), "value": value}, f)
+        os.replace(tmp_path, self._path(key))
+        paths = [
+            os.path.join(self.cache_dir, name)
+            for name in os.listdir(self.cache_dir)
+            if name.endswith(".json")
+        ]
+        if len(paths) > self.max_entries:
+            paths.sort(key=os.path.getmtime)
+            for path in paths[: len(paths) - self.max_entries]:
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+
+
+class ResponseCache:
+    """Exact and semantic cache of the endpoint answers
+
+    Args:
+        store: MemoryStore or FileStore holding the answers
+        embed_fn (callable): embed_fn(text) -> 1d vector, enables the
+            similarity tier when given
+        similarity_threshold (float): minimum cosine similarity of a
+            semantic hit
+        max_embeddings (int): number of queries kept for the similarity tier
+    """
+
+    def __init__(
+        self,
+        store,
+        embed_fn=None,
+        similarity_threshold: float = 0.95,
+        max_embeddings: int = 1024,
+    ):
+        self.store = store
+        self.embed_fn = embed_fn
+        self.similarity_threshold = similarity_threshold
+        self.max_embeddings = max_embeddings
+        self.stats = {"exact_hits": 0, "semantic_hits": 0, "misses": 0, "bypassed": 0}
+        self._embeddings = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, model_name: str, message: str, generate_kwargs: dict):
+        """Return the cached answer of a query, or None"""
+        if not is_cacheable(generate_kwargs):
+            with self._lock:
+                self.stats["bypassed"] += 1
+            return None
+        key = response_key(model_name, message, generate_kwargs)
+        with self._lock:
+            value = self.store.get(key)
+            if value is not None:
+                self.stats["exact_hits"] += 1
+                return value
+        value = self._similar(key, model_name, message, generate_kwargs)
+        with self._lock:
+            self.stats["semantic_hits" if value is not None else "misses"] += 1
+        return value
+
+    def set(self, model_name: str, message: str, generate_kwargs: dict, value):
+        if not is_cacheable(generate_kwargs):
+            return
+        key = response_key(model_name, message, generate_kwargs)
+        with self._lock:
+            self.store.set(key, value)
+        if self.embed_fn is not None:
+            embedding = self._embed(message)
+            with self._lock:
+                self._embeddings[key] = (
+                    self._scope(model_name, generate_kwargs),
+                    embedding,
+                )
+                while len(self._embeddings) > self.max_embeddings:
+                    self._embeddings.popitem(last=False)
+
+    def _scope(self, model_name: str, generate_kwargs: dict) -> str:
+        # a semantic hit must come from the same model and parameters
+        return response_key(model_name, "", generate_kwargs)
+
+    def _embed(self, message: str):
+        import numpy as np
+
+        embedding = np.asarray(self.embed_fn(normalize_prompt(message)), dtype=float)
+        return embedding / (np.linalg.norm(embedding) or 1.0)
+
+    def _similar(self, key, model_name, message, generate_kwargs):
+        if self.embed_fn is None or not self._embeddings:
+            return None
+        scope = self._scope(model_name, generate_kwargs)
+        embedding = self._embed(message)
+        best_key, best_similarity = None, self.similarity_threshold
+        with self._lock:
+            for other_key, (other_scope, other) in self._embeddings.items():
+                if other_scope != scope:
+                    continue
+                similarity = float(embedding @ other)
+                if similarity >= best_similarity:
+                    best_key, best_similarity = other_key, similarity
+            if best_key is None:
+                return None
+            value = self.store.get(best_key)
+            if value is None:
+                del self._embeddings[best_key]
+            return value
+
+    def metrics(self) -> dict:
+        """Hit and miss counters of the cache"""
+        lookups = sum(self.stats.values()) - self.stats["bypassed"]
+        hits = self.stats["exact_hits"] + self.stats["semantic_hits"]
+        return dict(self.stats, hit_rate=hits / lookups if lookups else None)
+
+
+def mean_pooling_embedder(model_name: str):
+    """This function builds an embed_fn from a huggingface encoder model
+    (for instance sentence-transformers/all-MiniLM-L6-v2) by mean pooling
+    its last hidden states
+
+    Args:
+        model_name (str): huggingface id of the encoder
+
+    Returns:
+        callable: embed_fn(text) -> 1d numpy vector
+    """
+    import torch
+    from transformers import AutoModel, AutoTokenizer
+
+    tokenizer = AutoTokenizer.from_pretrained(model_name)
+    model = AutoModel.from_pretrained(model_name)
+
+    def embed_fn(text: str):
+        inputs = tokenizer(text, return_tensors="pt", truncation=True)
+        with torch.no_grad():
+            hidden_states = model(**inputs).last_hidden_state[0]
+        return hidden_states.mean(dim=0).numpy()
+
+    return embed_fn
+
+
+def get_response_cache():
+    """This function builds the response cache configured by the
+    environment variables, or returns None when it is off:
+    - LLM_RESPONSE_CACHE: "off" (default), "memory" or "file"
+    - LLM_RESPONSE_CACHE_DIR: folder of the file store
+    - LLM_RESPONSE_CACHE_MAX_ENTRIES: LRU bound (default 1024)
+    - LLM_RESPONSE_CACHE_TTL_S: lifetime of an answer in seconds
+    - LLM_RESPONSE_CACHE_EMBEDDING_MODEL: encoder enabling the similarity tier
+    - LLM_RESPONSE_CACHE_SIMILARITY: minimum cosine similarity (default 0.95)
+    """
+    backend = os.environ.get("LLM_RESPONSE_CACHE", "off")
+    if backend == "off":
+        return None
+    max_entries = int(os.environ.get("LLM_RESPONSE_CACHE_MAX_ENTRIES", 1024))
+    ttl_s = os.environ.get("LLM_RESPONSE_CACHE_TTL_S")
+    ttl_s = float(ttl_s) if ttl_s else None
+    if backend == "memory":
+        store = MemoryStore(max_entries=max_entries, ttl_s=ttl_s)
+    elif backend == "file":
+        cache_dir = os.environ.get(
+            "LLM_RESPONSE_CACHE_DIR",
+            os.path.join(os.path.expanduser("~"), ".cache", "llm_gallery", "responses"),
+        )
+        store = FileStore(cache_dir, max_entries=max_entries, ttl_s=ttl_s)
+    else:
+        raise ValueError(f"unknown LLM_RESPONSE_CACHE backend {backend}")
+    embedding_model = os.environ.get("LLM_RESPONSE_CACHE_EMBEDDING_MODEL")
+    return ResponseCache(
+        store,
+        embed_fn=mean_pooling_embedder(embedding_model) if embedding_model else None,
+        similarity_threshold=float(
+            os.environ.get("LLM_RESPONSE_CACHE_SIMILARITY", 0.95)
+        ),
+        max_embeddings=max_entries,
+    )
@@ -0,0 +1,201 @@
+import os
+import threading
+import time
+
+"""
+Speculative (assisted) decoding of the gallery models.
+A small draft model sharing the tokenizer of the target proposes a few
+tokens, which the target checks in a single forward pass: every accepted
+draft token saves a decoding step of the large model. The target and the
+draft forward passes are counted, which gives the acceptance rate of the
+draft tokens. Assisted generation runs one sequence at a time, so it is
+not combined with request batching or with the prefix cache.
+"""
+
+
+def speculative_enabled() -> bool:
+    return os.environ.get("LLM_SPECULATIVE", "off").lower() == "on" or bool(
+        os.environ.get("LLM_DRAFT_MODEL")
+    )
+
+
+def draft_model_name(registry_draft_model: str = None):
+    """Draft model configured by the environment variables:
+    - LLM_SPECULATIVE: on to use the draft model of the registry (default off)
+    - LLM_DRAFT_MODEL: huggingface id of a draft model, turns it on
+    """
+    if not speculative_enabled():
+        return None
+    return os.environ.get("LLM_DRAFT_MODEL") or registry_draft_model
+
+
+def num_draft_tokens() -> int:
+    """LLM_NUM_DRAFT_TOKENS: tokens proposed by the draft per step (default 5)"""
+    return int(os.environ.get("LLM_NUM_DRAFT_TOKENS", 5))
+
+
+class SpeculativeLLM:
+    """Text-generation pipeline whose generations are assisted by a draft
+    model. The model.generate of the pipeline is wrapped, so the streaming
+    of the pipeline model is assisted too.
+
+    Args:
+        llm: the text-generation pipeline of the target model
+        draft_model: the draft causal LM, same tokenizer as the target
+        num_draft_tokens (int): tokens proposed by the draft per step
+    """
+
+    def __init__(self, llm, draft_model, num_draft_tokens: int = 5):
+        self.llm = llm
+        self.model = llm.model
+        self.tokenizer = llm.tokenizer
+        self.draft_model = draft_model
+        # a constant number of draft tokens, instead of the default heuristic
+        draft_model.generation_config.num_assistant_tokens = num_draft_tokens
+        draft_model.generation_config.num_assistant_tokens_schedule = "constant"
+        self.stats = {
+            "generations": 0,
+            "new_tokens": 0,
+            "target_forwards": 0,
+            "draft_forwards": 0,
+            "generate_s": 0.0,
+        }
+        # forwards counted per thread, so concurrent generations don't share them
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self.model.register_forward_hook(self._count_forward("target"))
+        draft_model.register_forward_hook(self._count_forward("draft"))
+        self._generate = self.model.generate
+        self.model.generate = self.generate
+
+    def _count_forward(self, name: str):
+        def hook(module, args, output):
+            self._forwards()[name] += 1
+
+        return hook
+
+    def _forwards(self) -> dict:
+        """Forward passes counted in the current thread"""
+        if not hasattr(self._local, "forwards"):
+            self._local.forwards = {"target": 0, "draft": 0}
+        return self._local.forwards
+
+    def generate(self, *args, **generate_kwargs):
+        """model.generate with the draft model as assistant, unless the
+        caller gives assistant_model=None. Generations run concurrently:
+        the draft model is only read, with its constant number of draft
+        tokens, and the lock only guards the update of the counters.
+        """
+        generate_kwargs.setdefault("assistant_model", self.draft_model)
+        assisted = generate_kwargs["assistant_model"] is not None
+        forwards = self._forwards()
+        before = dict(forwards)
+        input_ids = generate_kwargs.get("input_ids", args[0] if args else None)
+        start = time.perf_counter()
+        output = self._generate(*args, **generate_kwargs)
+        duration = time.perf_counter() - start
+        if assisted:
+            sequences = getattr(output, "sequences", output)
+            new_tokens = sequences.shape[-1] - (
+                0 if input_ids is None else input_ids.shape[-1]
+            )
+            with self._lock:
+                self.stats["generations"] += 1
+                self.stats["new_tokens"] += new_tokens
+                self.stats["generate_s"] += duration
+                for name in ("target", "draft"):
+                    self.stats[f"{name}_forwards"] += forwards[name] - before[name]
+        return output
+
+    def __call__(self, inputs, **generate_kwargs):
+        return self.llm(inputs, **generate_kwargs)
+
+    def metrics(self) -> dict:
+        """This function computes the acceptance rate of the draft tokens:
+        each target forward gives one token of its own plus the accepted
+        draft tokens, and each draft forward proposes one token
+
+        Returns:
+            dict: the counters, acceptance_rate, tokens_per_target_forward
+                and tokens_per_s
+        """
+        stats = dict(self.stats)
+        accepted = stats["new_tokens"] - stats["target_forwards"]
+        stats["acceptance_rate"] = (
+            max(accepted, 0) / stats["draft_forwards"]
+            if stats["draft_forwards"]
+            else None
+        )
+        stats["tokens_per_target_forward"] = (
+            stats["new_tokens"] / stats["target_forwards"]
+            if stats["target_forwards"]
+            else None
+        )
+        stats["tokens_per_s"] = (
+            stats["new_tokens"] / stats["generate_s"] if stats["generate_s"] else None
+        )
+        return stats
+
+
+def load_draft_model(
+    draft_model_name: str,
+    quantization_config=None,
+    torch_dtype=None,
+    token: str = None,
+):
+    """This function loads a draft model, quantized like the target so that
+    both fit the memory of the model (draft_gb in the registry), and so that
+    it computes in bfloat16, where Gemma 2 overflows in float16.
+    The token gives access to the gated draft models, like the Llama ones,
+    also when the target model comes from the quantized cache.
+    """
+    from transformers import AutoModelForCausalLM
+
+    return AutoModelForCausalLM.from_pretrained(
+        draft_model_name,
+        quantization_config=quantization_config,
+        torch_dtype=torch_dtype,
+        device_map="auto",
+        token=token,
+    )
+
+
+def check_greedy_equivalence(
+    llm: SpeculativeLLM, prompts: list, max_new_tokens: int = 64
+) -> dict:
+    """This function generates each prompt greedily with and without the
+    draft model, checks that the outputs are the same token for token and
+    measures the speedup
+
+    Args:
+        llm (SpeculativeLLM): the assisted llm
+        prompts (list): prompts given as text
+        max_new_tokens (int): tokens generated per prompt
+
+    Returns:
+        dict: equivalent, mismatches, tokens_per_s of both generations,
+            speedup and acceptance_rate
+    """
+    report = {"mismatches": [], "target_s": 0.0, "speculative_s": 0.0, "tokens": 0}
+    for prompt in prompts:
+        inputs = llm.tokenizer(prompt, return_tensors="pt").to(llm.model.device)
+        outputs = {}
+        for name, assistant in (("target", None), ("speculative", llm.draft_model)):
+            start = time.perf_counter()
+            outputs[name] = llm.generate(
+                **inputs,
+                assistant_model=assistant,
+                do_sample=False,
+                max_new_tokens=max_new_tokens,
+                pad_token_id=llm.tokenizer.eos_token_id,
+            )
+            report[f"{name}_s"] += time.perf_counter() - start
+        if outputs["target"].tolist() != outputs["speculative"].tolist():
+            report["mismatches"].append(prompt)
+        report["tokens"] += outputs["target"].shape[-1] - inputs["input_ids"].shape[-1]
+    report["equivalent"] = not report["mismatches"]
+    report["target_tokens_per_s"] = report["tokens"] / report["target_s"]
+    report["speculative_tokens_per_s"] = report["tokens"] / report["speculative_s"]
+    report["speedup"] = report["target_s"] / report["speculative_s"]
+    report["acceptance_rate"] = llm.metrics()["acceptance_rate"]
+    return report
@@ -0,0 +1,203 @@
+import threading
+import time
+
+from .generation_limits import trim_stop_strings
+from .instrumentation import record_span
+
+"""
+Streaming mode of the gallery llms.
+The generation runs in a background thread and a token streamer hands
+the decoded text back chunk by chunk, so the first words are available
+long before the whole answer is generated.
+"""
+
+
+def split_held_text(text: str, stop_strings: list) -> tuple:
+    """This function splits the text received by a stream into the text
+    that can be yielded and the text held back, which could be the start
+    of a stop string or the whitespace before one
+
+    Args:
+        text (str): the text received and not yielded yet
+        stop_strings (list): strings ending the generation
+
+    Returns:
+        tuple: the text to yield, the text held back and whether
+            a stop string was met
+    """
+    trimmed = trim_stop_strings(text, stop_strings)
+    if trimmed != text:
+        return trimmed.rstrip(), "", True
+    held = max(
+        (
+            size
+            for stop in stop_strings
+            for size in range(1, len(stop))
+            if text.endswith(stop[:size])
+        ),
+        default=0,
+    )
+    keep = len(text[: len(text) - held].rstrip())
+    return text[:keep], text[keep:], False
+
+
+class TokenStream:
+    """Iterate over the text chunks generated by the llm pipeline.
+    Works both as a generator (for chunk in stream) and as an async
+    iterator (async for chunk in stream). The text from the first stop
+    string on is never yielded, like generate trims it.
+
+    Args:
+        llm: the text-generation pipeline returned by get_quant_model, or
+            the PrefixCachedLLM wrapping it, called on a single prompt
+        inputs: the prompt or the chat messages given to the llm
+        on_finish (callable): called once the generation ended, or when a
+            stream that was never iterated is dropped
+        on_complete (callable): called with the stream once all its
+            chunks were read
+        stop_strings (list): strings ending the generation
+        generate_kwargs: generation parameters forwarded to the llm
+
+    Attributes:
+        text (str): the text yielded so far
+        raw_text (str): the text generated so far, stop strings included
+        ttft_s (float): time to first token, in seconds
+        inter_token_latencies_s (list): delay between consecutive chunks
+    """
+
+    def __init__(
+        self,
+        llm,
+        inputs,
+        on_finish=None,
+        on_complete=None,
+        stop_strings: list = None,
+        **generate_kwargs,
+    ):
+        from transformers import TextIteratorStreamer
+
+        self._streamer = TextIteratorStreamer(
+            llm.tokenizer, skip_prompt=True, skip_special_tokens=True
+        )
+        self._error = None
+        # the thread is created by __iter__, so a stream never iterated is
+        # freed, and releases its llm, as soon as it is dropped
+        self._thread = None
+        self._args = (llm, inputs, dict(generate_kwargs, streamer=self._streamer))
+        self._on_finish = on_finish
+        self._on_complete = on_complete
+        self.stop_strings = list(stop_strings or [])
+        self._reset()
+
+    def _reset(self):
+        self.text = ""
+        self.raw_text = ""
+        self.ttft_s = None
+        self.total_s = None
+        self.inter_token_latencies_s = []
+        self._start = None
+        self._last = None
+
+    def _generate(self, llm, inputs, generate_kwargs):
+        try:
+            llm(inputs, **generate_kwargs)
+        except Exception as e:
+            self._error = e
+            # unblock the consumer waiting on the streamer
+            self._streamer.end()
+        finally:
+            self._finish()
+
+    def _finish(self):
+        on_finish, self._on_finish = self._on_finish, None
+        if on_finish is not None:
+            on_finish()
+
+    def __del__(self):
+        if getattr(self, "_on_finish", None) and self._thread is None:
+            self._finish()
+
+    def _chunks(self):
+        self._thread = threading.Thread(
+            target=self._generate, args=self._args, daemon=True
+        )
+        self._thread.start()
+        yield from self._streamer
+        self._thread.join()
+        if self._error is not None:
+            raise self._error
+
+    def __iter__(self):
+        self._start = time.time()
+        held = ""
+        stopped = False
+        for chunk in self._chunks():
+            self.raw_text += chunk
+            # the generation ends a few tokens after the stop string
+            if stopped or not chunk:
+                continue
+            text, held, stopped = split_held_text(held + chunk, self.stop_strings)
+            if text:
+                self._record(text)
+                yield text
+        if held:
+            self._record(held)
+            yield held
+        self.total_s = time.time() - self._start
+        end = time.perf_counter()
+        record_span("stream", end - self.total_s, end, **self.metrics())
+        on_complete, self._on_complete = self._on_complete, None
+        if on_complete is not None:
+            on_complete(self)
+
+    def _record(self, chunk: str):
+        now = time.time()
+        if self.ttft_s is None:
+            self.ttft_s = now - self._start
+        else:
+            self.inter_token_latencies_s.append(now - self._last)
+        self._last = now
+        self.text += chunk
+
+    async def __aiter__(self):
+        # only the async consumers pay the import of asyncio
+        import asyncio
+
+        iterator = iter(self)
+        done = object()
+        while True:
+            chunk = await asyncio.to_thread(next, iterator, done)
+            if chunk is done:
+                return
+            yield chunk
+
+    def metrics(self) -> dict:
+        """Time to first token and inter-token latency of the stream"""
+        latencies = self.inter_token_latencies_s
+        return {
+            "ttft_s": self.ttft_s,
+            "mean_inter_token_s": sum(latencies) / len(latencies) if latencies else None,
+            "max_inter_token_s": max(latencies) if latencies else None,
+            "chunks": len(latencies) + (self.ttft_s is not None),
+            "total_s": self.total_s,
+        }
+
+
+class CachedStream(TokenStream):
+    """TokenStream of an answer found in the response cache, yielded
+    as a single chunk
+
+    Args:
+        text (str): the cached answer
+    """
+
+    def __init__(self, text: str):
+        self._cached = text
+        self._thread = None
+        self._on_finish = None
+        self._on_complete = None
+        self.stop_strings = []
+        self._reset()
+
+    def _chunks(self):
+        yield self._cached
@@ -0,0 +1,237 @@
+import importlib.util
+import os
+import statistics
+import threading
+import time
+from collections import deque
+
+from .instrumentation import span
+from .registry import get_model_spec
+
+"""
+Warm-up and readiness of the gallery models.
+The first generation of a freshly loaded model pays one-off costs: CUDA
+kernel selection, the first use of the tokenizer and the allocation of the
+KV cache. The warm-up runs a few synthetic generations at several prompt
+lengths, and the model is only reported ready, and its requests only
+served, once they are done. A model warms up once: the callers arriving
+while it runs wait for it, and a failed warm-up is reported without being
+run again. In a step of the platform, func_used.py warms its model up when
+it is imported, before the deployment serves any request. Elsewhere,
+importing it loads nothing by default, so tests and tools can import it:
+the models then warm up with LLM_WARMUP=on, before the first request of a
+deployment whose warm_up input is true (as set by the deployment script),
+or through the explicit warmup entry point of func_used.py. The latency of
+the first real request and of the last requests after it are recorded to
+check the gap is closed.
+"""
+
+# one synthetic generation per prompt length, in tokens
+DEFAULT_PROMPT_TOKENS = (16, 256, 1024)
+SYNTHETIC_TEXT = (
+    "The quick brown fox jumps over the lazy dog while the weather stays "
+    "sunny and the river keeps flowing towards the sea. "
+)
+
+# latencies kept per model after its first request
+LATENCY_WINDOW = 1000
+
+_ready = {}
+_running = set()
+_reports = {}
+_first_latencies = {}
+_latencies = {}
+_requests = {}
+_lock = threading.Lock()
+
+
+def in_platform_step() -> bool:
+    """Whether the code runs in a step of the platform, which injects its
+    execution context module there
+    """
+    return importlib.util.find_spec("__craft_internal_execution_context") is not None
+
+
+def warmup_mode() -> str:
+    """on warms up during the import (default in a step of the platform),
+    background in a thread whose end gates the requests, off (default
+    elsewhere) loads the model on its first call or its explicit warm-up
+    """
+    default = "on" if in_platform_step() else "off"
+    return os.environ.get("LLM_WARMUP", default).lower()
+
+
+def prompt_lengths() -> list:
+    lengths = os.environ.get("LLM_WARMUP_PROMPT_TOKENS")
+    if not lengths:
+        return list(DEFAULT_PROMPT_TOKENS)
+    return [int(length) for length in lengths.split(",")]
+
+
+def synthetic_message(tokenizer, n_tokens: int, variant: int = 0) -> str:
+    """A message of about n_tokens tokens, different for each variant so
+    the prefix cache of the prompts is not filled by the warm-up
+    """
+    text = f"{variant}. " + SYNTHETIC_TEXT * (n_tokens // 8 + 1)
+    if tokenizer is None:
+        return " ".join(text.split()[:n_tokens])
+    token_ids = tokenizer.encode(text, add_special_tokens=False)[:n_tokens]
+    return tokenizer.decode(token_ids)
+
+
+def run_warmup(
+    llm,
+    format_message,
+    generate_kwargs: dict = None,
+    prompt_tokens: list = None,
+    max_new_tokens: int = None,
+) -> list:
+    """This function runs one synthetic generation per prompt length
+
+    Args:
+        llm: llm to warm up
+        format_message (callable): message -> prompt of the model
+        generate_kwargs (dict): generation parameters of the model
+        prompt_tokens (list): prompt lengths in tokens, from
+            LLM_WARMUP_PROMPT_TOKENS by default
+        max_new_tokens (int): tokens generated by each run, from
+            LLM_WARMUP_MAX_NEW_TOKENS by default
+
+    Returns:
+        list: prompt_tokens and latency_s of each run
+    """
+    generate_kwargs = dict(generate_kwargs or {})
+    generate_kwargs.pop("seed", None)
+    generate_kwargs["max_new_tokens"] = max_new_tokens or int(
+        os.environ.get("LLM_WARMUP_MAX_NEW_TOKENS", "16")
+    )
+    runs = []
+    tokenizer = getattr(llm, "tokenizer", None)
+    for variant, n_tokens in enumerate(prompt_tokens or prompt_lengths()):
+        prompt = format_message(synthetic_message(tokenizer, n_tokens, variant))
+        start = time.perf_counter()
+        with span("warmup", prompt_tokens=n_tokens):
+            llm(prompt, **generate_kwargs)
+        runs.append(
+            {"prompt_tokens": n_tokens, "latency_s": time.perf_counter() - start}
+        )
+    return runs
+
+
+def warmup(model_name: str) -> dict:
+    """This function loads a registry model, warms it up and marks it ready,
+    only once: the calls arriving while it runs wait for it, the next ones
+    give its report. A failed warm-up is reported once and still marks the
+    model ready, the requests then pay the one-off costs themselves.
+
+    Args:
+        model_name (str): key of the model in the registry
+
+    Returns:
+        dict: load_s, runs and total_s of the warm-up, or its error
+    """
+    # the endpoint imports this module, so it is imported here
+    from .endpoint import get_llm
+
+    with _lock:
+        # the requests arriving meanwhile wait for the warm-up
+        ready = _ready.setdefault(model_name, threading.Event())
+        if model_name in _reports:
+            return _reports[model_name]
+        running = model_name in _running
+        _running.add(model_name)
+    if running:
+        ready.wait()
+        return _reports[model_name]
+    spec = get_model_spec(model_name)
+    report = {"model": model_name}
+    start = time.perf_counter()
+    try:
+        llm = get_llm(model_name)
+        report["load_s"] = time.perf_counter() - start
+        report["runs"] = run_warmup(llm, spec.format_message, spec.generate_kwargs)
+    except Exception as e:
+        report["error"] = repr(e)
+    report["total_s"] = time.perf_counter() - start
+    print("Warm-up:", report)
+    with _lock:
+        _reports[model_name] = report
+        _running.discard(model_name)
+    ready.set()
+    return report
+
+
+def start(model_name: str, mode: str = None):
+    """This function starts the warm-up of a model as configured by
+    LLM_WARMUP, from the import of its func_used.py
+
+    Args:
+        model_name (str): key of the model in the registry
+        mode (str): on, background or off, from warmup_mode() by default
+    """
+    mode = mode or warmup_mode()
+    if mode == "off":
+        return
+    with _lock:
+        if model_name in _ready:
+            return
+        _ready[model_name] = threading.Event()
+    if mode == "background":
+        threading.Thread(target=warmup, args=(model_name,), daemon=True).start()
+    else:
+        warmup(model_name)
+
+
+def wait_until_ready(model_name: str, timeout_s: float = None) -> bool:
+    """Block until the warm-up of a model is done, right away if the
+    model has no warm-up
+
+    Returns:
+        bool: False when the timeout expired first
+    """
+    event = _ready.get(model_name)
+    return event is None or event.wait(timeout_s)
+
+
+def is_ready(model_name: str) -> bool:
+    """A model without warm-up is always ready, it loads on its first call"""
+    event = _ready.get(model_name)
+    return event is None or event.is_set()
+
+
+def record_request(model_name: str, latency_s: float):
+    """Record the latency of a request served by the model"""
+    with _lock:
+        _requests[model_name] = _requests.get(model_name, 0) + 1
+        first = model_name not in _first_latencies
+        if first:
+            _first_latencies[model_name] = latency_s
+        else:
+            _latencies.setdefault(model_name, deque(maxlen=LATENCY_WINDOW)).append(
+                latency_s
+            )
+    if first:
+        print(
+            f"first request of {model_name}: {latency_s:.3f}s "
+            f"(warmed up: {model_name in _reports})"
+        )
+
+
+def status(model_name: str) -> dict:
+    """This function gives the readiness of a model, its warm-up report
+    and the latency of its first request against the next ones
+
+    Returns:
+        dict: ready, warmup, first_request_s, steady_state_p50_s, over the
+            last LATENCY_WINDOW requests, and steady_state_requests
+    """
+    with _lock:
+        steady = list(_latencies.get(model_name, []))
+        requests = _requests.get(model_name, 0)
+    return {
+        "ready": is_ready(model_name),
+        "warmup": _reports.get(model_name),
+        "first_request_s": _first_latencies.get(model_name),
+        "steady_state_p50_s": statistics.median(steady) if steady else None,
+        "steady_state_requests": max(requests - 1, 0),
+    }
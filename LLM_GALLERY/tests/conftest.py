@@ -0,0 +1,8 @@
+import os
+import sys
+
+LLM_GALLERY = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# the tests import the src package, like the pipelines run from LLM_GALLERY,
+# and the deployment script, like it is run from the repository
+sys.path.insert(0, LLM_GALLERY)
+sys.path.insert(1, os.path.dirname(LLM_GALLERY))
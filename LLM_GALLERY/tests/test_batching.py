@@ -0,0 +1,122 @@
+import threading
+import time
+
+import pytest
+
+from src.batching import MicroBatcher, with_batching
+
+
+class FakeTokenizer:
+    eos_token = "</s>"
+    pad_token = None
+    padding_side = "right"
+
+
+class FakePipeline:
+    """text-generation pipeline answering each prompt with its own text"""
+
+    def __init__(self, error=None):
+        self.tokenizer = FakeTokenizer()
+        self.calls = []
+        self.error = error
+
+    def __call__(self, inputs, batch_size=1, **generate_kwargs):
+        self.calls.append((list(inputs), batch_size, generate_kwargs))
+        if self.error is not None:
+            raise self.error
+        return [[{"generated_text": f"{prompt}!"}] for prompt in inputs]
+
+
+@pytest.fixture
+def pipeline():
+    return FakePipeline()
+
+
+def call_concurrently(batcher, requests: list) -> list:
+    """Results of the requests, (prompt, generate_kwargs), sent together"""
+    results = [None] * len(requests)
+
+    def call(i, prompt, generate_kwargs):
+        try:
+            results[i] = batcher(prompt, **generate_kwargs)
+        except Exception as e:
+            results[i] = e
+
+    threads = [
+        threading.Thread(target=call, args=(i, *request))
+        for i, request in enumerate(requests)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+
+def test_padding_token_and_side(pipeline):
+    batcher = MicroBatcher(pipeline)
+    batcher.close()
+    assert pipeline.tokenizer.pad_token == "</s>"
+    assert pipeline.tokenizer.padding_side == "left"
+
+
+def test_concurrent_requests_share_a_batch(pipeline):
+    batcher = MicroBatcher(pipeline, max_batch_size=4, max_wait_ms=5000)
+    start = time.monotonic()
+    results = call_concurrently(batcher, [(f"q{i}", {}) for i in range(4)])
+    batcher.close()
+    # a full batch runs without waiting for max_wait_ms
+    assert time.monotonic() - start < 5
+    assert len(pipeline.calls) == 1
+    prompts, batch_size, _ = pipeline.calls[0]
+    assert sorted(prompts) == ["q0", "q1", "q2", "q3"]
+    assert batch_size == 4
+    # each caller gets the output of its own prompt
+    assert results == [[{"generated_text": f"q{i}!"}] for i in range(4)]
+    assert batcher.stats == {"requests": 4, "batches": 1, "max_batch_size_seen": 4}
+
+
+def test_requests_are_grouped_by_generation_parameters(pipeline):
+    batcher = MicroBatcher(pipeline, max_batch_size=4, max_wait_ms=5000)
+    requests = [("a", {"top_k": 10}), ("b", {"top_k": 5})] * 2
+    results = call_concurrently(batcher, requests)
+    batcher.close()
+    assert sorted(
+        (sorted(prompts), batch_size, kwargs)
+        for prompts, batch_size, kwargs in pipeline.calls
+    ) == [(["a", "a"], 2, {"top_k": 10}), (["b", "b"], 2, {"top_k": 5})]
+    assert results == [[{"generated_text": f"{prompt}!"}] for prompt, _ in requests]
+
+
+def test_a_lone_request_is_flushed_after_max_wait(pipeline):
+    batcher = MicroBatcher(pipeline, max_batch_size=8, max_wait_ms=20)
+    start = time.monotonic()
+    assert batcher("alone") == [{"generated_text": "alone!"}]
+    batcher.close()
+    assert 0.02 <= time.monotonic() - start < 2
+    assert pipeline.calls == [(["alone"], 1, {})]
+
+
+def test_an_error_reaches_every_request_of_the_batch():
+    pipeline = FakePipeline(error=RuntimeError("out of memory"))
+    batcher = MicroBatcher(pipeline, max_batch_size=3, max_wait_ms=5000)
+    results = call_concurrently(batcher, [(f"q{i}", {}) for i in range(3)])
+    # the batching thread keeps serving after a failed batch
+    pipeline.error = None
+    assert call_concurrently(batcher, [("next", {})] * 3) == [
+        [{"generated_text": "next!"}]
+    ] * 3
+    batcher.close()
+    assert len(pipeline.calls) == 2
+    assert all(isinstance(result, RuntimeError) for result in results)
+
+
+def test_with_batching_is_off_by_default(monkeypatch, pipeline):
+    monkeypatch.delenv("LLM_MAX_BATCH_SIZE", raising=False)
+    assert with_batching(pipeline) is pipeline
+    monkeypatch.setenv("LLM_MAX_BATCH_SIZE", "4")
+    monkeypatch.setenv("LLM_MAX_WAIT_MS", "50")
+    batcher = with_batching(pipeline)
+    batcher.close()
+    assert isinstance(batcher, MicroBatcher)
+    assert (batcher.max_batch_size, batcher.max_wait_s) == (4, 0.05)
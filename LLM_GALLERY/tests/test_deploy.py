@@ -0,0 +1,108 @@
+import random
+import time
+
+import pytest
+
+from LLM_GALLERY.pipelines import deploy
+from LLM_GALLERY.src.registry import get_model_spec
+
+MODELS = ["mistral-7b", "llama3-8b", "gemma2-9b"]
+
+
+class FakeClock:
+    """Clock only moving forward when sleep is called"""
+
+    def __init__(self):
+        self.now = 0.0
+        self.sleeps = []
+
+    def time(self):
+        return self.now
+
+    def sleep(self, duration_s):
+        self.sleeps.append(duration_s)
+        self.now += duration_s
+
+
+@pytest.fixture(autouse=True)
+def local_directory(monkeypatch, tmp_path):
+    monkeypatch.setenv("LOCAL_DIRECTORY", str(tmp_path))
+
+
+def test_models_are_deployed_concurrently():
+    sdk = deploy.FakeSdk(latency_s=0.05, pending_polls=2)
+    start = time.perf_counter()
+    reports = deploy.deploy_models(MODELS, sdk=sdk, sleep=lambda s: None)
+    duration = time.perf_counter() - start
+    # 2 deletions, 2 creations, 3 status calls and 1 call per deployment
+    assert duration < 2 * 8 * 0.05
+    assert [report["model"] for report in reports] == MODELS
+    assert all("error" not in report for report in reports)
+    for model_name in MODELS:
+        deployment = sdk.deployments[get_model_spec(model_name).deployment_name]
+        assert deployment["mode"] == "low_latency"
+        assert len(deployment["triggers"]) == 1
+
+
+def test_backoff_has_full_jitter_and_one_status_call_per_iteration():
+    random.seed(0)
+    clock = FakeClock()
+    sdk = deploy.FakeSdk(latency_s=0, pending_polls=7)
+    sdk.create_pipeline("llm-test")
+    sdk.create_deployment("llm-test", "llm-test")
+    deployment = deploy.wait_for_deployment(
+        sdk,
+        "llm-test",
+        initial_delay_s=2,
+        max_delay_s=30,
+        sleep=clock.sleep,
+        clock=clock.time,
+    )
+    assert deployment["status"] == "up"
+    assert sdk.calls.count(("get_deployment", "llm-test")) == 8
+    bounds = [2, 4, 8, 16, 30, 30, 30]
+    assert len(clock.sleeps) == len(bounds)
+    assert all(0 <= slept <= bound for slept, bound in zip(clock.sleeps, bounds))
+    # the delays are drawn, not the bounds themselves
+    assert len(set(clock.sleeps)) == len(bounds)
+
+
+def test_polling_stops_at_the_timeout():
+    clock = FakeClock()
+    sdk = deploy.FakeSdk(latency_s=0, pending_polls=10**6)
+    sdk.create_pipeline("llm-test")
+    sdk.create_deployment("llm-test", "llm-test")
+    with pytest.raises(TimeoutError):
+        deploy.wait_for_deployment(
+            sdk, "llm-test", timeout_s=600, sleep=clock.sleep, clock=clock.time
+        )
+    assert 600 < clock.now < 600 + 60
+
+
+def test_failed_deployment_is_reported_with_the_others(capsys):
+    failing = get_model_spec("llama3-8b").deployment_name
+    sdk = deploy.FakeSdk(latency_s=0, pending_polls=1, failing=[failing])
+    reports = {
+        report["model"]: report
+        for report in deploy.deploy_models(MODELS, sdk=sdk, sleep=lambda s: None)
+    }
+    assert "creation_failed" in reports["llama3-8b"]["error"]
+    assert sdk.deployments[failing]["triggers"] == []
+    for model_name in ("mistral-7b", "gemma2-9b"):
+        assert reports[model_name]["wait_up_s"] is not None
+        assert reports[model_name]["first_call_s"] is not None
+    output = capsys.readouterr().out
+    assert "llama3-8b   failed: RuntimeError" in output
+    assert "all deployments took" in output
+
+
+def test_warm_up_is_a_constant_input_of_the_deployment():
+    sdk = deploy.FakeSdk(latency_s=0, pending_polls=0)
+    deploy.build_pipeline_deploy("mistral-7b", sdk=sdk, warm_up=False)
+    mapping = sdk.deployments["llm-mistral-7b"]["inputs_mapping"]
+    constants = {
+        source.pipeline_input_name: source.constant_value
+        for source in mapping
+        if source.constant_value is not None
+    }
+    assert constants == {"warm_up": False}
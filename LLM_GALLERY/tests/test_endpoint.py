@@ -0,0 +1,164 @@
+import contextlib
+import dataclasses
+import sys
+import threading
+import time
+import types
+
+import pytest
+
+from src import endpoint, registry
+from src.batching import MicroBatcher
+from src.model_server import ModelServer
+from src.response_cache import MemoryStore, ResponseCache
+
+GB = 1024**3
+
+
+class FakeRandom:
+    """Global random state of the fake torch"""
+
+    def __init__(self):
+        self.state = 0
+
+    @contextlib.contextmanager
+    def fork_rng(self, devices=()):
+        state = self.state
+        try:
+            yield
+        finally:
+            self.state = state
+
+
+class FakeTokenizer:
+    bos_token = "<s>"
+    eos_token = "</s>"
+    pad_token = None
+
+    def encode(self, text, add_special_tokens=True):
+        return [0] * len(text.split())
+
+
+class FakeLLM:
+    """llm whose answer is the random state, drawn during a short sleep"""
+
+    def __init__(self, random):
+        self.tokenizer = FakeTokenizer()
+        self.random = random
+        self.calls = 0
+        self.running = 0
+        self.max_running = 0
+        # a barrier makes the calls wait for each other
+        self.barrier = None
+        self._lock = threading.Lock()
+
+    def __call__(self, inputs, **generate_kwargs):
+        with self._lock:
+            self.calls += 1
+            self.running += 1
+            self.max_running = max(self.max_running, self.running)
+        if self.barrier is not None:
+            self.barrier.wait()
+        time.sleep(0.01)
+        answer = f" answer {self.random.state}"
+        with self._lock:
+            self.running -= 1
+        return [{"generated_text": inputs + answer}]
+
+
+@pytest.fixture
+def random(monkeypatch):
+    random = FakeRandom()
+    torch = types.ModuleType("torch")
+    torch.random = random
+    torch.cuda = types.SimpleNamespace(device_count=lambda: 0)
+    transformers = types.ModuleType("transformers")
+    transformers.StoppingCriteriaList = list
+    transformers.LogitsProcessorList = list
+
+    def set_seed(seed):
+        random.state = seed
+
+    transformers.set_seed = set_seed
+    monkeypatch.setitem(sys.modules, "torch", torch)
+    monkeypatch.setitem(sys.modules, "transformers", transformers)
+    return random
+
+
+@pytest.fixture
+def llm(monkeypatch, random):
+    llm = FakeLLM(random)
+    server = ModelServer(lambda model_name: llm, memory_fn=lambda llm: GB)
+    monkeypatch.setattr(endpoint, "server", server)
+    monkeypatch.setattr(endpoint, "_response_cache", None)
+    return llm
+
+
+def set_generate_kwargs(monkeypatch, **generate_kwargs):
+    spec = dataclasses.replace(
+        registry.MODELS["mistral-7b"], generate_kwargs=generate_kwargs
+    )
+    monkeypatch.setitem(registry.MODELS, "mistral-7b", spec)
+
+
+def test_seeded_generations_run_one_at_a_time(monkeypatch, llm, random):
+    set_generate_kwargs(monkeypatch, do_sample=True, seed=7)
+    results = []
+
+    def request(i):
+        results.append(endpoint.generate("mistral-7b", f"question {i}"))
+
+    threads = [threading.Thread(target=request, args=(i,)) for i in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert results == [{"results": " answer 7"}] * 4
+    assert llm.max_running == 1
+    # the random state of the other requests is left untouched
+    assert random.state == 0
+
+
+def test_unseeded_generations_are_not_serialized(monkeypatch, llm, random):
+    set_generate_kwargs(monkeypatch, do_sample=True)
+    llm.barrier = threading.Barrier(2, timeout=5)
+    threads = [
+        threading.Thread(target=endpoint.generate, args=("mistral-7b", "question"))
+        for _ in range(2)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert not llm.barrier.broken
+    assert llm.max_running == 2
+
+
+def test_seeded_llm_bypasses_the_micro_batcher(llm):
+    batcher = MicroBatcher(llm)
+    try:
+        seeded = endpoint.SeededLLM(batcher, 3)
+        assert seeded.llm is llm
+        assert seeded("<s>[INST] Hi [/INST]") == [
+            {"generated_text": "<s>[INST] Hi [/INST] answer 3"}
+        ]
+    finally:
+        batcher.close()
+
+
+@pytest.mark.parametrize(
+    "generate_kwargs, calls",
+    [
+        ({"do_sample": True, "seed": 7}, 1),
+        ({"do_sample": False}, 1),
+        # an unseeded sampled answer is not reproducible
+        ({"do_sample": True}, 2),
+    ],
+)
+def test_response_cache(monkeypatch, llm, generate_kwargs, calls):
+    monkeypatch.setattr(endpoint, "_response_cache", ResponseCache(MemoryStore()))
+    set_generate_kwargs(monkeypatch, **generate_kwargs)
+    first = endpoint.generate("mistral-7b", "What is  the capital?")
+    second = endpoint.generate("mistral-7b", "what is the capital?")
+    assert first == second
+    assert llm.calls == calls
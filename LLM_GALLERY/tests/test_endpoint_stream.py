@@ -0,0 +1,150 @@
+import queue
+import sys
+import threading
+import types
+
+import pytest
+
+from src import endpoint
+from src.model_server import ModelServer
+from src.streaming import split_held_text
+
+GB = 1024**3
+
+
+class FakeStreamer:
+    """TextIteratorStreamer fed by the fake llm"""
+
+    def __init__(self, tokenizer, skip_prompt=True, skip_special_tokens=True):
+        self._queue = queue.Queue()
+
+    def send(self, text):
+        self._queue.put(text)
+
+    def end(self):
+        self._queue.put(None)
+
+    def __iter__(self):
+        while True:
+            text = self._queue.get()
+            if text is None:
+                return
+            yield text
+
+
+class FakeTokenizer:
+    def apply_chat_template(self, messages, add_generation_prompt=True):
+        return [0] * 10
+
+    def encode(self, text, add_special_tokens=True):
+        return [0] * len(text.split())
+
+
+class FakeLLM:
+    """llm streaming two chunks, the second one once release is set"""
+
+    def __init__(self):
+        self.tokenizer = FakeTokenizer()
+        self.release = threading.Event()
+
+    def __call__(self, inputs, streamer=None, **generate_kwargs):
+        streamer.send("Hello")
+        self.release.wait(5)
+        streamer.send(" world")
+        streamer.end()
+
+
+class LeakingLLM:
+    """llm going on after the stop string of mistral, split over two chunks"""
+
+    def __init__(self):
+        self.tokenizer = FakeTokenizer()
+
+    def __call__(self, inputs, streamer=None, **generate_kwargs):
+        for text in ["Paris is", " the capital. [IN", "ST] And", " more"]:
+            streamer.send(text)
+        streamer.end()
+
+
+class FakeResponseCache:
+    def __init__(self):
+        self.entries = {}
+
+    def get(self, model_name, message, generate_kwargs):
+        return self.entries.get((model_name, message))
+
+    def set(self, model_name, message, generate_kwargs, value):
+        self.entries[(model_name, message)] = value
+
+
+@pytest.fixture
+def server(monkeypatch):
+    transformers = types.ModuleType("transformers")
+    transformers.TextIteratorStreamer = FakeStreamer
+    transformers.StoppingCriteriaList = list
+    monkeypatch.setitem(sys.modules, "transformers", transformers)
+    llms = {}
+
+    def load(model_name):
+        llms[model_name] = LeakingLLM() if model_name == "mistral-7b" else FakeLLM()
+        return llms[model_name]
+
+    # room for a single model
+    server = ModelServer(load, memory_budget_gb=1.5, memory_fn=lambda llm: GB)
+    server.llms = llms
+    monkeypatch.setattr(endpoint, "server", server)
+    return server
+
+
+def test_streamed_model_is_not_evicted_until_the_stream_ends(server):
+    stream = endpoint.stream("llama3-8b", "Hi")
+    chunks = iter(stream)
+    assert next(chunks) == "Hello"
+    # another model is loaded while the stream is read
+    with server.use("mistral-7b"):
+        pass
+    assert "llama3-8b" in server
+    server.llms["llama3-8b"].release.set()
+    assert "".join(chunks) == " world"
+    assert stream.text == "Hello world"
+    with server.use("gemma2-9b"):
+        pass
+    assert "llama3-8b" not in server
+
+
+def test_stream_never_read_releases_its_model(server):
+    stream = endpoint.stream("llama3-8b", "Hi")
+    del stream
+    with server.use("mistral-7b"):
+        pass
+    assert "llama3-8b" not in server
+
+
+def test_stop_string_does_not_leak_and_the_answer_is_accounted(server, monkeypatch):
+    cache = FakeResponseCache()
+    monkeypatch.setattr(endpoint, "_response_cache", cache)
+    requests = []
+    monkeypatch.setattr(
+        endpoint.warmup,
+        "record_request",
+        lambda model_name, latency_s: requests.append(model_name),
+    )
+    stream = endpoint.stream("mistral-7b", "What is the capital of France?")
+    chunks = list(stream)
+    assert "".join(chunks) == "Paris is the capital."
+    assert not any("[" in chunk for chunk in chunks)
+    assert stream.raw_text.endswith("[INST] And more")
+    assert requests == ["mistral-7b"]
+    assert cache.entries == {
+        ("mistral-7b", "What is the capital of France?"): "Paris is the capital."
+    }
+    # the next stream of the query is served by the response cache
+    cached = endpoint.stream("mistral-7b", "What is the capital of France?")
+    assert list(cached) == ["Paris is the capital."]
+    assert requests == ["mistral-7b"]
+
+
+def test_split_held_text():
+    assert split_held_text("Hello [IN", ["[INST]"]) == ("Hello", " [IN", False)
+    assert split_held_text("Hello [INST] more", ["[INST]"]) == ("Hello", "", True)
+    assert split_held_text("Hello [world", ["[INST]"]) == ("Hello [world", "", False)
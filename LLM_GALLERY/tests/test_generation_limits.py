@@ -0,0 +1,81 @@
+import numpy as np
+
+from src.generation_limits import (
+    StopStringCriteria,
+    count_prompt_tokens,
+    trim_stop_strings,
+)
+
+# Llama 3 chat prompt: its end matches the stop strings of the registry
+VOCAB = {
+    0: "<|begin_of_text|>",
+    1: "Hello",
+    2: "<|eot_id|>",
+    3: "<|start_header_id|>",
+    4: "assistant",
+    5: "<|end_header_id|>",
+    6: " Hi",
+    7: " there",
+}
+PROMPT = [0, 1, 2, 3, 4, 5]
+STOP_STRINGS = ["<|eot_id|>", "<|start_header_id|>"]
+
+
+class FakeTokenizer:
+    def batch_decode(self, rows):
+        return ["".join(VOCAB[int(token)] for token in row) for row in rows]
+
+
+def criteria_calls(generated: list) -> list:
+    """Results of the criteria after each generated token, like generate()"""
+    criteria = StopStringCriteria(FakeTokenizer(), STOP_STRINGS)
+    return [
+        criteria.stopped(np.array([PROMPT + generated[: step + 1]]))[0]
+        for step in range(len(generated))
+    ]
+
+
+def test_prompt_end_does_not_stop_the_generation():
+    assert criteria_calls([6, 7]) == [False, False]
+
+
+def test_generated_stop_string_stops_the_generation():
+    assert criteria_calls([6, 7, 2]) == [False, False, True]
+
+
+def test_prompt_length_includes_the_batch_padding():
+    criteria = StopStringCriteria(FakeTokenizer(), STOP_STRINGS)
+    # the shorter prompt is left-padded with <|eot_id|>
+    batch = np.array([PROMPT + [6], [2, 2] + PROMPT[2:] + [6]])
+    assert criteria.stopped(batch) == [False, False]
+    batch = np.column_stack([batch, [7, 2]])
+    assert criteria.stopped(batch) == [False, True]
+
+
+def test_trim_stop_strings():
+    assert trim_stop_strings(" Hi there<|eot_id|>", STOP_STRINGS) == " Hi there"
+
+
+def test_given_prompt_length_checks_several_tokens_of_the_first_step():
+    # assisted generation can accept a stop string and a token after it
+    # in its first step
+    criteria = StopStringCriteria(
+        FakeTokenizer(), STOP_STRINGS, prompt_length=len(PROMPT)
+    )
+    assert criteria.stopped(np.array([PROMPT + [6, 7, 2, 6]])) == [True]
+    criteria = StopStringCriteria(
+        FakeTokenizer(), STOP_STRINGS, prompt_length=len(PROMPT)
+    )
+    assert criteria.stopped(np.array([PROMPT + [6, 7, 6]])) == [False]
+
+
+def test_prompt_tokens_count_the_bos_token_once():
+    class Tokenizer:
+        bos_token = "<s>"
+
+        def encode(self, text, add_special_tokens=True):
+            tokens = text.replace("<s>", "<s> ").split()
+            return (["<s>"] if add_special_tokens else []) + tokens
+
+    assert count_prompt_tokens(Tokenizer(), "<s>[INST] Hi [/INST]") == 4
+    assert count_prompt_tokens(Tokenizer(), "[INST] Hi [/INST]") == 4
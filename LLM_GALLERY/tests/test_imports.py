@@ -0,0 +1,43 @@
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+LLM_GALLERY = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HEAVY_MODULES = ("torch", "transformers", "huggingface_hub", "bitsandbytes")
+FUNC_USED = sorted(
+    folder
+    for folder in os.listdir(os.path.join(LLM_GALLERY, "pipelines"))
+    if os.path.exists(os.path.join(LLM_GALLERY, "pipelines", folder, "func_used.py"))
+)
+
+
+def imported_heavy_modules(code: str) -> list:
+    """Heavy modules imported by the code, run in a new process"""
+    check = (
+        f"{code}; import json, sys; "
+        f"print(json.dumps([m for m in {HEAVY_MODULES!r} if m in sys.modules]))"
+    )
+    result = subprocess.run(
+        [sys.executable, "-c", check],
+        capture_output=True,
+        text=True,
+        cwd=LLM_GALLERY,
+        env=dict(os.environ, LLM_WARMUP="off", LLM_WARMUP_MODELS=""),
+    )
+    assert result.returncode == 0, result.stderr
+    return json.loads(result.stdout.splitlines()[-1])
+
+
+@pytest.mark.parametrize("module", ["src.endpoint", "src.deploy_llm_easy"])
+def test_gallery_module_imports_no_heavy_package(module):
+    assert imported_heavy_modules(f"import {module}") == []
+
+
+@pytest.mark.parametrize("folder", FUNC_USED)
+def test_func_used_imports_no_heavy_package(folder):
+    # func_used.py is run from its folder by the platform
+    code = f"import sys; sys.path.insert(0, 'pipelines/{folder}'); import func_used"
+    assert imported_heavy_modules(code) == []
@@ -0,0 +1,101 @@
+import json
+
+import pytest
+
+from src import instrumentation
+from src.instrumentation import (
+    JsonLinesSink,
+    PrometheusTextSink,
+    record_span,
+    sink_from_env,
+    span,
+    traced,
+)
+
+
+class ListSink:
+    def __init__(self):
+        self.records = []
+
+    def emit(self, record: dict):
+        self.records.append(record)
+
+
+@pytest.fixture
+def sink(monkeypatch):
+    sink = ListSink()
+    monkeypatch.setattr(instrumentation, "_sink", sink)
+    return sink
+
+
+def test_no_span_is_recorded_when_tracing_is_off(monkeypatch):
+    monkeypatch.setattr(instrumentation, "_sink", None)
+    assert not instrumentation.enabled()
+    with span("request") as request_span:
+        request_span.set(tokens=3)
+    record_span("decode", 0.0, 1.0)
+
+
+def test_nested_spans_and_attributes(sink):
+    with span("request", model="llama3-8b") as request_span:
+        with span("prompt_templating"):
+            pass
+        record_span("decode", 1.0, 1.5, new_tokens=12)
+        request_span.set(stopped_by="eos")
+    templating, decode, request = sink.records
+    assert templating["name"] == "prompt_templating"
+    assert templating["parent"] == "request"
+    assert decode["duration_s"] == 0.5
+    assert decode["parent"] == "request"
+    assert decode["new_tokens"] == 12
+    assert request["parent"] is None
+    assert request["model"] == "llama3-8b"
+    assert request["stopped_by"] == "eos"
+    assert "peak_rss_mb" in request
+
+
+def test_span_records_the_error(sink):
+    with pytest.raises(RuntimeError):
+        with span("model_load"):
+            raise RuntimeError("out of memory")
+    assert sink.records[0]["error"] == "RuntimeError('out of memory')"
+
+
+def test_traced_function(sink):
+    @traced("quantization")
+    def quantize(x):
+        return 2 * x
+
+    assert quantize(2) == 4
+    assert [record["name"] for record in sink.records] == ["quantization"]
+
+
+def test_sink_from_env(monkeypatch, tmp_path):
+    monkeypatch.delenv("LLM_TRACE_SINK", raising=False)
+    assert sink_from_env() is None
+    monkeypatch.setenv("LLM_TRACE_SINK", f"jsonl:{tmp_path / 'spans.jsonl'}")
+    assert isinstance(sink_from_env(), JsonLinesSink)
+    monkeypatch.setenv("LLM_TRACE_SINK", "statsd")
+    with pytest.raises(ValueError):
+        sink_from_env()
+
+
+def test_json_lines_sink(tmp_path):
+    path = tmp_path / "spans.jsonl"
+    sink = JsonLinesSink(str(path))
+    sink.emit({"name": "request", "duration_s": 0.1})
+    sink.emit({"name": "decode", "duration_s": 0.2})
+    lines = path.read_text().splitlines()
+    assert [json.loads(line)["name"] for line in lines] == ["request", "decode"]
+
+
+def test_prometheus_sink_aggregates_the_spans(tmp_path):
+    path = tmp_path / "llm.prom"
+    sink = PrometheusTextSink(str(path), flush_interval_s=3600)
+    for duration in [0.5, 1.5]:
+        sink.emit({"name": "request", "duration_s": duration})
+    sink.flush()
+    lines = path.read_text().splitlines()
+    assert 'llm_span_seconds_count{span="request"} 2' in lines
+    assert 'llm_span_seconds_sum{span="request"} 2.0' in lines
+    assert 'llm_span_seconds_max{span="request"} 1.5' in lines
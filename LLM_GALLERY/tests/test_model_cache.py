@@ -0,0 +1,157 @@
+import os
+import sys
+from types import SimpleNamespace
+
+import pytest
+
+from src.deploy_llm_easy import resolve_revision
+from src.model_cache import MANIFEST_NAME, QuantModelCache, cache_key, get_cached_model
+
+MODEL_NAME = "org/tiny-model"
+COMMIT = "0123456789abcdef0123456789abcdef01234567"
+QUANTIZATION = {"load_in_4bit": True, "bnb_4bit_quant_type": "nf4"}
+
+
+class TinyModel:
+    """Model whose weights are a few bytes, saved like a transformers model"""
+
+    def __init__(self, weights: bytes):
+        self.weights = weights
+
+    def save_pretrained(self, folder):
+        with open(os.path.join(folder, "model.safetensors"), "wb") as f:
+            f.write(self.weights)
+
+
+class TinyTokenizer:
+    def save_pretrained(self, folder):
+        with open(os.path.join(folder, "tokenizer.json"), "w") as f:
+            f.write("{}")
+
+
+class FakeQuantizer:
+    def __init__(self):
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        return TinyModel(b"4bit" * 256), TinyTokenizer()
+
+
+def load(folder):
+    with open(os.path.join(folder, "model.safetensors"), "rb") as f:
+        return TinyModel(f.read()), TinyTokenizer()
+
+
+def get(cache, quantize, load_fn=load):
+    return get_cached_model(cache, MODEL_NAME, COMMIT, QUANTIZATION, quantize, load_fn)
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return QuantModelCache(str(tmp_path / "cache"), max_size_bytes=10**6)
+
+
+def test_miss_then_hit(cache):
+    quantize = FakeQuantizer()
+    model, _, report = get(cache, quantize)
+    assert report["cache"] == "miss"
+    loaded, _, report = get(cache, quantize)
+    assert report["cache"] == "hit"
+    assert quantize.calls == 1
+    assert loaded.weights == model.weights
+
+
+def test_key_depends_on_the_revision_and_the_quantization():
+    key = cache_key(MODEL_NAME, COMMIT, QUANTIZATION)
+    assert key != cache_key(MODEL_NAME, "main", QUANTIZATION)
+    assert key != cache_key(MODEL_NAME, COMMIT, dict(QUANTIZATION, load_in_4bit=False))
+
+
+def test_truncated_entry_is_quantized_again(cache):
+    quantize = FakeQuantizer()
+    get(cache, quantize)
+    key = cache_key(MODEL_NAME, COMMIT, QUANTIZATION)
+    with open(os.path.join(cache.path(key), "model.safetensors"), "r+b") as f:
+        f.truncate(10)
+    model, _, report = get(cache, quantize)
+    assert report["cache"] == "miss"
+    assert quantize.calls == 2
+    assert get(cache, quantize)[0].weights == model.weights
+
+
+def test_entry_that_does_not_load_is_quantized_again(cache):
+    quantize = FakeQuantizer()
+    get(cache, quantize)
+
+    def broken_load(folder):
+        raise OSError("invalid header")
+
+    _, _, report = get(cache, quantize, broken_load)
+    assert report["cache"] == "miss"
+    assert quantize.calls == 2
+    assert get(cache, quantize)[2]["cache"] == "hit"
+
+
+def test_partial_entry_is_a_miss(cache):
+    key = cache_key(MODEL_NAME, COMMIT, QUANTIZATION)
+    # a writer stopped before the manifest
+    os.makedirs(cache.path(key))
+    TinyModel(b"half").save_pretrained(cache.path(key))
+    assert cache.lookup(key) is None
+    # an unreadable manifest
+    with open(os.path.join(cache.path(key), MANIFEST_NAME), "w") as f:
+        f.write("{")
+    assert cache.lookup(key) is None
+    assert not os.path.exists(cache.path(key))
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path):
+    cache = QuantModelCache(str(tmp_path / "cache"), max_size_bytes=2500)
+    for last_used, name in enumerate(("a", "b", "c")):
+        cache.store(name, TinyModel(b"x" * 1000).save_pretrained)
+        os.utime(os.path.join(cache.path(name), MANIFEST_NAME), (last_used, last_used))
+    assert [key for key, _, _ in cache.entries()] == ["b", "c"]
+
+
+def test_revision_is_resolved_to_its_commit(monkeypatch):
+    calls = []
+
+    class HfApi:
+        def model_info(self, repo_id, revision=None, token=None):
+            calls.append((repo_id, revision))
+            if revision == "offline":
+                raise ConnectionError("hub not reachable")
+            return SimpleNamespace(sha=COMMIT)
+
+    monkeypatch.setitem(sys.modules, "huggingface_hub", SimpleNamespace(HfApi=HfApi))
+    assert resolve_revision(MODEL_NAME, "main") == COMMIT
+    assert resolve_revision(MODEL_NAME, COMMIT) == COMMIT
+    assert resolve_revision(MODEL_NAME, "offline") == "offline"
+    assert calls == [(MODEL_NAME, "main"), (MODEL_NAME, "offline")]
+
+
+def test_tiny_transformers_model_round_trip(cache):
+    torch = pytest.importorskip("torch")
+    transformers = pytest.importorskip("transformers")
+    config = transformers.LlamaConfig(
+        vocab_size=64,
+        hidden_size=16,
+        intermediate_size=32,
+        num_hidden_layers=1,
+        num_attention_heads=2,
+        num_key_value_heads=2,
+    )
+    model = transformers.LlamaForCausalLM(config)
+
+    def quantize():
+        return model, TinyTokenizer()
+
+    def load_model(folder):
+        return transformers.AutoModelForCausalLM.from_pretrained(folder), None
+
+    get(cache, quantize)
+    loaded, _, report = get(cache, quantize, load_model)
+    assert report["cache"] == "hit"
+    for name, tensor in model.state_dict().items():
+        assert torch.equal(loaded.state_dict()[name], tensor)
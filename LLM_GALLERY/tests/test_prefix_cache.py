@@ -0,0 +1,143 @@
+import threading
+from types import SimpleNamespace
+
+import pytest
+
+from src.prefix_cache import PrefixCache, PrefixCachedLLM, _cache_nbytes
+
+
+class FakeTensor:
+    def __init__(self, numel: int, element_size: int = 2):
+        self._numel = numel
+        self._element_size = element_size
+
+    def numel(self):
+        return self._numel
+
+    def element_size(self):
+        return self._element_size
+
+
+def test_cache_nbytes_of_the_cache_formats():
+    legacy = tuple((FakeTensor(10), FakeTensor(10)) for _ in range(3))
+    assert _cache_nbytes(legacy) == 120
+    layers = SimpleNamespace(
+        layers=[SimpleNamespace(keys=FakeTensor(10), values=FakeTensor(10))] * 3
+    )
+    assert _cache_nbytes(layers) == 120
+    dynamic = SimpleNamespace(
+        key_cache=[FakeTensor(10)] * 3, value_cache=[FakeTensor(10), None, None]
+    )
+    assert _cache_nbytes(dynamic) == 80
+
+
+def test_legacy_cache_is_added():
+    cache = PrefixCache(max_bytes=100)
+    cache.add([1, 2, 3], ((FakeTensor(10), FakeTensor(10)),))
+    assert cache.nbytes == 40
+
+
+class CharTokenizer:
+    """Tokenizer of one token per character, over a vocabulary of 128"""
+
+    bos_token = None
+    pad_token_id = 0
+    eos_token_id = 1
+
+    def __call__(self, text, add_special_tokens=True):
+        return {"input_ids": [2 + ord(char) % 126 for char in text]}
+
+    def decode(self, ids, skip_special_tokens=True):
+        return "".join(chr(int(i) - 2 + 32) for i in ids if int(i) > 1)
+
+
+class FakeKeyValues:
+    def __init__(self):
+        self.length = None
+        self.key_cache = [FakeTensor(10)]
+        self.value_cache = [FakeTensor(10)]
+
+    def crop(self, length):
+        self.length = length
+
+
+def format_message(message: str) -> str:
+    return f"You are a helpful assistant. {message}"
+
+
+def test_concurrent_identical_prompts_are_remembered_once():
+    llm = PrefixCachedLLM(
+        SimpleNamespace(model=None, tokenizer=CharTokenizer()),
+        format_message,
+        min_hits=2,
+        cache_system_prompt=False,
+    )
+    ids = list(range(2, 50))
+    barrier = threading.Barrier(16)
+    errors = []
+
+    def request():
+        barrier.wait()
+        try:
+            for _ in range(50):
+                llm._record(0, 0.001)
+                llm._remember(ids, FakeKeyValues())
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=request) for _ in range(16)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert errors == []
+    assert llm.metrics()["misses"] == 16 * 50
+    assert len(llm.cache) == 1
+    assert llm.cache.match(ids)[0] == len(ids) - 1
+
+
+def test_cached_generation_equals_the_uncached_one():
+    torch = pytest.importorskip("torch")
+    transformers = pytest.importorskip("transformers")
+    torch.manual_seed(0)
+    config = transformers.LlamaConfig(
+        vocab_size=128,
+        hidden_size=32,
+        intermediate_size=64,
+        num_hidden_layers=2,
+        num_attention_heads=4,
+        num_key_value_heads=4,
+    )
+    model = transformers.LlamaForCausalLM(config).eval()
+    tokenizer = CharTokenizer()
+    llm = PrefixCachedLLM(
+        SimpleNamespace(model=model, tokenizer=tokenizer), format_message, min_hits=1
+    )
+    prompt = format_message("What is the capital of France?")
+    ids = tokenizer(prompt)["input_ids"]
+    with torch.no_grad():
+        reference = model.generate(
+            torch.tensor([ids]),
+            attention_mask=torch.ones(1, len(ids), dtype=torch.long),
+            max_new_tokens=8,
+            do_sample=False,
+            pad_token_id=tokenizer.pad_token_id,
+        )
+    expected = tokenizer.decode(reference[0, len(ids) :])
+
+    def generate():
+        return llm(prompt, max_new_tokens=8, do_sample=False, return_full_text=False)
+
+    results = [generate()[0]["generated_text"] for _ in range(3)]
+    threads = [
+        threading.Thread(target=lambda: results.append(generate()[0]["generated_text"]))
+        for _ in range(4)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert results == [expected] * 7
+    # the system prompt, then the whole prompt, were reused
+    assert llm.metrics()["hits"] == 7
+    assert llm.metrics()["cached_tokens"] > 6 * (len(ids) - 2)
@@ -0,0 +1,54 @@
+import ast
+import os
+
+import pytest
+
+from src import PREPROMPT
+from src.registry import MODELS, get_model_spec
+
+LLM_GALLERY = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.mark.parametrize("model_name", MODELS)
+def test_endpoint_function_of_each_model_exists(model_name):
+    spec = MODELS[model_name]
+    path = os.path.join(LLM_GALLERY, spec.function_path.lstrip("/"))
+    with open(path) as f:
+        tree = ast.parse(f.read())
+    functions = {node.name for node in tree.body if isinstance(node, ast.FunctionDef)}
+    assert spec.function_name in functions
+
+
+def test_chat_prompt_and_answer():
+    spec = get_model_spec("llama3-8b")
+    assert spec.format_message("Hi") == [
+        {"role": "system", "content": PREPROMPT},
+        {"role": "user", "content": "Hi"},
+    ]
+    output = [
+        {
+            "generated_text": spec.format_message("Hi")
+            + [{"role": "assistant", "content": "Hello,\nhow are you?"}]
+        }
+    ]
+    assert spec.parse_output(output) == "Hello,how are you?"
+
+
+def test_gemma_prompt_has_no_system_message():
+    assert get_model_spec("gemma2-9b").format_message("Hi") == [
+        {"role": "user", "content": "Hi"}
+    ]
+
+
+def test_mistral_instruction_prompt_and_answer():
+    spec = get_model_spec("mistral-7b")
+    prompt = spec.format_message("Hi")
+    assert prompt == f"<s>[INST] {PREPROMPT}\nquestion: Hi [/INST]"
+    output = [{"generated_text": prompt + " Hello\nthere"}]
+    assert spec.parse_output(output) == " Hellothere"
+
+
+def test_unknown_model():
+    with pytest.raises(ValueError, match="available models: llama3-8b"):
+        get_model_spec("gpt-2")
+
@@ -0,0 +1,121 @@
+import threading
+import time
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+from src.registry import get_model_spec, memory_estimate_gb
+from src.speculative import SpeculativeLLM, check_greedy_equivalence
+
+
+class FakeModel:
+    """Causal LM whose generate runs forward passes, one per new token for
+    the target and two per target forward for the draft
+    """
+
+    def __init__(self):
+        self.generation_config = SimpleNamespace()
+        self.hooks = []
+
+    def register_forward_hook(self, hook):
+        self.hooks.append(hook)
+
+    def forward(self):
+        for hook in self.hooks:
+            hook(self, (), None)
+
+
+def fake_llm(duration_s: float):
+    target, draft = FakeModel(), FakeModel()
+
+    def generate(input_ids, assistant_model=None, max_new_tokens=4):
+        for _ in range(max_new_tokens):
+            time.sleep(duration_s / max_new_tokens)
+            target.forward()
+            if assistant_model is not None:
+                assistant_model.forward()
+                assistant_model.forward()
+        return np.zeros((1, input_ids.shape[-1] + max_new_tokens))
+
+    target.generate = generate
+    return SimpleNamespace(model=target, tokenizer=None), draft
+
+
+def test_concurrent_generations_are_not_serialized():
+    llm, draft = fake_llm(duration_s=0.2)
+    speculative = SpeculativeLLM(llm, draft)
+    threads = [
+        threading.Thread(target=speculative.generate, args=(np.zeros((1, 3)),))
+        for _ in range(4)
+    ]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert time.perf_counter() - start < 0.6
+    metrics = speculative.metrics()
+    assert metrics["generations"] == 4
+    assert metrics["new_tokens"] == 16
+    assert metrics["target_forwards"] == 16
+    assert metrics["draft_forwards"] == 32
+
+
+def test_generation_without_draft_is_not_counted():
+    llm, draft = fake_llm(duration_s=0.0)
+    speculative = SpeculativeLLM(llm, draft)
+    speculative.generate(np.zeros((1, 3)), assistant_model=None)
+    speculative.generate(np.zeros((1, 3)))
+    metrics = speculative.metrics()
+    assert metrics["generations"] == 1
+    assert metrics["target_forwards"] == 4
+
+
+def test_draft_memory_is_counted_with_speculative_decoding():
+    spec = get_model_spec("gemma2-9b")
+    assert memory_estimate_gb(spec) == spec.quantized_gb
+    assert memory_estimate_gb(spec, with_draft=True) == pytest.approx(
+        spec.quantized_gb + spec.draft_gb
+    )
+    mistral = get_model_spec("mistral-7b")
+    assert memory_estimate_gb(mistral, with_draft=True) == mistral.quantized_gb
+
+
+def test_greedy_equivalence_with_a_tiny_pair_of_models():
+    torch = pytest.importorskip("torch")
+    transformers = pytest.importorskip("transformers")
+
+    def tiny_llama(layers: int, seed: int):
+        torch.manual_seed(seed)
+        config = transformers.LlamaConfig(
+            vocab_size=96,
+            hidden_size=32,
+            intermediate_size=64,
+            num_hidden_layers=layers,
+            num_attention_heads=4,
+            num_key_value_heads=4,
+            eos_token_id=1,
+            pad_token_id=0,
+        )
+        return transformers.LlamaForCausalLM(config).eval()
+
+    class Tokenizer:
+        eos_token_id = 1
+
+        def __call__(self, text, return_tensors="pt"):
+            ids = [2 + ord(char) % 94 for char in text]
+            return transformers.BatchEncoding({"input_ids": torch.tensor([ids])})
+
+    target = tiny_llama(layers=2, seed=0)
+    llm = SpeculativeLLM(
+        SimpleNamespace(model=target, tokenizer=Tokenizer()),
+        tiny_llama(layers=1, seed=1),
+        num_draft_tokens=3,
+    )
+    report = check_greedy_equivalence(
+        llm, ["Hello there", "What is the capital of France?"], max_new_tokens=12
+    )
+    assert report["equivalent"], report["mismatches"]
+    assert report["tokens"] > 0
+    assert llm.metrics()["draft_forwards"] > 0
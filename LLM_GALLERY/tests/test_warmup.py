@@ -0,0 +1,111 @@
+import threading
+import time
+
+import pytest
+
+from src import endpoint, warmup
+
+MODEL_NAME = "llama3-8b"
+
+
+class FakeLLM:
+    tokenizer = None
+
+    def __init__(self):
+        self.calls = 0
+
+    def __call__(self, prompt, **kwargs):
+        time.sleep(0.01)
+        self.calls += 1
+        return [{"generated_text": "ok"}]
+
+
+@pytest.fixture(autouse=True)
+def fresh_state(monkeypatch):
+    for name in ("_ready", "_reports", "_first_latencies", "_latencies", "_requests"):
+        monkeypatch.setattr(warmup, name, {})
+    monkeypatch.setattr(warmup, "_running", set())
+    monkeypatch.setenv("LLM_WARMUP_PROMPT_TOKENS", "4,8")
+
+
+def test_request_latencies_are_bounded(monkeypatch):
+    monkeypatch.setattr(warmup, "LATENCY_WINDOW", 10)
+    model_name = "test-model"
+    warmup.record_request(model_name, 5.0)
+    for latency in range(100):
+        warmup.record_request(model_name, float(latency))
+    status = warmup.status(model_name)
+    assert len(warmup._latencies[model_name]) == 10
+    assert status["first_request_s"] == 5.0
+    assert status["steady_state_requests"] == 100
+    assert status["steady_state_p50_s"] == 94.5
+
+
+def test_concurrent_callers_wait_for_a_single_warmup(monkeypatch):
+    llm = FakeLLM()
+    loads = []
+
+    def get_llm(model_name):
+        loads.append(model_name)
+        time.sleep(0.05)
+        return llm
+
+    monkeypatch.setattr(endpoint, "get_llm", get_llm)
+    reports = []
+    threads = [
+        threading.Thread(target=lambda: reports.append(warmup.warmup(MODEL_NAME)))
+        for _ in range(8)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert loads == [MODEL_NAME]
+    assert llm.calls == 2
+    assert len(reports) == 8
+    assert all(report is reports[0] for report in reports)
+    assert warmup.is_ready(MODEL_NAME)
+
+
+def test_failed_warmup_is_not_run_again(monkeypatch):
+    loads = []
+
+    def get_llm(model_name):
+        loads.append(model_name)
+        raise RuntimeError("no gpu")
+
+    monkeypatch.setattr(endpoint, "get_llm", get_llm)
+    report = warmup.warmup(MODEL_NAME)
+    assert "no gpu" in report["error"]
+    assert warmup.warmup(MODEL_NAME) is report
+    assert loads == [MODEL_NAME]
+    assert warmup.is_ready(MODEL_NAME)
+
+
+def test_warms_up_on_import_only_in_a_platform_step(monkeypatch):
+    monkeypatch.delenv("LLM_WARMUP", raising=False)
+    monkeypatch.setattr(warmup, "in_platform_step", lambda: False)
+    assert warmup.warmup_mode() == "off"
+    monkeypatch.setattr(warmup, "in_platform_step", lambda: True)
+    assert warmup.warmup_mode() == "on"
+    monkeypatch.setenv("LLM_WARMUP", "off")
+    assert warmup.warmup_mode() == "off"
+
+
+def test_background_warmup_gates_the_requests(monkeypatch):
+    started = threading.Event()
+    release = threading.Event()
+
+    def get_llm(model_name):
+        started.set()
+        release.wait()
+        return FakeLLM()
+
+    monkeypatch.setattr(endpoint, "get_llm", get_llm)
+    warmup.start(MODEL_NAME, mode="background")
+    started.wait()
+    assert not warmup.is_ready(MODEL_NAME)
+    assert not warmup.wait_until_ready(MODEL_NAME, timeout_s=0.01)
+    release.set()
+    assert warmup.wait_until_ready(MODEL_NAME, timeout_s=5)
+    assert warmup.status(MODEL_NAME)["warmup"]["runs"]
@@ -0,0 +1,93 @@
+"""Compare the rows/s and peak RSS of the current dict input of predictIris
+with the chunked columnar and Parquet batch scoring.
+Run it from the get_started folder:
+    python -m benchmarks.batch_scoring_benchmark --rows 1000 100000 10000000
+Each scenario runs in its own process so its peak RSS is measured alone.
+The dict path is skipped above --max-dict-rows since it needs one Python
+dict per row.
+"""
+
+import argparse
+import multiprocessing
+import os
+import resource
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from sklearn import datasets
+from sklearn.neighbors import KNeighborsClassifier
+
+from src.batch_scoring import predict_columns, score_parquet_file
+
+
+def synthetic_columns(n_rows: int, feature_names: list) -> dict:
+    rng = np.random.default_rng(0)
+    return {
+        name: rng.uniform(0, 8, n_rows).astype(np.float64) for name in feature_names
+    }
+
+
+def dict_path(model, columns: dict):
+    # the payload as it is received today: one dict per row
+    input_data = pd.DataFrame(columns).to_dict(orient="index")
+    start = time.perf_counter()
+    input_dataframe = pd.DataFrame.from_dict(input_data, orient="index")
+    model.predict(input_dataframe.values).tolist()
+    return time.perf_counter() - start
+
+
+def columnar_path(model, columns: dict):
+    start = time.perf_counter()
+    predict_columns(model, columns)
+    return time.perf_counter() - start
+
+
+def parquet_path(model, columns: dict):
+    with tempfile.TemporaryDirectory() as folder:
+        input_file = os.path.join(folder, "input.parquet")
+        pq.write_table(pa.table(columns), input_file, row_group_size=65536)
+        del columns
+        start = time.perf_counter()
+        score_parquet_file(model, input_file, os.path.join(folder, "out.parquet"))
+        return time.perf_counter() - start
+
+
+SCENARIOS = {"dict": dict_path, "columnar": columnar_path, "parquet": parquet_path}
+
+
+def run_scenario(name: str, n_rows: int, queue):
+    iris = datasets.load_iris(as_frame=True)
+    model = KNeighborsClassifier().fit(iris.data.values, iris.target.values)
+    columns = synthetic_columns(n_rows, list(iris.data.columns))
+    duration = SCENARIOS[name](model, columns)
+    peak_rss_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    queue.put((n_rows / duration, peak_rss_mb))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the Iris batch scoring")
+    parser.add_argument("--rows", type=int, nargs="+", default=[1000, 100000, 10**7])
+    parser.add_argument("--max-dict-rows", type=int, default=10**6)
+    args = parser.parse_args()
+
+    context = multiprocessing.get_context("fork")
+    print(f"{'rows':>10} {'scenario':>9} {'rows/s':>12} {'peak RSS MB':>12}")
+    for n_rows in args.rows:
+        for name in SCENARIOS:
+            if name == "dict" and n_rows > args.max_dict_rows:
+                print(f"{n_rows:>10} {name:>9} {'skipped':>12}")
+                continue
+            queue = context.Queue()
+            process = context.Process(target=run_scenario, args=(name, n_rows, queue))
+            process.start()
+            rows_per_s, peak_rss_mb = queue.get()
+            process.join()
+            print(f"{n_rows:>10} {name:>9} {rows_per_s:>12.0f} {peak_rss_mb:>12.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,34 @@
+import argparse
+
+from sklearn.datasets import make_blobs
+
+from src.hyperparameter_search import print_leaderboard, search
+
+"""
+Compare the hyper-parameter search of trainIris in its process pool with
+the same search run serially, on a synthetic dataset larger than iris.
+Run it from the get_started folder:
+    python -m benchmarks.hyperparameter_search_benchmark --rows 20000 --n-iter 12
+The trainings only run the pool, the serial run is kept to this benchmark.
+"""
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the search pool")
+    parser.add_argument("--rows", type=int, default=20000)
+    parser.add_argument("--features", type=int, default=4)
+    parser.add_argument("--n-iter", type=int, default=None, help="all by default")
+    parser.add_argument("--n-jobs", type=int, default=None)
+    args = parser.parse_args()
+
+    X, y = make_blobs(
+        args.rows, n_features=args.features, centers=3, cluster_std=3.0, random_state=0
+    )
+    _, leaderboard, report = search(
+        X, y, n_iter=args.n_iter, n_jobs=args.n_jobs, measure_speedup=True
+    )
+    print_leaderboard(leaderboard, report)
+
+
+if __name__ == "__main__":
+    main()
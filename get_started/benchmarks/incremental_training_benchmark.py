@@ -0,0 +1,124 @@
+import argparse
+import os
+import shutil
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+from src.incremental_training import incremental_train
+from src.neighbors import make_knn
+from src.streaming_training import train_streaming
+
+"""
+Replay the runs of the periodic training deployment against a local fake
+datastore and report, for each run, whether the model was skipped, updated
+incrementally or trained, and the time saved against a full training.
+Run it from the get_started folder:
+    python -m benchmarks.incremental_training_benchmark --rows 200000
+The runs are: a first training, an unchanged dataset, the same rows
+uploaded again, rows appended, and a row modified.
+"""
+
+DATASET_PATH = "get_started/dataset/iris.parquet"
+MODEL_PATH = "get_started/models/iris_knn_model.joblib"
+
+
+class LocalSdk:
+    """Datastore methods of the sdk on a local folder"""
+
+    def __init__(self, root: str, latency_s: float = 0.05):
+        self.root = root
+        self.latency_s = latency_s
+
+    def _path(self, object_path: str) -> str:
+        return os.path.join(self.root, object_path)
+
+    def get_data_store_object_information(self, object_path):
+        time.sleep(self.latency_s)
+        stat = os.stat(self._path(object_path))
+        return {"last_modified": stat.st_mtime_ns, "size": stat.st_size}
+
+    def download_data_store_object(self, object_path_in_datastore, filepath_or_buffer):
+        time.sleep(self.latency_s)
+        shutil.copyfile(self._path(object_path_in_datastore), filepath_or_buffer)
+
+    def upload_data_store_object(self, filepath_or_buffer, object_path_in_datastore):
+        time.sleep(self.latency_s)
+        path = self._path(object_path_in_datastore)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        shutil.copyfile(filepath_or_buffer, path)
+
+
+def make_rows(n_rows: int, seed: int) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    y = rng.integers(0, 3, n_rows)
+    X = rng.normal(size=(n_rows, 4)) + y[:, None]
+    df = pd.DataFrame(
+        X, columns=["sepal length", "sepal width", "petal length", "petal width"]
+    )
+    df["target"] = y
+    return df
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the incremental training")
+    parser.add_argument("--rows", type=int, default=200000)
+    parser.add_argument("--appended", type=float, default=0.01)
+    parser.add_argument("--backend", default="kd_tree")
+    parser.add_argument("--streaming", action="store_true")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as folder:
+        sdk = LocalSdk(os.path.join(folder, "datastore"))
+        work = os.path.join(folder, "work")
+        os.makedirs(work)
+        local_dataset = os.path.join(work, "iris.parquet")
+        local_model = os.path.join(work, "iris_knn_model.joblib")
+        remote_dataset = sdk._path(DATASET_PATH)
+        os.makedirs(os.path.dirname(remote_dataset))
+
+        def train():
+            if args.streaming:
+                return train_streaming(local_dataset)[0], None, None
+            df = pd.read_parquet(local_dataset)
+            X, y = df.drop(columns="target").values, df["target"].values
+            return make_knn(args.backend).fit(X, y), X, y
+
+        df = make_rows(args.rows, seed=0)
+        new_rows = make_rows(int(args.rows * args.appended), seed=1)
+        modified = df.copy()
+        modified.iloc[0, 0] += 1
+        runs = [
+            ("first run", df),
+            ("unchanged", None),
+            ("uploaded again", df),
+            ("rows appended", pd.concat([df, new_rows], ignore_index=True)),
+            ("row modified", modified),
+        ]
+        config = {"backend": args.backend, "streaming": args.streaming}
+        print(f"{'run':>15} {'status':>12} {'rows':>9} {'new':>7} {'s':>7} {'saved s':>8}")
+        for name, dataset in runs:
+            if dataset is not None:
+                dataset.to_parquet(remote_dataset)
+            report = incremental_train(
+                sdk,
+                train,
+                config,
+                DATASET_PATH,
+                MODEL_PATH,
+                local_dataset,
+                local_model,
+            )
+            # the output mapping of the deployment stores the model
+            sdk.upload_data_store_object(local_model, MODEL_PATH)
+            print(
+                f"{name:>15} {report['status']:>12} {report['rows']:>9} "
+                f"{report['new_rows']:>7} {report['duration_s']:>7.2f} "
+                f"{report['time_saved_s']:>8.2f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,46 @@
+import argparse
+import os
+import resource
+import tempfile
+
+import numpy as np
+from sklearn.neighbors import KNeighborsClassifier
+
+from src.mmap_artifacts import measure_load_times, save_model
+
+"""
+Measure the cold and warm load times of a KNN artifact with and without
+memory-mapping, for a growing training set.
+Run it from the get_started folder:
+    python -m benchmarks.mmap_load_benchmark --rows 100000 1000000 10000000
+The cold load evicts the file from the page cache first (Linux only).
+"""
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the KNN artifact load")
+    parser.add_argument("--rows", type=int, nargs="+", default=[10**5, 10**6, 10**7])
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    print(f"{'rows':>10} {'mmap':>5} {'size MB':>8} {'cold s':>8} {'warm s':>8}")
+    with tempfile.TemporaryDirectory() as folder:
+        for n_rows in args.rows:
+            X = rng.uniform(0, 8, (n_rows, 4))
+            y = rng.integers(0, 3, n_rows)
+            path = os.path.join(folder, f"knn_{n_rows}.joblib")
+            save_model(KNeighborsClassifier().fit(X, y), path)
+            del X, y
+            size_mb = os.path.getsize(path) / 1024**2
+            for mmap_mode in (None, "r"):
+                times = measure_load_times(path, mmap_mode=mmap_mode)
+                print(
+                    f"{n_rows:>10} {str(mmap_mode == 'r'):>5} {size_mb:>8.1f} "
+                    f"{times['cold_load_s']:>8.4f} {times['warm_load_s']:>8.4f}"
+                )
+    peak_rss_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    print(f"peak RSS of the benchmark: {peak_rss_mb:.1f}MB")
+
+
+if __name__ == "__main__":
+    main()
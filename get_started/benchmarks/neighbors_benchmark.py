@@ -0,0 +1,85 @@
+import argparse
+import pickle
+import time
+
+from sklearn.datasets import make_blobs
+from sklearn.neighbors import KNeighborsClassifier
+
+from src.neighbors import make_knn
+
+"""
+Compare the neighbour search backends of trainIris with the current
+KNeighborsClassifier() on a synthetic dataset far larger than iris.
+Run it from the get_started folder:
+    python -m benchmarks.neighbors_benchmark --rows 1000000 --features 16
+It reports the build time, the size of the pickled index, the query
+throughput, the accuracy and, for the approximate backend, the recall of
+the true nearest neighbours.
+"""
+
+CONFIGURATIONS = [
+    ("kd_tree", {"leaf_size": 15}),
+    ("kd_tree", {"leaf_size": 30}),
+    ("kd_tree", {"leaf_size": 60}),
+    ("ball_tree", {"leaf_size": 30}),
+    ("ivf", {"n_probe": 1}),
+    ("ivf", {"n_probe": 2}),
+    ("ivf", {"n_probe": 4}),
+    ("ivf", {"n_probe": 8}),
+]
+
+
+def evaluate(name, model, X_train, y_train, X_test, y_test, exact_distances):
+    start = time.perf_counter()
+    model.fit(X_train, y_train)
+    build_s = time.perf_counter() - start
+    size_mb = len(pickle.dumps(model)) / 1024**2
+    start = time.perf_counter()
+    accuracy = (model.predict(X_test) == y_test).mean()
+    qps = len(X_test) / (time.perf_counter() - start)
+    distances = model.kneighbors(X_test)[0]
+    if not hasattr(model, "n_probe"):
+        distances = distances**2
+    # a neighbour is a true one when it is not farther than the exact k-th one
+    recall = (distances <= exact_distances[:, -1:] * (1 + 1e-9)).mean()
+    print(
+        f"{name:>28} {build_s:>8.2f} {size_mb:>9.1f} {qps:>10.0f} "
+        f"{accuracy:>8.4f} {recall:>7.4f}"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the knn backends")
+    parser.add_argument("--rows", type=int, default=10**6)
+    parser.add_argument("--features", type=int, default=16)
+    parser.add_argument("--queries", type=int, default=2000)
+    args = parser.parse_args()
+
+    X, y = make_blobs(
+        args.rows + args.queries,
+        n_features=args.features,
+        centers=100,
+        cluster_std=4.0,
+        random_state=0,
+    )
+    X_train, y_train = X[args.queries :], y[args.queries :]
+    X_test, y_test = X[: args.queries], y[: args.queries]
+
+    baseline = KNeighborsClassifier()
+    exact_distances = baseline.fit(X_train, y_train).kneighbors(X_test)[0] ** 2
+
+    print(
+        f"{'backend':>28} {'build s':>8} {'size MB':>9} {'QPS':>10} "
+        f"{'accuracy':>8} {'recall':>7}"
+    )
+    evaluate(
+        "current (auto)", baseline, X_train, y_train, X_test, y_test, exact_distances
+    )
+    for backend, params in CONFIGURATIONS:
+        name = f"{backend} {params}"
+        model = make_knn(backend, **params)
+        evaluate(name, model, X_train, y_train, X_test, y_test, exact_distances)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+import argparse
+import os
+import shutil
+import statistics
+import tempfile
+import threading
+import time
+import warnings
+
+import numpy as np
+import pandas as pd
+from sklearn.neighbors import KNeighborsClassifier
+
+from src.mmap_artifacts import load_model, save_model
+from src.model_cache import ModelCache
+from src.predictor import Predictor
+from src.wire_format import encode_features
+
+"""
+Compare the latency of the Iris predictions when the model is downloaded
+and loaded on every call with the long-lived predictor, under concurrent
+calls, while the model object is replaced in the middle of the run (the
+last column is the class of the last prediction, 1 once the new model is
+used).
+Run it from the get_started folder:
+    python -m benchmarks.predictor_benchmark --threads 8 --train-rows 100000
+The datastore is a local folder whose downloads take --download-ms.
+"""
+
+
+class LocalSdk:
+    """Datastore methods of the sdk on a local folder"""
+
+    def __init__(self, root: str, download_s: float):
+        self.root = root
+        self.download_s = download_s
+
+    def get_data_store_object_information(self, object_path):
+        stat = os.stat(os.path.join(self.root, object_path))
+        return {"last_modified": stat.st_mtime_ns, "size": stat.st_size}
+
+    def download_data_store_object(self, object_path_in_datastore, filepath_or_buffer):
+        time.sleep(self.download_s)
+        shutil.copyfile(
+            os.path.join(self.root, object_path_in_datastore), filepath_or_buffer
+        )
+
+
+def publish(folder: str, path: str):
+    """Replace the model object at once, like an upload does"""
+    shutil.copyfile(path, os.path.join(folder, "model.tmp"))
+    os.replace(os.path.join(folder, "model.tmp"), os.path.join(folder, "model.joblib"))
+
+
+def percentile(values: list, q: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the Iris predictor")
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--calls", type=int, default=50, help="calls per thread")
+    parser.add_argument("--train-rows", type=int, default=100000)
+    parser.add_argument("--rows", type=int, default=30, help="rows per call")
+    parser.add_argument("--download-ms", type=float, default=100)
+    args = parser.parse_args()
+    # the dict rows are a DataFrame while the knn was fitted on arrays
+    warnings.filterwarnings("ignore", message="X has feature names")
+
+    rng = np.random.default_rng(0)
+    X = rng.uniform(0, 8, (args.train_rows, 4))
+    columns = ["sepal length", "sepal width", "petal length", "petal width"]
+    input_data = encode_features(pd.DataFrame(X[: args.rows], columns=columns), "dict")
+
+    with tempfile.TemporaryDirectory() as folder:
+        sdk = LocalSdk(folder, args.download_ms / 1000)
+        versions = []
+        for label in range(2):
+            path = os.path.join(folder, f"model-{label}.joblib")
+            model = KNeighborsClassifier().fit(X, np.full(len(X), label))
+            save_model(model, path)
+            versions.append(path)
+
+        def per_call(input_data):
+            # what the pipelines did: download, load and convert on every call
+            local_path = os.path.join(folder, f"call-{threading.get_ident()}")
+            sdk.download_data_store_object("model.joblib", local_path)
+            model = load_model(local_path)
+            input_dataframe = pd.DataFrame.from_dict(input_data, orient="index")
+            return {"predictions": model.predict(input_dataframe).tolist()}
+
+        predictor = Predictor(ModelCache(sdk=sdk, revalidate_after_s=0.05))
+
+        def persistent(input_data):
+            return predictor.predict(input_data, "model.joblib")
+
+        print(f"{'path':>10} {'calls/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'last':>6}")
+        for name, predict in (("per call", per_call), ("predictor", persistent)):
+            publish(folder, versions[0])
+            latencies = []
+            answers = []
+
+            def worker():
+                for _ in range(args.calls):
+                    start = time.perf_counter()
+                    predictions = predict(input_data)["predictions"]
+                    latencies.append(time.perf_counter() - start)
+                    answers.append(predictions[0])
+
+            threads = [threading.Thread(target=worker) for _ in range(args.threads)]
+            start = time.perf_counter()
+            for thread in threads:
+                thread.start()
+            # a new model is trained in the middle of the run
+            time.sleep(0.5)
+            publish(folder, versions[1])
+            for thread in threads:
+                thread.join()
+            duration = time.perf_counter() - start
+            print(
+                f"{name:>10} {len(latencies) / duration:>8.1f} "
+                f"{statistics.median(latencies) * 1000:>8.1f} "
+                f"{percentile(latencies, 0.95) * 1000:>8.1f} {answers[-1]:>6}"
+            )
+        stats = predictor.stats()
+        print(
+            f"predictor: {stats['loads']} loads, {stats['swaps']} swaps, "
+            f"{stats['hits']} cache hits for {stats['requests']} requests"
+        )
+
+
+if __name__ == "__main__":
+    main()
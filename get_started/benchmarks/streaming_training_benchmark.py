@@ -0,0 +1,117 @@
+import argparse
+import multiprocessing
+import os
+import resource
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from src.streaming_training import INCREMENTAL_ESTIMATORS, train_streaming
+
+"""
+Compare the peak RSS and the duration of the in-memory training of
+trainIris (read_parquet, .values and permuted copies) with the streaming
+training, on synthetic iris-like Parquet files of several GB.
+Run it from the get_started folder:
+    python -m benchmarks.streaming_training_benchmark --gb 0.5 2 4
+Each scenario runs in its own process so its peak RSS is measured alone.
+The in-memory path is skipped above --max-in-memory-gb.
+"""
+
+N_FEATURES = 4
+ROWS_PER_GROUP = 10**6
+
+
+def write_synthetic_parquet(path: str, size_gb: float) -> int:
+    """Write iris-like rows, one row group at a time, until size_gb of raw
+    float64 data. Returns the number of rows
+    """
+    n_rows = int(size_gb * 1024**3 / (8 * (N_FEATURES + 1)))
+    rng = np.random.default_rng(0)
+    centers = rng.uniform(0, 8, (3, N_FEATURES))
+    schema = pa.schema(
+        [(f"feature_{i}", pa.float64()) for i in range(N_FEATURES)]
+        + [("target", pa.int64())]
+    )
+    with pq.ParquetWriter(path, schema) as writer:
+        for start in range(0, n_rows, ROWS_PER_GROUP):
+            size = min(ROWS_PER_GROUP, n_rows - start)
+            target = rng.integers(0, 3, size)
+            X = centers[target] + rng.normal(0, 1.0, (size, N_FEATURES))
+            columns = {f"feature_{i}": X[:, i] for i in range(N_FEATURES)}
+            columns["target"] = target
+            writer.write_table(pa.table(columns, schema=schema))
+    return n_rows
+
+
+def in_memory_path(path: str, estimator: str) -> float:
+    # the current trainIris data handling, with the same estimator
+    dataset_df = pd.read_parquet(path)
+    X = dataset_df.loc[:, dataset_df.columns != "target"].values
+    y = dataset_df.loc[:, "target"].values
+    indices = np.random.default_rng(0).permutation(len(X))
+    n_train_samples = int(0.8 * len(X))
+    X_train, y_train = X[indices[:n_train_samples]], y[indices[:n_train_samples]]
+    X_val, y_val = X[indices[n_train_samples:]], y[indices[n_train_samples:]]
+    model = INCREMENTAL_ESTIMATORS[estimator](0).fit(X_train, y_train)
+    return model.score(X_val, y_val)
+
+
+def streaming_path(path: str, estimator: str) -> float:
+    return train_streaming(path, estimator=estimator, epochs=1)[1]["mean_accuracy"]
+
+
+SCENARIOS = {"in-memory": in_memory_path, "streaming": streaming_path}
+
+
+def run_scenario(name: str, path: str, estimator: str, queue):
+    start = time.perf_counter()
+    accuracy = SCENARIOS[name](path, estimator)
+    duration = time.perf_counter() - start
+    peak_rss_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    queue.put((duration, peak_rss_mb, accuracy))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the streaming training")
+    parser.add_argument("--gb", type=float, nargs="+", default=[0.5, 2, 4])
+    parser.add_argument("--max-in-memory-gb", type=float, default=2)
+    parser.add_argument(
+        "--estimator", default="naive_bayes", choices=list(INCREMENTAL_ESTIMATORS)
+    )
+    args = parser.parse_args()
+
+    context = multiprocessing.get_context("fork")
+    print(
+        f"{'raw GB':>7} {'rows':>11} {'file MB':>8} {'scenario':>10} "
+        f"{'time s':>8} {'peak RSS MB':>12} {'accuracy':>8}"
+    )
+    with tempfile.TemporaryDirectory() as folder:
+        for size_gb in args.gb:
+            path = os.path.join(folder, f"iris_{size_gb}gb.parquet")
+            # written by another process, so its memory is not inherited
+            with context.Pool(1) as pool:
+                n_rows = pool.apply(write_synthetic_parquet, (path, size_gb))
+            file_mb = os.path.getsize(path) / 1024**2
+            for name in SCENARIOS:
+                prefix = f"{size_gb:>7} {n_rows:>11} {file_mb:>8.0f} {name:>10}"
+                if name == "in-memory" and size_gb > args.max_in_memory_gb:
+                    print(f"{prefix} {'skipped':>8}")
+                    continue
+                queue = context.Queue()
+                process = context.Process(
+                    target=run_scenario, args=(name, path, args.estimator, queue)
+                )
+                process.start()
+                duration, peak_rss_mb, accuracy = queue.get()
+                process.join()
+                print(f"{prefix} {duration:>8.1f} {peak_rss_mb:>12.1f} {accuracy:>8.4f}")
+            os.remove(path)
+
+
+if __name__ == "__main__":
+    main()
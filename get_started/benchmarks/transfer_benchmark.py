@@ -0,0 +1,84 @@
+import argparse
+import os
+import tempfile
+
+from src.transfers import LocalObjectStore, download_file, upload_file
+
+"""
+Measure the throughput of the chunked datastore transfers against a local
+fake object store, for several part sizes, and check that an interrupted
+download resumes.
+Run it from the get_started folder:
+    python -m benchmarks.transfer_benchmark --size-mb 256 --part-mb 4 16 64
+The fake store adds a latency to each request and limits the throughput of
+each connection, like a remote object store does. A part as large as the
+object with one worker is the current blocking transfer.
+"""
+
+
+class FlakyStore(LocalObjectStore):
+    """Store whose connection breaks after a number of range requests"""
+
+    def __init__(self, *args, fail_after: int, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.fail_after = fail_after
+
+    def read_range(self, object_path, start, end):
+        if self.fail_after <= 0:
+            raise ConnectionError("connection lost")
+        self.fail_after -= 1
+        return super().read_range(object_path, start, end)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the datastore transfers")
+    parser.add_argument("--size-mb", type=int, default=256)
+    parser.add_argument("--part-mb", type=int, nargs="+", default=[4, 16, 64])
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--latency-ms", type=float, default=30)
+    parser.add_argument("--bandwidth-mb-s", type=float, default=100)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as folder:
+        local_file = os.path.join(folder, "artifact.bin")
+        with open(local_file, "wb") as f:
+            for _ in range(args.size_mb):
+                f.write(os.urandom(1024**2))
+        store = LocalObjectStore(
+            os.path.join(folder, "store"),
+            latency_s=args.latency_ms / 1000,
+            bandwidth_mb_s=args.bandwidth_mb_s,
+        )
+        downloaded = os.path.join(folder, "downloaded.bin")
+
+        print(f"{'part MB':>8} {'workers':>8} {'upload MB/s':>12} {'download MB/s':>14}")
+        runs = [(args.size_mb, 1)] + [(part, args.workers) for part in args.part_mb]
+        for part_mb, workers in runs:
+            part_size = part_mb * 1024**2
+            upload = upload_file(store, local_file, "models/a.bin", part_size, workers)
+            download = download_file(
+                store, "models/a.bin", downloaded, part_size, workers
+            )
+            assert download["verified"]
+            print(
+                f"{part_mb:>8} {workers:>8} {upload['throughput_mb_s']:>12.1f} "
+                f"{download['throughput_mb_s']:>14.1f}"
+            )
+
+        part_size = min(args.part_mb) * 1024**2
+        n_parts = -(-args.size_mb * 1024**2 // part_size)
+        flaky = FlakyStore(store.root, fail_after=n_parts // 2)
+        try:
+            download_file(flaky, "models/a.bin", downloaded, part_size, 1)
+        except ConnectionError:
+            print(f"download interrupted after {n_parts // 2}/{n_parts} parts")
+        flaky.fail_after = n_parts
+        report = download_file(flaky, "models/a.bin", downloaded, part_size, 1)
+        print(
+            f"resumed: {report['resumed_parts']}/{report['parts']} parts reused, "
+            f"checksum verified: {report['verified']}"
+        )
+
+
+if __name__ == "__main__":
+    main()
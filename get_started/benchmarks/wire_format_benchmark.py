@@ -0,0 +1,82 @@
+import argparse
+import json
+import time
+
+import numpy as np
+import pandas as pd
+from sklearn import datasets
+
+from src.wire_format import (
+    FORMATS,
+    decode_features,
+    encode_features,
+    encode_predictions,
+)
+
+"""
+Compare the request and response sizes of the predictIris payload formats
+and the time the endpoint spends to parse and decode them.
+Run it from the get_started folder:
+    python -m benchmarks.wire_format_benchmark --rows 10000 100000
+The arrow and npy formats are also measured with float32 values. The sizes
+are those of the JSON bodies, the times are the best of --repeat runs and
+are given per 10k rows. The decode time includes the json.loads of
+the body, the encode time the json.dumps of the response.
+"""
+
+
+def best_time(function, repeat: int) -> float:
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the payload formats")
+    parser.add_argument("--rows", type=int, nargs="+", default=[10000, 100000])
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    feature_names = datasets.load_iris().feature_names
+    rng = np.random.default_rng(0)
+    print(
+        f"{'rows':>8} {'format':>10} {'request KB':>11} {'decode ms/10k':>14} "
+        f"{'response KB':>12} {'encode ms/10k':>14}"
+    )
+    for n_rows in args.rows:
+        df = pd.DataFrame(
+            rng.uniform(0, 8, (n_rows, len(feature_names))).round(1),
+            columns=feature_names,
+        )
+        predictions = rng.integers(0, 3, n_rows)
+        per_10k = 10000 / n_rows * 1000
+        runs = [(fmt, np.float64) for fmt in FORMATS]
+        runs += [("arrow", np.float32), ("npy", np.float32)]
+        for fmt, dtype in runs:
+            body = json.dumps({"input_data": encode_features(df, fmt, dtype)})
+
+            def decode():
+                return decode_features(json.loads(body)["input_data"])
+
+            X, _ = decode()
+            assert np.allclose(np.asarray(X, dtype=np.float64), df.values, atol=1e-6)
+            decode_s = best_time(decode, args.repeat)
+
+            def encode():
+                return json.dumps({"predictions": encode_predictions(predictions, fmt)})
+
+            response = encode()
+            encode_s = best_time(encode, args.repeat)
+            name = fmt if dtype == np.float64 else f"{fmt} f32"
+            print(
+                f"{n_rows:>8} {name:>10} {len(body) / 1024:>11.1f} "
+                f"{decode_s * per_10k:>14.2f} {len(response) / 1024:>12.1f} "
+                f"{encode_s * per_10k:>14.2f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,19 +1,7 @@
-import os
-from craft_ai_sdk import CraftAiSdk
-from craft_ai_sdk.exceptions import SdkException
-from dotenv import load_dotenv
+from cleanup import run
 
-load_dotenv()
-
-
-sdk = CraftAiSdk(
-    environment_url=os.environ.get("CRAFT_AI_ENVIRONMENT_URL"),
-    sdk_token=os.environ.get("CRAFT_AI_ACCESS_TOKEN"),
+# the deployments of the pipelines are deleted first, all the deletions run
+# concurrently; --dry-run lists them, --fake runs on an in-memory sdk
+run(
+    pipelines=["part-1-hello-world"],
 )
-try:
-    sdk.delete_pipeline(
-        pipeline_name="part-1-hello-world",
-        force_deployments_deletion=True,
-    )
-except SdkException as e:
-    print(e)
@@ -1,18 +1,9 @@
-import os
-from craft_ai_sdk import CraftAiSdk
-from craft_ai_sdk.exceptions import SdkException
-from dotenv import load_dotenv
+from cleanup import run, sidecar_prefix
 
-load_dotenv()
-
-sdk = CraftAiSdk(
-    environment_url=os.environ.get("CRAFT_AI_ENVIRONMENT_URL"),
-    sdk_token=os.environ.get("CRAFT_AI_ACCESS_TOKEN"),
+# the deployments of the pipelines are deleted first, all the deletions run
+# concurrently; --dry-run lists them, --fake runs on an in-memory sdk
+run(
+    pipelines=["part-2-iristrain"],
+    # the sha256 and manifest objects uploaded next to the model
+    object_prefixes=[sidecar_prefix("get_started/models/iris_knn_model.joblib")],
 )
-try:
-    sdk.delete_pipeline(
-        pipeline_name="part-2-iristrain",
-        force_deployments_deletion=True,
-    )
-except SdkException as e:
-    print(e)
@@ -1,40 +1,21 @@
-import os
-from craft_ai_sdk import CraftAiSdk
-from craft_ai_sdk.exceptions import SdkException
-from dotenv import load_dotenv
+from cleanup import run, sidecar_prefix
 
-load_dotenv()
-
-sdk = CraftAiSdk(
-    environment_url=os.environ.get("CRAFT_AI_ENVIRONMENT_URL"),
-    sdk_token=os.environ.get("CRAFT_AI_ACCESS_TOKEN"),
+# the deployments of the pipelines are deleted first, all the deletions run
+# concurrently; --dry-run lists them, --fake runs on an in-memory sdk
+run(
+    pipelines=[
+        "part-4-iris-deployment",
+        "part-4-iristrain",
+    ],
+    objects=[
+        "get_started/dataset/iris.parquet",
+        "get_started/models/test_model.joblib",
+        "get_started/models/test_model_2.joblib",
+    ],
+    # the training state, sha256 and manifest objects stored next to the
+    # model and the dataset
+    object_prefixes=[
+        sidecar_prefix("get_started/models/iris_knn_model.joblib"),
+        sidecar_prefix("get_started/dataset/iris.parquet"),
+    ],
 )
-
-try:
-    sdk.delete_pipeline(
-        pipeline_name="part-4-iris-deployment",
-        force_deployments_deletion=True,
-    )
-except SdkException as e:
-    print(e)
-
-try:
-    sdk.delete_pipeline(
-        pipeline_name="part-4-iristrain",
-        force_deployments_deletion=True,
-    )
-except SdkException as e:
-    print(e)
-
-try:
-    sdk.delete_data_store_object("get_started/dataset/iris.parquet")
-except SdkException as e:
-    print(e)
-try:
-    sdk.delete_data_store_object("get_started/models/test_model.joblib")
-except SdkException as e:
-    print(e)
-try:
-    sdk.delete_data_store_object("get_started/models/test_model_2.joblib")
-except SdkException as e:
-    print(e)
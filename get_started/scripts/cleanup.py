@@ -0,0 +1,315 @@
+import argparse
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+"""
+Cleanup engine of the tutorial resources.
+The pipelines, their deployments and the datastore objects to delete are
+given by name or found by prefix, then deleted by a bounded pool of
+threads, so the cleanup takes a few round trips instead of one per
+resource. The deployments and the datastore objects are deleted first,
+then the pipelines, which can only be deleted once they have no deployment.
+A dry run lists what would be deleted. A fake sdk keeping its resources in
+memory, with the latency of a real one, allows to run it without a platform:
+    python scripts/cleanup.py --pipeline-prefix part- --fake --dry-run
+"""
+
+DEFAULT_WORKERS = 8
+# suffixes of the objects stored next to a model: its sha256 (src/transfers.py),
+# its manifest (src/mmap_artifacts.py) and its training state
+# (src/incremental_training.py)
+SIDECAR_SUFFIXES = (".sha256", ".manifest.json", ".train_state.json")
+
+
+def sidecar_prefix(object_path: str) -> str:
+    """Prefix of the objects stored next to object_path, not the object"""
+    return object_path + "."
+
+
+def make_sdk():
+    """The sdk of the environment given by the .env file"""
+    from craft_ai_sdk import CraftAiSdk
+    from dotenv import load_dotenv
+
+    load_dotenv()
+    return CraftAiSdk(
+        environment_url=os.environ.get("CRAFT_AI_ENVIRONMENT_URL"),
+        sdk_token=os.environ.get("CRAFT_AI_ACCESS_TOKEN"),
+    )
+
+
+class FakeSdk:
+    """In-memory sdk with the pipeline, deployment and datastore methods
+    used by the cleanup, each call taking latency_s
+
+    Args:
+        pipelines (list): names of the pipelines
+        deployments (dict): deployment name -> pipeline name
+        objects (list): paths of the datastore objects
+        latency_s (float): duration of each call
+    """
+
+    def __init__(self, pipelines=(), deployments=None, objects=(), latency_s=0.05):
+        self.pipelines = set(pipelines)
+        self.deployments = dict(deployments or {})
+        self.objects = set(objects)
+        self.latency_s = latency_s
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def _call(self):
+        time.sleep(self.latency_s)
+        with self._lock:
+            self.calls += 1
+
+    def list_pipelines(self):
+        self._call()
+        return [{"pipeline_name": name} for name in sorted(self.pipelines)]
+
+    def list_deployments(self):
+        self._call()
+        return [
+            {"deployment_name": name, "pipeline_name": pipeline}
+            for name, pipeline in sorted(self.deployments.items())
+        ]
+
+    def list_data_store_objects(self):
+        self._call()
+        return [{"path": path} for path in sorted(self.objects)]
+
+    def delete_deployment(self, deployment_name):
+        self._call()
+        with self._lock:
+            if deployment_name not in self.deployments:
+                raise KeyError(f"deployment {deployment_name} not found")
+            del self.deployments[deployment_name]
+
+    def delete_pipeline(self, pipeline_name, force_deployments_deletion=False):
+        self._call()
+        with self._lock:
+            if pipeline_name not in self.pipelines:
+                raise KeyError(f"pipeline {pipeline_name} not found")
+            used = [
+                name
+                for name, pipeline in self.deployments.items()
+                if pipeline == pipeline_name
+            ]
+            if used and not force_deployments_deletion:
+                raise ValueError(f"pipeline {pipeline_name} has deployments {used}")
+            for name in used:
+                del self.deployments[name]
+            self.pipelines.remove(pipeline_name)
+
+    def delete_data_store_object(self, object_path_in_datastore):
+        self._call()
+        with self._lock:
+            if object_path_in_datastore not in self.objects:
+                raise KeyError(f"object {object_path_in_datastore} not found")
+            self.objects.remove(object_path_in_datastore)
+
+
+def _name(item: dict, kind: str) -> str:
+    # the listings name their fields "<kind>_name" or "name"
+    return item.get(f"{kind}_name") or item.get("name")
+
+
+def _pipeline_of(deployment: dict) -> str:
+    pipeline = deployment.get("pipeline_name") or deployment.get("pipeline")
+    return pipeline.get("name") if isinstance(pipeline, dict) else pipeline
+
+
+def _listing(sdk, method: str) -> list:
+    try:
+        return getattr(sdk, method)()
+    except Exception as e:
+        print(f"{method} failed: {e}")
+        return []
+
+
+def discover(
+    sdk,
+    pipelines=(),
+    pipeline_prefixes=(),
+    objects=(),
+    object_prefixes=(),
+) -> dict:
+    """This function lists the resources to delete: the pipelines given
+    or starting with a prefix, their deployments, and the datastore objects
+    given or starting with a prefix. The listings are made concurrently.
+
+    Returns:
+        dict: the names of the deployments, pipelines and objects to delete
+    """
+    methods = ["list_deployments"]
+    if pipeline_prefixes:
+        methods.append("list_pipelines")
+    if object_prefixes:
+        methods.append("list_data_store_objects")
+    with ThreadPoolExecutor(max_workers=len(methods)) as executor:
+        listings = dict(
+            zip(methods, executor.map(lambda method: _listing(sdk, method), methods))
+        )
+
+    pipelines = set(pipelines)
+    for item in listings.get("list_pipelines", []):
+        if _name(item, "pipeline").startswith(tuple(pipeline_prefixes)):
+            pipelines.add(_name(item, "pipeline"))
+    objects = set(objects)
+    for item in listings.get("list_data_store_objects", []):
+        if item["path"].startswith(tuple(object_prefixes)):
+            objects.add(item["path"])
+    deployments = {
+        _name(item, "deployment")
+        for item in listings["list_deployments"]
+        if _pipeline_of(item) in pipelines
+    }
+    return {
+        "deployments": sorted(deployments),
+        "pipelines": sorted(pipelines),
+        "objects": sorted(objects),
+    }
+
+
+def _delete(sdk, kind: str, name: str) -> tuple:
+    """Delete one resource, the errors are reported, not raised"""
+    try:
+        if kind == "deployments":
+            sdk.delete_deployment(deployment_name=name)
+        elif kind == "pipelines":
+            # deployments created since the discovery go with their pipeline
+            sdk.delete_pipeline(pipeline_name=name, force_deployments_deletion=True)
+        else:
+            sdk.delete_data_store_object(object_path_in_datastore=name)
+    except Exception as e:
+        print(f"{kind[:-1]} {name} not deleted: {e}")
+        return kind, name, False
+    print(f"{kind[:-1]} {name} deleted")
+    return kind, name, True
+
+
+def clean(
+    sdk,
+    pipelines=(),
+    pipeline_prefixes=(),
+    objects=(),
+    object_prefixes=(),
+    max_workers: int = DEFAULT_WORKERS,
+    dry_run: bool = False,
+) -> dict:
+    """This function deletes pipelines, their deployments and datastore
+    objects, given by name or by prefix, with max_workers concurrent calls
+
+    Args:
+        sdk: the sdk, or a FakeSdk
+        pipelines (list): names of the pipelines
+        pipeline_prefixes (list): prefixes of the pipelines
+        objects (list): paths of the datastore objects
+        object_prefixes (list): prefixes of the datastore objects
+        max_workers (int): number of concurrent deletions
+        dry_run (bool): only list the resources that would be deleted
+
+    Returns:
+        dict: the resources found, the number deleted and failed per kind,
+            and the duration of each stage
+    """
+    start = time.perf_counter()
+    plan = discover(sdk, pipelines, pipeline_prefixes, objects, object_prefixes)
+    summary = {"plan": plan, "discover_s": time.perf_counter() - start}
+    if dry_run:
+        for kind, names in plan.items():
+            for name in names:
+                print(f"[dry run] {kind[:-1]} {name} would be deleted")
+    else:
+        # the deployments before their pipelines, the objects meanwhile
+        stages = [("deployments", "objects"), ("pipelines",)]
+        results = []
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            for number, kinds in enumerate(stages, 1):
+                stage_start = time.perf_counter()
+                tasks = [(kind, name) for kind in kinds for name in plan[kind]]
+                results += executor.map(lambda task: _delete(sdk, *task), tasks)
+                summary[f"stage_{number}_s"] = time.perf_counter() - stage_start
+        for kind in plan:
+            summary[f"{kind}_deleted"] = sum(
+                ok for result_kind, _, ok in results if result_kind == kind
+            )
+            summary[f"{kind}_failed"] = sum(
+                not ok for result_kind, _, ok in results if result_kind == kind
+            )
+    summary["total_s"] = time.perf_counter() - start
+    found = ", ".join(f"{len(names)} {kind}" for kind, names in plan.items())
+    if dry_run:
+        print(f"Dry run: {found} found in {summary['total_s']:.2f}s")
+    else:
+        failed = sum(value for key, value in summary.items() if key.endswith("_failed"))
+        print(
+            f"Cleanup of {found} in {summary['total_s']:.2f}s: discovery "
+            f"{summary['discover_s']:.2f}s, deployments and objects "
+            f"{summary['stage_1_s']:.2f}s, pipelines {summary['stage_2_s']:.2f}s, "
+            f"{failed} failed"
+        )
+    return summary
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Delete the tutorial resources")
+    parser.add_argument("--pipeline", nargs="*", default=[])
+    parser.add_argument("--pipeline-prefix", nargs="*", default=[])
+    parser.add_argument("--object", nargs="*", default=[])
+    parser.add_argument("--object-prefix", nargs="*", default=[])
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS)
+    parser.add_argument("--dry-run", action="store_true")
+    parser.add_argument(
+        "--fake", action="store_true", help="run on a FakeSdk of tutorial resources"
+    )
+    parser.add_argument("--fake-latency-ms", type=float, default=50)
+    return parser.parse_args(argv)
+
+
+def fake_tutorial_sdk(latency_s: float, copies: int = 10) -> FakeSdk:
+    """FakeSdk holding copies of the resources of the four tutorial parts"""
+    pipelines = [
+        f"{name}-{copy}" if copy else name
+        for copy in range(copies)
+        for name in (
+            "part-1-hello-world",
+            "part-2-iristrain",
+            "part-3-irisio",
+            "part-4-iris-deployment",
+            "part-4-iristrain",
+        )
+    ]
+    deployments = {f"{name}-deployment": name for name in pipelines}
+    objects = [f"get_started/models/model_{number}.joblib" for number in range(copies)]
+    objects += [
+        "get_started/models/iris_knn_model.joblib" + suffix
+        for suffix in ("",) + SIDECAR_SUFFIXES
+    ]
+    objects.append("get_started/dataset/iris.parquet")
+    return FakeSdk(pipelines, deployments, objects, latency_s=latency_s)
+
+
+def run(pipelines=(), pipeline_prefixes=(), objects=(), object_prefixes=(), argv=None):
+    """Entry point of the clean_part_N scripts: the resources given plus the
+    ones of the command line, --dry-run, --workers and --fake are accepted
+    """
+    args = parse_args(argv)
+    if args.fake:
+        sdk = fake_tutorial_sdk(args.fake_latency_ms / 1000)
+    else:
+        sdk = make_sdk()
+    return clean(
+        sdk,
+        pipelines=list(pipelines) + args.pipeline,
+        pipeline_prefixes=list(pipeline_prefixes) + args.pipeline_prefix,
+        objects=list(objects) + args.object,
+        object_prefixes=list(object_prefixes) + args.object_prefix,
+        max_workers=args.workers,
+        dry_run=args.dry_run,
+    )
+
+
+if __name__ == "__main__":
+    run()
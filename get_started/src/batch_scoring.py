@@ -0,0 +1,147 @@
+import os
+import tempfile
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+"""
+Batch scoring of a model on columnar data.
+The rows are predicted in fixed-size NumPy chunks, from arrays per feature
+or from a Parquet object of the datastore read batch by batch, so the
+memory used does not grow with the number of rows.
+"""
+
+DEFAULT_CHUNK_SIZE = 65536
+
+
+def feature_names(model, columns) -> list:
+    """Features in the order the model was fitted with, when it knows them,
+    otherwise in the order of the input columns
+    """
+    if hasattr(model, "feature_names_in_"):
+        return list(model.feature_names_in_)
+    return [name for name in columns if name != "target"]
+
+
+def predict_in_chunks(model, X: np.ndarray, chunk_size: int = DEFAULT_CHUNK_SIZE):
+    """Yield the predictions of X chunk by chunk"""
+    for start in range(0, len(X), chunk_size):
+        yield model.predict(X[start : start + chunk_size])
+
+
+def predict_columns(
+    model, columns: dict, chunk_size: int = DEFAULT_CHUNK_SIZE
+) -> np.ndarray:
+    """This function predicts rows given as one array per feature
+
+    Args:
+        model: fitted model
+        columns (dict): feature name -> list or array of values
+        chunk_size (int): number of rows predicted at once
+
+    Returns:
+        np.ndarray: the predictions
+    """
+    names = feature_names(model, columns)
+    X = np.column_stack([np.asarray(columns[name], dtype=np.float64) for name in names])
+    return np.concatenate(list(predict_in_chunks(model, X, chunk_size)) or [[]])
+
+
+def prediction_type(model) -> pa.DataType:
+    """Arrow type of the predictions, from the classes of a classifier"""
+    if hasattr(model, "classes_"):
+        return pa.array(np.asarray(model.classes_)).type
+    return pa.float64()
+
+
+def score_parquet_file(
+    model,
+    input_file: str,
+    output_file: str,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+) -> int:
+    """This function predicts a local Parquet file batch by batch and
+    writes the predictions to another Parquet file as they come. A file
+    without rows gives an empty Parquet file of predictions.
+
+    Args:
+        model: fitted model
+        input_file (str): path of the Parquet file to score
+        output_file (str): path of the Parquet file of the predictions
+        chunk_size (int): number of rows read and predicted at once
+
+    Returns:
+        int: number of rows scored
+    """
+    parquet_file = pq.ParquetFile(input_file)
+    names = feature_names(model, parquet_file.schema_arrow.names)
+    rows = 0
+    writer = None
+    try:
+        for batch in parquet_file.iter_batches(batch_size=chunk_size, columns=names):
+            if batch.num_rows == 0:
+                continue
+            X = np.column_stack(
+                [batch.column(name).to_numpy(zero_copy_only=False) for name in names]
+            )
+            table = pa.table({"prediction": model.predict(X)})
+            if writer is None:
+                writer = pq.ParquetWriter(output_file, table.schema)
+            writer.write_table(table)
+            rows += len(X)
+    finally:
+        if writer is not None:
+            writer.close()
+    if writer is None:
+        schema = pa.schema([("prediction", prediction_type(model))])
+        pq.write_table(schema.empty_table(), output_file)
+    return rows
+
+
+def score_datastore_parquet(
+    model,
+    sdk,
+    input_path: str,
+    output_path: str,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+) -> int:
+    """This function scores a Parquet object of the datastore and uploads
+    the predictions as another Parquet object
+
+    Args:
+        model: fitted model
+        sdk (CraftAiSdk): the sdk
+        input_path (str): datastore path of the rows to score
+        output_path (str): datastore path of the predictions
+        chunk_size (int): number of rows read and predicted at once
+
+    Returns:
+        int: number of rows scored
+    """
+    with tempfile.TemporaryDirectory() as folder:
+        input_file = os.path.join(folder, "input.parquet")
+        output_file = os.path.join(folder, "predictions.parquet")
+        sdk.download_data_store_object(
+            object_path_in_datastore=input_path, filepath_or_buffer=input_file
+        )
+        rows = score_parquet_file(model, input_file, output_file, chunk_size)
+        sdk.upload_data_store_object(output_file, output_path)
+    return rows
+
+
+def batch_predict(model, input_data: dict, sdk=None, chunk_size=DEFAULT_CHUNK_SIZE):
+    """This function scores a batch given either as
+    {"columns": {feature: [values]}} or as
+    {"input_path": datastore path, "output_path": datastore path}
+
+    Returns:
+        dict: the predictions, or where they were written for a Parquet batch
+    """
+    if "input_path" in input_data:
+        rows = score_datastore_parquet(
+            model, sdk, input_data["input_path"], input_data["output_path"], chunk_size
+        )
+        return {"rows": rows, "predictions_path": input_data["output_path"]}
+    predictions = predict_columns(model, input_data["columns"], chunk_size)
+    return {"rows": len(predictions), "predictions": predictions.tolist()}
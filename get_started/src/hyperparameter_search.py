@@ -0,0 +1,163 @@
+import os
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from sklearn.model_selection import ParameterGrid, ParameterSampler, StratifiedKFold
+
+from src.neighbors import make_knn
+
+"""
+Hyper-parameter search of the Iris knn.
+Each candidate (k, weights, metric) is scored by k-fold cross-validation in
+a process pool sized to the CPUs of the container. The training data is
+written once to .npy files that the workers memory-map when they start, so
+only the candidates and the scores go through pickling.
+"""
+
+DEFAULT_GRID = {
+    "n_neighbors": [1, 3, 5, 7, 9, 15, 25],
+    "weights": ["uniform", "distance"],
+    "metric": ["euclidean", "manhattan", "chebyshev"],
+}
+
+# data of a worker process, set by _init_worker
+_shared = {}
+
+
+def available_cpus() -> int:
+    """CPUs usable by this process, taking the cgroup quota of a container
+    into account
+    """
+    if hasattr(os, "sched_getaffinity"):
+        cpus = len(os.sched_getaffinity(0))
+    else:
+        cpus = os.cpu_count() or 1
+    try:
+        with open("/sys/fs/cgroup/cpu.max") as f:
+            quota, period = f.read().split()
+        if quota != "max":
+            cpus = min(cpus, max(1, int(int(quota) / int(period))))
+    except (OSError, ValueError):
+        pass
+    return cpus
+
+
+def candidates(grid: dict = None, n_iter: int = None, seed: int = 0) -> list:
+    """All the combinations of the grid, or n_iter random ones of them"""
+    grid = grid or DEFAULT_GRID
+    if n_iter is None:
+        return list(ParameterGrid(grid))
+    return list(ParameterSampler(grid, n_iter=n_iter, random_state=seed))
+
+
+def _init_worker(x_path: str, y_path: str, n_folds: int, seed: int, knn_kwargs: dict):
+    _shared["X"] = np.load(x_path, mmap_mode="r")
+    _shared["y"] = np.load(y_path, mmap_mode="r")
+    folds = StratifiedKFold(n_splits=n_folds, shuffle=True, random_state=seed)
+    _shared["folds"] = list(folds.split(_shared["X"], _shared["y"]))
+    _shared["knn_kwargs"] = knn_kwargs
+
+
+def _evaluate(params: dict) -> dict:
+    X, y = _shared["X"], _shared["y"]
+    scores = []
+    start = time.perf_counter()
+    for train_indices, val_indices in _shared["folds"]:
+        knn = make_knn(**_shared["knn_kwargs"], **params)
+        knn.fit(X[train_indices], y[train_indices])
+        scores.append(knn.score(X[val_indices], y[val_indices]))
+    return {
+        "params": params,
+        "mean_accuracy": float(np.mean(scores)),
+        "std_accuracy": float(np.std(scores)),
+        "duration_s": time.perf_counter() - start,
+    }
+
+
+def search(
+    X,
+    y,
+    grid: dict = None,
+    n_iter: int = None,
+    n_folds: int = 5,
+    n_jobs: int = None,
+    neighbors_backend: str = "auto",
+    leaf_size: int = 30,
+    measure_speedup: bool = False,
+    seed: int = 0,
+):
+    """This function searches the best knn hyper-parameters by k-fold
+    cross-validation, in parallel
+
+    Args:
+        X: training features
+        y: training labels
+        grid (dict): parameter -> values, DEFAULT_GRID by default
+        n_iter (int): number of random candidates, None for the whole grid
+        n_folds (int): number of folds of the cross-validation
+        n_jobs (int): number of worker processes, the CPUs available by default
+        neighbors_backend (str): exact backend of make_knn, "ivf" has none of
+            the searched parameters
+        leaf_size (int): leaf size of the kd_tree and ball_tree backends
+        measure_speedup (bool): also run the search serially, to report
+            the wall-clock speedup of the pool
+        seed (int): seed of the folds and of the random search
+
+    Returns:
+        tuple: the best model refitted on all of X, the leaderboard (list of
+            candidates sorted by mean accuracy) and a report with the timings
+    """
+    if neighbors_backend == "ivf":
+        raise ValueError("the search only supports the exact neighbors backends")
+    params_list = candidates(grid, n_iter, seed)
+    n_jobs = min(n_jobs or available_cpus(), len(params_list))
+    knn_kwargs = {"backend": neighbors_backend, "leaf_size": leaf_size}
+    report = {"candidates": len(params_list), "n_jobs": n_jobs}
+
+    with tempfile.TemporaryDirectory() as folder:
+        x_path, y_path = os.path.join(folder, "X.npy"), os.path.join(folder, "y.npy")
+        np.save(x_path, np.asarray(X))
+        np.save(y_path, np.asarray(y))
+        initargs = (x_path, y_path, n_folds, seed, knn_kwargs)
+
+        start = time.perf_counter()
+        with ProcessPoolExecutor(
+            max_workers=n_jobs,
+            initializer=_init_worker,
+            initargs=initargs,
+        ) as pool:
+            results = list(pool.map(_evaluate, params_list))
+        report["parallel_s"] = time.perf_counter() - start
+
+        if measure_speedup:
+            start = time.perf_counter()
+            _init_worker(*initargs)
+            for params in params_list:
+                _evaluate(params)
+            report["serial_s"] = time.perf_counter() - start
+            report["speedup"] = report["serial_s"] / report["parallel_s"]
+            _shared.clear()
+
+    leaderboard = sorted(
+        results, key=lambda result: (-result["mean_accuracy"], result["std_accuracy"])
+    )
+    best_model = make_knn(**knn_kwargs, **leaderboard[0]["params"])
+    best_model.fit(X, y)
+    return best_model, leaderboard, report
+
+
+def print_leaderboard(leaderboard: list, report: dict, top: int = 10):
+    print(f"{'rank':>4} {'accuracy':>9} {'std':>7} {'time s':>7}  params")
+    for rank, result in enumerate(leaderboard[:top], start=1):
+        print(
+            f"{rank:>4} {result['mean_accuracy']:>9.4f} {result['std_accuracy']:>7.4f} "
+            f"{result['duration_s']:>7.3f}  {result['params']}"
+        )
+    print(
+        f"{report['candidates']} candidates on {report['n_jobs']} processes "
+        f"in {report['parallel_s']:.2f}s"
+    )
+    if "speedup" in report:
+        print(f"serial: {report['serial_s']:.2f}s, speedup: {report['speedup']:.2f}x")
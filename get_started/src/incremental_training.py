@@ -0,0 +1,303 @@
+import base64
+import hashlib
+import io
+import json
+import time
+
+import numpy as np
+import pandas as pd
+import pyarrow.parquet as pq
+from sklearn.neighbors import KNeighborsClassifier
+from sklearn.pipeline import Pipeline
+
+from src.mmap_artifacts import load_model, save_model
+from src.model_cache import object_version
+from src.streaming_training import DEFAULT_BATCH_SIZE, iter_batches, validation_mask
+
+"""
+Incremental retraining of a periodic training deployment.
+The state of the last training (version and row count of the dataset, a
+digest of its rows, the training parameters, the checksum of the model and
+the rows a knn was fitted on) is stored on the datastore next to the model.
+A run whose dataset object did not change reuses the previous model without
+downloading the dataset.
+A dataset whose first rows are the ones already trained on only had rows
+appended: the previous model is updated with the new rows instead of being
+fitted again. Any other change, or new training parameters, trains the
+model from scratch.
+"""
+
+STATE_SUFFIX = ".train_state.json"
+
+
+def _missing_errors() -> tuple:
+    from craft_ai_sdk.exceptions import SdkException
+
+    return (SdkException, OSError, ValueError)
+
+
+def file_sha256(path: str) -> str:
+    sha256 = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            sha256.update(block)
+    return sha256.hexdigest()
+
+
+def encode_array(array: np.ndarray) -> str:
+    """An array as the base64 of its .npy bytes, to store it in json"""
+    buffer = io.BytesIO()
+    np.save(buffer, np.asarray(array), allow_pickle=False)
+    return base64.b64encode(buffer.getvalue()).decode()
+
+
+def decode_array(text: str) -> np.ndarray:
+    return np.load(io.BytesIO(base64.b64decode(text)), allow_pickle=False)
+
+
+def rows_digest(path: str, target: str = "target", prefix_rows: int = None) -> tuple:
+    """This function hashes the rows of a Parquet file in one pass,
+    batch by batch
+
+    Args:
+        path (str): path of the local Parquet file
+        target (str): name of the label column, the others are features
+        prefix_rows (int): also give the digest of the first prefix_rows rows
+
+    Returns:
+        tuple: number of rows, digest of all the rows and digest of the
+            first prefix_rows rows (None when the file is shorter)
+    """
+    names = pq.ParquetFile(path).schema_arrow.names
+    features = [name for name in names if name != target]
+    sha256 = hashlib.sha256(json.dumps(names).encode())
+    prefix_digest = None
+    n_rows = 0
+
+    def update(X, y):
+        # row by row, so the digest does not depend on the batches
+        rows = np.column_stack(
+            [np.ascontiguousarray(X).view(np.uint64), pd.util.hash_array(y)]
+        )
+        sha256.update(rows.tobytes())
+
+    for row_ids, X, y in iter_batches(path, features, target, DEFAULT_BATCH_SIZE):
+        split = 0
+        if prefix_rows is not None and n_rows <= prefix_rows < n_rows + len(y):
+            split = prefix_rows - n_rows
+            update(X[:split], y[:split])
+            prefix_digest = sha256.hexdigest()
+        update(X[split:], y[split:])
+        n_rows += len(y)
+    if prefix_rows == n_rows:
+        prefix_digest = sha256.hexdigest()
+    return n_rows, sha256.hexdigest(), prefix_digest
+
+
+def read_rows(path: str, start: int, target: str = "target") -> tuple:
+    """Row numbers, features and labels of the rows of a Parquet file
+    from row start
+    """
+    names = pq.ParquetFile(path).schema_arrow.names
+    features = [name for name in names if name != target]
+    parts = [
+        (row_ids[row_ids >= start], X[row_ids >= start], y[row_ids >= start])
+        for row_ids, X, y in iter_batches(path, features, target, DEFAULT_BATCH_SIZE)
+        if row_ids[-1] >= start
+    ]
+    return tuple(np.concatenate(arrays) for arrays in zip(*parts))
+
+
+def extend_model(model, X: np.ndarray, y: np.ndarray, fitted_rows: tuple = None):
+    """This function updates a trained model with new rows
+
+    Args:
+        model: a knn, or a Pipeline(scaler, incremental estimator)
+        X (np.ndarray): features of the new rows
+        y (np.ndarray): labels of the new rows
+        fitted_rows (tuple): features and labels the knn was fitted on
+
+    Returns:
+        tuple: the updated model, and the rows it is fitted on (None when
+            it does not keep them)
+
+    Raises:
+        ValueError: the model can't learn these rows incrementally
+    """
+    if isinstance(model, Pipeline):
+        scaler = model.named_steps["scaler"]
+        classifier = model.named_steps["classifier"]
+        unknown = set(np.unique(y).tolist()) - set(classifier.classes_.tolist())
+        if unknown:
+            raise ValueError(f"new classes {sorted(unknown)} need a full training")
+        # the scaler is kept, so the weights already learned stay valid
+        classifier.partial_fit(scaler.transform(X), y)
+        return model, None
+    if isinstance(model, KNeighborsClassifier):
+        if fitted_rows is None:
+            raise ValueError("the rows of the knn are not in the training state")
+        # a knn only stores its rows, the new ones are added to them
+        X = np.concatenate([fitted_rows[0], X])
+        y = np.concatenate([fitted_rows[1], y])
+        return model.fit(X, y), (X, y)
+    if hasattr(model, "partial_fit"):
+        return model.partial_fit(X, y), None
+    raise ValueError(f"{type(model).__name__} can't be updated incrementally")
+
+
+def load_state(sdk, model_path: str, local_path: str) -> dict:
+    """State of the last training stored next to the model, None if missing"""
+    try:
+        sdk.download_data_store_object(model_path + STATE_SUFFIX, local_path)
+        with open(local_path) as f:
+            return json.load(f)
+    except _missing_errors() as e:
+        print(f"No training state for {model_path}: {e}")
+        return None
+
+
+def download_previous_model(sdk, model_path: str, local_path: str, state: dict) -> bool:
+    """This function downloads the model of the last training and checks it
+    is the one described by the state
+
+    Returns:
+        bool: True when the local model is the previous one
+    """
+    try:
+        sdk.download_data_store_object(model_path, local_path)
+    except _missing_errors() as e:
+        print(f"Previous model {model_path} not available: {e}")
+        return False
+    if file_sha256(local_path) != state["model_sha256"]:
+        print(f"Previous model {model_path} does not match its training state")
+        return False
+    return True
+
+
+def incremental_train(
+    sdk,
+    train,
+    config: dict,
+    dataset_path: str,
+    model_path: str,
+    local_dataset: str,
+    local_model: str,
+    target: str = "target",
+    val_fraction: float = 0.2,
+) -> dict:
+    """This function trains the model only when the dataset changed: it
+    reuses the previous model, updates it with the appended rows or trains
+    a new one, then stores the new training state on the datastore
+
+    Args:
+        sdk: the sdk used to reach the datastore
+        train (callable): train() -> (model, X, y), the full training on
+            local_dataset, X and y the rows a knn is fitted on (None for a
+            model that does not keep its rows)
+        config (dict): training parameters, a change of them trains a new model
+        dataset_path (str): path of the dataset on the datastore
+        model_path (str): path of the model on the datastore
+        local_dataset (str): local path of the dataset
+        local_model (str): local path where the model is written
+        target (str): name of the label column
+        val_fraction (float): share of the appended rows kept for validation
+
+    Returns:
+        dict: status ("skipped", "incremental" or "trained"), reason, rows,
+            new_rows, duration_s and time_saved_s against a full training
+    """
+    start = time.perf_counter()
+    state = load_state(sdk, model_path, local_model + STATE_SUFFIX)
+    if state is not None and state.get("config") != config:
+        print("Training parameters changed, the model is trained again")
+        state = None
+    version = object_version(sdk.get_data_store_object_information(dataset_path))
+    report = {"rows": None, "new_rows": 0}
+
+    def finish(status: str, reason: str, trained=None, n_rows=None, digest=None):
+        if trained is not None:
+            model, X, y = trained
+            manifest = save_model(model, local_model)
+            new_state = {
+                "dataset_version": version,
+                "rows": n_rows,
+                "rows_digest": digest,
+                "config": config,
+                "model_sha256": manifest["sha256"],
+                # a knn is updated from its rows, not from private attributes
+                "fitted_rows": (
+                    None if X is None else {"X": encode_array(X), "y": encode_array(y)}
+                ),
+                # the time a run would take without the previous model
+                "full_run_s": (
+                    time.perf_counter() - start
+                    if status == "trained"
+                    else state["full_run_s"]
+                ),
+            }
+        else:
+            new_state = dict(state, dataset_version=version)
+        with open(local_model + STATE_SUFFIX, "w") as f:
+            json.dump(new_state, f)
+        sdk.upload_data_store_object(
+            local_model + STATE_SUFFIX, model_path + STATE_SUFFIX
+        )
+        duration = time.perf_counter() - start
+        report.update(
+            status=status,
+            reason=reason,
+            rows=new_state["rows"],
+            duration_s=duration,
+            time_saved_s=(
+                0.0 if status == "trained" else max(state["full_run_s"] - duration, 0.0)
+            ),
+        )
+        print(
+            f"Training {status} ({reason}): {report['rows']} rows, "
+            f"{report['new_rows']} new, {duration:.2f}s, "
+            f"{report['time_saved_s']:.2f}s saved"
+        )
+        return report
+
+    previous = state is not None and download_previous_model(
+        sdk, model_path, local_model, state
+    )
+    if previous and state["dataset_version"] == version:
+        return finish("skipped", "dataset object unchanged")
+
+    sdk.download_data_store_object(
+        object_path_in_datastore=dataset_path, filepath_or_buffer=local_dataset
+    )
+    n_rows, digest, prefix_digest = rows_digest(
+        local_dataset, target, state["rows"] if previous else None
+    )
+    if previous and digest == state["rows_digest"]:
+        return finish("skipped", "same rows in a new object")
+    if previous and prefix_digest == state["rows_digest"]:
+        row_ids, X, y = read_rows(local_dataset, state["rows"], target)
+        report["new_rows"] = len(y)
+        validation = validation_mask(row_ids, val_fraction)
+        fitted_rows = state.get("fitted_rows")
+        if fitted_rows is not None:
+            fitted_rows = (
+                decode_array(fitted_rows["X"]),
+                decode_array(fitted_rows["y"]),
+            )
+        try:
+            model, rows = extend_model(
+                load_model(local_model, mmap_mode=None),
+                X[~validation],
+                y[~validation],
+                fitted_rows,
+            )
+        except ValueError as e:
+            print(f"Incremental update not possible: {e}")
+        else:
+            if validation.any():
+                accuracy = model.score(X[validation], y[validation])
+                print("Mean accuracy on the new rows:", accuracy)
+            trained = (model, *(rows or (None, None)))
+            return finish("incremental", "rows appended", trained, n_rows, digest)
+
+    reason = "no previous training" if state is None else "dataset changed"
+    return finish("trained", reason, train(), n_rows, digest)
@@ -0,0 +1,106 @@
+import hashlib
+import json
+import os
+import time
+
+import joblib
+import numpy as np
+
+"""
+Model artifacts that can be memory-mapped.
+The model is dumped without compression, so joblib writes its NumPy
+arrays (for a KNN, the whole training matrix) as aligned raw buffers.
+Loading it with mmap_mode maps these buffers instead of copying them:
+the load time no longer grows with the training data and all the worker
+processes of a container share a single page-cache copy.
+A small manifest describing the arrays is written next to the model. It
+is a description kept with the local file, the models are not checked
+against it: the output mappings upload the model alone.
+"""
+
+MANIFEST_SUFFIX = ".manifest.json"
+
+
+def _arrays(model) -> dict:
+    return {
+        name: value
+        for name, value in vars(model).items()
+        if isinstance(value, np.ndarray)
+    }
+
+
+def save_model(model, path: str) -> dict:
+    """This function dumps a model in a memory-mappable layout
+
+    Args:
+        model: fitted model
+        path (str): path of the model file
+
+    Returns:
+        dict: the manifest, also written to path + MANIFEST_SUFFIX
+    """
+    joblib.dump(model, path, compress=0)
+    sha256 = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            sha256.update(block)
+    manifest = {
+        "format": "joblib-uncompressed",
+        "model_class": type(model).__name__,
+        "size": os.path.getsize(path),
+        "sha256": sha256.hexdigest(),
+        "arrays": {
+            name: {
+                "shape": list(array.shape),
+                "dtype": str(array.dtype),
+                "nbytes": array.nbytes,
+            }
+            for name, array in _arrays(model).items()
+        },
+    }
+    with open(path + MANIFEST_SUFFIX, "w") as f:
+        json.dump(manifest, f, indent=2)
+    return manifest
+
+
+def load_model(path: str, mmap_mode: str = "r"):
+    """This function loads a model, memory-mapping its arrays when the
+    file is uncompressed. A compressed file is loaded normally.
+
+    Args:
+        path (str): path of the model file
+        mmap_mode (str): "r" to share read-only buffers, None to copy them
+
+    Returns:
+        the model
+    """
+    # joblib ignores mmap_mode for compressed files
+    return joblib.load(path, mmap_mode=mmap_mode)
+
+
+def drop_page_cache(path: str):
+    """Evict a file from the page cache, to measure cold loads (Linux only)"""
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+        os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_DONTNEED)
+    finally:
+        os.close(fd)
+
+
+def measure_load_times(path: str, mmap_mode: str = "r", warm_loads: int = 5) -> dict:
+    """This function measures the cold load time of a model, with the file
+    out of the page cache, and its mean warm load time
+
+    Returns:
+        dict: cold_load_s and warm_load_s
+    """
+    drop_page_cache(path)
+    start = time.perf_counter()
+    load_model(path, mmap_mode=mmap_mode)
+    cold_load_s = time.perf_counter() - start
+    start = time.perf_counter()
+    for _ in range(warm_loads):
+        load_model(path, mmap_mode=mmap_mode)
+    warm_load_s = (time.perf_counter() - start) / warm_loads
+    return {"cold_load_s": cold_load_s, "warm_load_s": warm_load_s}
@@ -0,0 +1,191 @@
+import hashlib
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+
+from craft_ai_sdk import CraftAiSdk
+
+from src.mmap_artifacts import load_model
+
+"""
+Process level cache of the models stored on the datastore.
+A model is downloaded and unpickled once, then reused by the next
+predictions until its datastore object changes.
+"""
+
+MODELS_DIR = os.path.join(tempfile.gettempdir(), "datastore_models")
+
+_sdk = None
+_sdk_lock = threading.Lock()
+
+
+def get_sdk() -> CraftAiSdk:
+    """Return the sdk shared by all the calls of the process"""
+    global _sdk
+    with _sdk_lock:
+        if _sdk is None:
+            _sdk = CraftAiSdk()
+    return _sdk
+
+
+def object_version(information: dict) -> str:
+    """Version of a datastore object: its ETag when the datastore gives one,
+    otherwise its modification date and size
+    """
+    for field in ("etag", "version_id", "version"):
+        if information.get(field):
+            return str(information[field])
+    return f"{information.get('last_modified')}-{information.get('size')}"
+
+
+def download_joblib(sdk, object_path: str):
+    """Download a joblib object from the datastore to a local file
+    and load it, memory-mapping its arrays
+    """
+    os.makedirs(MODELS_DIR, exist_ok=True)
+    local_path = os.path.join(MODELS_DIR, object_path.replace("/", "__"))
+    tmp_path = f"{local_path}.tmp-{os.getpid()}-{threading.get_ident()}"
+    sdk.download_data_store_object(object_path, tmp_path)
+    # a previous version still mapped by a model keeps its own file
+    os.replace(tmp_path, local_path)
+    return load_model(local_path)
+
+
+# path -> (size, modification time, content hash) of the local model files
+_file_hashes = {}
+
+
+def file_version(path: str) -> str:
+    """Version of a local model file: its size and content hash, since a
+    file input is written again on each execution. The file is hashed
+    again only when its size or modification time changed.
+    """
+    stat = os.stat(path)
+    known = _file_hashes.get(path)
+    if known is None or known[:2] != (stat.st_size, stat.st_mtime_ns):
+        sha256 = hashlib.sha256()
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                sha256.update(block)
+        known = (stat.st_size, stat.st_mtime_ns, sha256.hexdigest())
+        _file_hashes[path] = known
+    return f"{known[0]}-{known[2]}"
+
+
+def load_local_joblib(sdk, path: str):
+    """Load a local joblib file, memory-mapping its arrays"""
+    return load_model(path)
+
+
+class ModelCache:
+    """LRU cache of datastore models keyed by path and object version.
+    A new version is loaded while the calls keep using the previous one,
+    then swapped in at once.
+
+    Args:
+        max_models (int): number of models kept in memory
+        revalidate_after_s (float): delay during which a cached model is used
+            without checking the version of its datastore object
+        sdk: the sdk to use, the shared one by default
+        loader (callable): loader(sdk, object_path) -> model
+        version_fn (callable): version_fn(object_path) -> version, for models
+            that are not datastore objects (no sdk is used then)
+    """
+
+    def __init__(
+        self,
+        max_models: int = 4,
+        revalidate_after_s: float = 10,
+        sdk=None,
+        loader=download_joblib,
+        version_fn=None,
+    ):
+        self.max_models = max_models
+        self.revalidate_after_s = revalidate_after_s
+        self._sdk = sdk
+        self.loader = loader
+        self.version_fn = version_fn
+        self.stats = {"hits": 0, "revalidations": 0, "downloads": 0}
+        self._models = OrderedDict()
+        self._lock = threading.Lock()
+        self._path_locks = {}
+
+    @property
+    def sdk(self):
+        if self._sdk is None:
+            self._sdk = get_sdk()
+        return self._sdk
+
+    def _version(self, object_path: str) -> str:
+        if self.version_fn is not None:
+            return self.version_fn(object_path)
+        return object_version(self.sdk.get_data_store_object_information(object_path))
+
+    def version(self, object_path: str):
+        """Version of the cached model of object_path, None if not cached"""
+        entry = self._models.get(object_path)
+        return None if entry is None else entry["version"]
+
+    def get(self, object_path: str):
+        """Return the model stored at object_path, downloading it
+        only if it is not cached or if its datastore object changed
+        """
+        return self.get_versioned(object_path)[0]
+
+    def get_versioned(self, object_path: str) -> tuple:
+        """Same as get, with the version of the model returned, both from
+        the same cache entry
+
+        Returns:
+            tuple: the model and its version
+        """
+        with self._lock:
+            entry = self._models.get(object_path)
+            fresh = entry is not None and (
+                time.time() - entry["checked_at"] < self.revalidate_after_s
+            )
+            if fresh or (entry is not None and entry["refreshing"]):
+                # another call is checking it, the cached model is used meanwhile
+                self._models.move_to_end(object_path)
+                self.stats["hits"] += 1
+                return entry["model"], entry["version"]
+            if entry is not None:
+                entry["refreshing"] = True
+            path_lock = self._path_locks.setdefault(object_path, threading.Lock())
+
+        # the check and the download run outside of the lock of the cache,
+        # so the other models and the cached version keep being served
+        with path_lock:
+            try:
+                with self._lock:
+                    current = self._models.get(object_path)
+                if current is not None and current is not entry:
+                    # loaded by a concurrent call while this one waited
+                    return current["model"], current["version"]
+                version = self._version(object_path)
+                if entry is not None and entry["version"] == version:
+                    with self._lock:
+                        entry["checked_at"] = time.time()
+                        self.stats["revalidations"] += 1
+                    return entry["model"], entry["version"]
+                model = self.loader(
+                    self.sdk if self.version_fn is None else self._sdk, object_path
+                )
+            finally:
+                if entry is not None:
+                    entry["refreshing"] = False
+
+            with self._lock:
+                self.stats["downloads"] += 1
+                self._models[object_path] = {
+                    "model": model,
+                    "version": version,
+                    "checked_at": time.time(),
+                    "refreshing": False,
+                }
+                self._models.move_to_end(object_path)
+                while len(self._models) > self.max_models:
+                    self._models.popitem(last=False)
+            return model, version
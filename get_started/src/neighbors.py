@@ -0,0 +1,166 @@
+import numpy as np
+from sklearn.base import BaseEstimator, ClassifierMixin
+from sklearn.neighbors import KNeighborsClassifier
+
+"""
+Neighbour search backends of the Iris classifier.
+The exact backends are the KD tree and ball tree of scikit-learn, tuned by
+their leaf size. The approximate backend is an inverted file index (IVF):
+the training points are split into clusters by k-means and a query only
+scans the n_probe clusters closest to it, which trades recall for latency.
+"""
+
+BACKENDS = ("auto", "brute", "kd_tree", "ball_tree", "ivf")
+
+
+class IVFKNeighborsClassifier(ClassifierMixin, BaseEstimator):
+    """Approximate k nearest neighbours classifier on an inverted file index
+
+    Args:
+        n_neighbors (int): number of neighbours voting for a prediction
+        n_lists (int): number of clusters, sqrt of the training size by default
+        n_probe (int): number of clusters scanned by a query, the higher the
+            better the recall and the slower the query
+        n_iter (int): k-means iterations used to build the clusters
+        random_state (int): seed of the k-means initialization
+    """
+
+    def __init__(
+        self,
+        n_neighbors: int = 5,
+        n_lists: int = None,
+        n_probe: int = 4,
+        n_iter: int = 10,
+        random_state: int = 0,
+    ):
+        self.n_neighbors = n_neighbors
+        self.n_lists = n_lists
+        self.n_probe = n_probe
+        self.n_iter = n_iter
+        self.random_state = random_state
+
+    @staticmethod
+    def _sq_distances(A: np.ndarray, B: np.ndarray) -> np.ndarray:
+        distances = (A * A).sum(1)[:, None] - 2 * A @ B.T + (B * B).sum(1)[None, :]
+        return np.maximum(distances, 0)
+
+    def _assign(self, X: np.ndarray, chunk_size: int = 65536) -> np.ndarray:
+        return np.concatenate(
+            [
+                self._sq_distances(X[start : start + chunk_size], self.centroids_)
+                .argmin(1)
+                for start in range(0, len(X), chunk_size)
+            ]
+        )
+
+    def fit(self, X, y):
+        X = np.asarray(X, dtype=np.float64)
+        self.classes_, y = np.unique(np.asarray(y), return_inverse=True)
+        n_lists = self.n_lists or max(1, int(np.sqrt(len(X))))
+        rng = np.random.default_rng(self.random_state)
+        # k-means on a sample is enough to build the coarse clusters
+        sample = X[rng.choice(len(X), min(len(X), 64 * n_lists), replace=False)]
+        self.centroids_ = sample[rng.choice(len(sample), n_lists, replace=False)]
+        for _ in range(self.n_iter):
+            labels = self._assign(sample)
+            counts = np.bincount(labels, minlength=n_lists)
+            sums = np.stack(
+                [
+                    np.bincount(labels, weights=sample[:, feature], minlength=n_lists)
+                    for feature in range(X.shape[1])
+                ],
+                axis=1,
+            )
+            filled = counts > 0
+            self.centroids_[filled] = sums[filled] / counts[filled, None]
+        # the points are stored sorted by cluster, each list is a slice
+        labels = self._assign(X)
+        order = np.argsort(labels, kind="stable")
+        self.fit_X_ = X[order]
+        self.fit_y_ = y[order]
+        self.list_offsets_ = np.searchsorted(labels[order], np.arange(n_lists + 1))
+        return self
+
+    def partial_fit(self, X, y):
+        """Add points to a fitted index without running k-means again:
+        each new point joins the list of its closest centroid
+        """
+        X = np.asarray(X, dtype=np.float64)
+        n_lists = len(self.centroids_)
+        labels = np.concatenate(
+            [
+                np.repeat(np.arange(n_lists), np.diff(self.list_offsets_)),
+                self._assign(X),
+            ]
+        )
+        self.classes_, y = np.unique(
+            np.concatenate([self.classes_[self.fit_y_], np.asarray(y)]),
+            return_inverse=True,
+        )
+        order = np.argsort(labels, kind="stable")
+        self.fit_X_ = np.concatenate([self.fit_X_, X])[order]
+        self.fit_y_ = y[order]
+        self.list_offsets_ = np.searchsorted(labels[order], np.arange(n_lists + 1))
+        return self
+
+    def kneighbors(self, X):
+        """Return (squared distances, indices in fit_X_) of the approximate
+        nearest neighbours of each query
+        """
+        X = np.asarray(X, dtype=np.float64)
+        k = self.n_neighbors
+        n_probe = min(self.n_probe, len(self.centroids_))
+        best_distances = np.full((len(X), k), np.inf)
+        best_indices = np.zeros((len(X), k), dtype=np.int64)
+        probes = np.argsort(self._sq_distances(X, self.centroids_), axis=1)[:, :n_probe]
+        # scan each list once for all the queries probing it
+        for cluster in np.unique(probes):
+            queries = np.flatnonzero((probes == cluster).any(1))
+            start, end = self.list_offsets_[cluster], self.list_offsets_[cluster + 1]
+            if start == end:
+                continue
+            distances = np.concatenate(
+                [
+                    best_distances[queries],
+                    self._sq_distances(X[queries], self.fit_X_[start:end]),
+                ],
+                axis=1,
+            )
+            indices = np.concatenate(
+                [
+                    best_indices[queries],
+                    np.broadcast_to(np.arange(start, end), (len(queries), end - start)),
+                ],
+                axis=1,
+            )
+            top = np.argpartition(distances, k - 1, axis=1)[:, :k]
+            best_distances[queries] = np.take_along_axis(distances, top, 1)
+            best_indices[queries] = np.take_along_axis(indices, top, 1)
+        return best_distances, best_indices
+
+    def predict(self, X):
+        distances, indices = self.kneighbors(X)
+        votes = np.where(np.isfinite(distances), self.fit_y_[indices], -1)
+        counts = np.stack(
+            [(votes == label).sum(1) for label in range(len(self.classes_))], axis=1
+        )
+        return self.classes_[counts.argmax(1)]
+
+
+def make_knn(backend: str = "auto", leaf_size: int = 30, n_probe: int = 4, **params):
+    """This function builds the knn classifier of a neighbour search backend
+
+    Args:
+        backend (str): one of BACKENDS, "auto" lets scikit-learn choose
+        leaf_size (int): leaf size of the kd_tree and ball_tree backends
+        n_probe (int): clusters scanned per query by the ivf backend
+        params: other parameters of the classifier, like n_neighbors
+
+    Returns:
+        the classifier, not fitted
+    """
+    if backend == "ivf":
+        return IVFKNeighborsClassifier(n_probe=n_probe, **params)
+    if backend not in BACKENDS:
+        raise ValueError(f"unknown backend {backend}, choose one of {BACKENDS}")
+    return KNeighborsClassifier(algorithm=backend, leaf_size=leaf_size, **params)
@@ -1,13 +1,35 @@
-import joblib
 import numpy as np
 import pandas as pd
-from sklearn.neighbors import KNeighborsClassifier
 from craft_ai_sdk import CraftAiSdk
+from src.hyperparameter_search import print_leaderboard, search
+from src.mmap_artifacts import save_model
+from src.neighbors import make_knn
+from src.streaming_training import train_streaming
 
 
-def trainIris():
+def trainIris(
+    neighbors_backend: str = "auto",
+    leaf_size: int = 30,
+    n_probe: int = 4,
+    streaming: bool = False,
+    incremental_estimator: str = "sgd",
+    hyperparameter_search: bool = False,
+    search_iter: int = None,
+):
     """
     Train Iris function that trains a simple model based on Iris Dataset
+
+    The neighbour search backend can be "auto", "brute", "kd_tree",
+    "ball_tree" (exact, tuned by leaf_size) or "ivf" (approximate, n_probe
+    clusters scanned per query) for datasets far larger than iris
+
+    With streaming=True the dataset is read batch by batch and an
+    incremental estimator ("sgd", "perceptron" or "naive_bayes") is
+    trained instead of the knn, with a memory bounded whatever its size
+
+    With hyperparameter_search=True, k, weights and metric of the knn are
+    chosen by a parallel k-fold cross-validation over the whole grid, or
+    over search_iter random candidates
     """
 
     # Init of the sdk
@@ -19,34 +41,52 @@ def trainIris():
         object_path_in_datastore="get_started/dataset/iris.parquet",
         filepath_or_buffer="iris.parquet",
     )
-    dataset_df = pd.read_parquet("iris.parquet")
 
-    # Creation of the train and test sets
-    X = dataset_df.loc[:, dataset_df.columns != "target"].values
-    y = dataset_df.loc[:, "target"].values
+    if streaming:
+        model, report = train_streaming("iris.parquet", estimator=incremental_estimator)
+        print("Mean accuracy:", report["mean_accuracy"])
+        # same path as the knn, so the predictions load it unchanged
+        save_model(model, "iris_knn_model.joblib")
+    else:
+        dataset_df = pd.read_parquet("iris.parquet")
+
+        # Creation of the train and test sets
+        X = dataset_df.loc[:, dataset_df.columns != "target"].values
+        y = dataset_df.loc[:, "target"].values
 
-    np.random.seed(0)
-    indices = np.random.permutation(len(X))
+        np.random.seed(0)
+        indices = np.random.permutation(len(X))
 
-    n_train_samples = int(0.8 * len(X))
-    train_indices = indices[:n_train_samples]
-    val_indices = indices[n_train_samples:]
+        n_train_samples = int(0.8 * len(X))
+        train_indices = indices[:n_train_samples]
+        val_indices = indices[n_train_samples:]
 
-    X_train = X[train_indices]
-    y_train = y[train_indices]
-    X_val = X[val_indices]
-    y_val = y[val_indices]
+        X_train = X[train_indices]
+        y_train = y[train_indices]
+        X_val = X[val_indices]
+        y_val = y[val_indices]
 
-    # Init of the model (knn)
-    knn = KNeighborsClassifier()
-    knn.fit(X_train, y_train)
+        # Init of the model (knn)
+        if hyperparameter_search:
+            knn, leaderboard, report = search(
+                X_train,
+                y_train,
+                n_iter=search_iter,
+                neighbors_backend=neighbors_backend,
+                leaf_size=leaf_size,
+            )
+            print_leaderboard(leaderboard, report)
+        else:
+            knn = make_knn(neighbors_backend, leaf_size=leaf_size, n_probe=n_probe)
+            knn.fit(X_train, y_train)
 
-    # Metric computation
-    mean_accuracy = knn.score(X_val, y_val)
-    print("Mean accuracy:", mean_accuracy)
+        # Metric computation
+        mean_accuracy = knn.score(X_val, y_val)
+        print("Mean accuracy:", mean_accuracy)
 
-    # Store the trained model on the datastore
-    joblib.dump(knn, "iris_knn_model.joblib")
+        # Store the trained model on the datastore,
+        # uncompressed so that predictions can memory-map it
+        save_model(knn, "iris_knn_model.joblib")
 
     sdk.upload_data_store_object(
         "iris_knn_model.joblib", "get_started/models/iris_knn_model.joblib"
@@ -1,24 +1,42 @@
-from io import BytesIO
-from craft_ai_sdk import CraftAiSdk
-import joblib
-import pandas as pd
-from datetime import datetime
+from src.batch_scoring import batch_predict
+from src.predictor import Predictor
 
 
+# the predictor lives as long as the container: the sdk and the model are
+# loaded on the first call, and the model is only downloaded again (then
+# swapped) when its datastore object changes
+predictor = Predictor()
+
 
 def predictIris(input_data: dict, input_model_path:str):
 
-    sdk = CraftAiSdk()
-    
-    f = BytesIO()
-    sdk.download_data_store_object(input_model_path, f)
-    model = joblib.load(f)
+    # rows given as a dict per row, arrays per feature,
+    # or a base64 Arrow IPC stream or NumPy buffer,
+    # the predictions are sent back in the format of the request
+    result = predictor.predict(input_data, input_model_path)
+
+    print(result["predictions"])
+
+    return result
+
+
+def batchPredictIris(input_data: dict, input_model_path: str):
+    """
+    Batch scoring of many rows, given either as arrays per feature
+    {"columns": {feature: [values]}} or as a Parquet object of the datastore
+    {"input_path": ..., "output_path": ...} whose predictions are written
+    to output_path
+    """
+
+    model = predictor.model(input_model_path)
 
-    input_dataframe = pd.DataFrame.from_dict(input_data, orient="index")
-    predictions = model.predict(input_dataframe)
+    return {"predictions": batch_predict(model, input_data, sdk=predictor.cache.sdk)}
 
-    print(predictions)
 
-    final_predictions = predictions.tolist()
+def statusIris():
+    """
+    Requests served by the container, their p50 and p95 latency,
+    and the loads and swaps of the model
+    """
 
-    return {"predictions": final_predictions}
+    return {"status": predictor.stats()}
@@ -1,66 +1,169 @@
 from io import BytesIO
 from craft_ai_sdk import CraftAiSdk
-import joblib
 import pandas as pd
 import json
 import numpy as np
 import pandas as pd
 from sklearn.neighbors import KNeighborsClassifier
+from src.batch_scoring import batch_predict
+from src.hyperparameter_search import print_leaderboard, search
+from src.incremental_training import incremental_train
+from src.mmap_artifacts import save_model
+from src.model_cache import get_sdk
+from src.neighbors import make_knn
+from src.predictor import local_file_predictor
+from src.streaming_training import train_streaming
+
+
+# the predictor lives as long as the container: the model file input is
+# loaded on the first call, then again only when its content changes
+predictor = local_file_predictor()
 
 
 def predictIris(input_data: dict, input_model: dict):
 
-    model = joblib.load(input_model["path"])
+    # the training matrix of the knn is memory-mapped, not copied;
+    # rows given as a dict per row, arrays per feature,
+    # or a base64 Arrow IPC stream or NumPy buffer,
+    # the predictions are sent back in the format of the request
+    result = predictor.predict(input_data, input_model["path"])
+
+    print(result["predictions"])
 
-    input_dataframe = pd.DataFrame.from_dict(input_data, orient="index")
-    predictions = model.predict(input_dataframe)
+    return result
 
-    print(predictions)
 
-    return {"predictions": predictions.tolist()}
+def batchPredictIris(input_data: dict, input_model: dict):
+    """
+    Batch scoring of many rows, given either as arrays per feature
+    {"columns": {feature: [values]}} or as a Parquet object of the datastore
+    {"input_path": ..., "output_path": ...} whose predictions are written
+    to output_path
+    """
 
+    model = predictor.model(input_model["path"])
 
-def trainIris():
+    return {"predictions": batch_predict(model, input_data, sdk=get_sdk())}
+
+
+def statusIris():
     """
-    Train Iris function that trains a simple model based on Iris Dataset
+    Requests served by the container, their p50 and p95 latency,
+    and the loads and swaps of the model
     """
 
-    # Init of the sdk
-    # because we will use it to communicate with the platform and retrieve a dataset stored on the datastore
-    sdk = CraftAiSdk()
+    return {"status": predictor.stats()}
 
-    # Download of the iris dataset
-    sdk.download_data_store_object(
-        object_path_in_datastore="get_started/dataset/iris.parquet",
-        filepath_or_buffer="iris.parquet",
-    )
-    dataset_df = pd.read_parquet("iris.parquet")
 
-    # Creation of the train and test sets
-    X = dataset_df.loc[:, dataset_df.columns != "target"].values
-    y = dataset_df.loc[:, "target"].values
+def trainIris(
+    neighbors_backend: str = "auto",
+    leaf_size: int = 30,
+    n_probe: int = 4,
+    streaming: bool = False,
+    incremental_estimator: str = "sgd",
+    hyperparameter_search: bool = False,
+    search_iter: int = None,
+    incremental: bool = True,
+):
+    """
+    Train Iris function that trains a simple model based on Iris Dataset
 
-    np.random.seed(0)
-    indices = np.random.permutation(len(X))
+    The neighbour search backend can be "auto", "brute", "kd_tree",
+    "ball_tree" (exact, tuned by leaf_size) or "ivf" (approximate, n_probe
+    clusters scanned per query) for datasets far larger than iris
 
-    n_train_samples = int(0.8 * len(X))
-    train_indices = indices[:n_train_samples]
-    val_indices = indices[n_train_samples:]
+    With streaming=True the dataset is read batch by batch and an
+    incremental estimator ("sgd", "perceptron" or "naive_bayes") is
+    trained instead of the knn, with a memory bounded whatever its size
 
-    X_train = X[train_indices]
-    y_train = y[train_indices]
-    X_val = X[val_indices]
-    y_val = y[val_indices]
+    With hyperparameter_search=True, k, weights and metric of the knn are
+    chosen by a parallel k-fold cross-validation over the whole grid, or
+    over search_iter random candidates
 
-    # Init of the model (knn)
-    knn = KNeighborsClassifier()
-    knn.fit(X_train, y_train)
+    With incremental=True (the periodic deployment), a run whose dataset
+    did not change reuses the previous model, and rows appended to the
+    dataset update the previous model instead of training a new one
+    """
 
-    # Metric computation
-    mean_accuracy = knn.score(X_val, y_val)
-    print("Mean accuracy:", mean_accuracy)
+    # Init of the sdk
+    # because we will use it to communicate with the platform and retrieve a dataset stored on the datastore
+    sdk = CraftAiSdk()
 
-    # Store the trained model on the datastore
-    joblib.dump(knn, "iris_knn_model.joblib")
+    def train():
+        if streaming:
+            model, report = train_streaming(
+                "iris.parquet", estimator=incremental_estimator
+            )
+            print("Mean accuracy:", report["mean_accuracy"])
+            # the incremental estimators do not keep their rows
+            return model, None, None
+
+        dataset_df = pd.read_parquet("iris.parquet")
+
+        # Creation of the train and test sets
+        X = dataset_df.loc[:, dataset_df.columns != "target"].values
+        y = dataset_df.loc[:, "target"].values
+
+        np.random.seed(0)
+        indices = np.random.permutation(len(X))
+
+        n_train_samples = int(0.8 * len(X))
+        train_indices = indices[:n_train_samples]
+        val_indices = indices[n_train_samples:]
+
+        X_train = X[train_indices]
+        y_train = y[train_indices]
+        X_val = X[val_indices]
+        y_val = y[val_indices]
+
+        # Init of the model (knn)
+        if hyperparameter_search:
+            knn, leaderboard, report = search(
+                X_train,
+                y_train,
+                n_iter=search_iter,
+                neighbors_backend=neighbors_backend,
+                leaf_size=leaf_size,
+            )
+            print_leaderboard(leaderboard, report)
+        else:
+            knn = make_knn(neighbors_backend, leaf_size=leaf_size, n_probe=n_probe)
+            knn.fit(X_train, y_train)
+
+        # Metric computation
+        mean_accuracy = knn.score(X_val, y_val)
+        print("Mean accuracy:", mean_accuracy)
+        return knn, X_train, y_train
+
+    if incremental:
+        # The training state is stored next to the model on the datastore
+        incremental_train(
+            sdk,
+            train,
+            config={
+                "neighbors_backend": neighbors_backend,
+                "leaf_size": leaf_size,
+                "n_probe": n_probe,
+                "streaming": streaming,
+                "incremental_estimator": incremental_estimator,
+                "hyperparameter_search": hyperparameter_search,
+                "search_iter": search_iter,
+            },
+            dataset_path="get_started/dataset/iris.parquet",
+            model_path="get_started/models/iris_knn_model.joblib",
+            local_dataset="iris.parquet",
+            local_model="iris_knn_model.joblib",
+        )
+    else:
+        # Download of the iris dataset
+        sdk.download_data_store_object(
+            object_path_in_datastore="get_started/dataset/iris.parquet",
+            filepath_or_buffer="iris.parquet",
+        )
+
+        # Store the trained model on the datastore (same path whatever the
+        # model, so the predictions load it unchanged),
+        # uncompressed so that predictions can memory-map it
+        save_model(train()[0], "iris_knn_model.joblib")
 
     return {"model": {"path": "iris_knn_model.joblib"}}
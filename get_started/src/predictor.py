@@ -0,0 +1,114 @@
+import statistics
+import threading
+import time
+from collections import deque
+
+from src.model_cache import ModelCache, file_version, load_local_joblib
+from src.wire_format import decode_features, encode_predictions
+
+"""
+Long-lived predictor of the Iris prediction pipelines.
+The predictor is created when the module of the pipeline is imported but
+does nothing until its first call: the sdk, the download and the load of
+the model happen once, then every call of the container reuses the model.
+When the model object changes, the new version is loaded while the calls
+keep using the previous one, and replaces it at once. The latency of the
+calls and the number of model loads are recorded.
+"""
+
+
+class Predictor:
+    """Thread-safe predictor keeping its models between calls
+
+    Args:
+        cache (ModelCache): where the models are loaded from, datastore
+            objects by default
+        latency_window (int): number of latencies kept
+    """
+
+    def __init__(self, cache: ModelCache = None, latency_window: int = 1000):
+        self._cache = cache
+        self._cache_lock = threading.Lock()
+        self._latencies = deque(maxlen=latency_window)
+        self._stats_lock = threading.Lock()
+        self.requests = 0
+        self.swaps = 0
+        self._versions = {}
+
+    @property
+    def cache(self) -> ModelCache:
+        # built on the first call, not when the pipeline module is imported
+        with self._cache_lock:
+            if self._cache is None:
+                self._cache = ModelCache()
+        return self._cache
+
+    def model(self, model_path: str):
+        """The model at model_path, loaded on its first use"""
+        # the model and its version come from the same swap
+        model, version = self.cache.get_versioned(model_path)
+        with self._stats_lock:
+            previous = self._versions.get(model_path)
+            if previous is not None and previous != version:
+                self.swaps += 1
+                print(f"Model {model_path} swapped to version {version}")
+            self._versions[model_path] = version
+        return model
+
+    def predict(self, input_data: dict, model_path: str) -> dict:
+        """This function predicts the rows of a request, in any of the
+        formats of src.wire_format
+
+        Args:
+            input_data (dict): the rows to predict
+            model_path (str): path of the model
+
+        Returns:
+            dict: the predictions, in the format of the request
+        """
+        start = time.perf_counter()
+        model = self.model(model_path)
+        input_rows, input_format = decode_features(input_data, model)
+        predictions = model.predict(input_rows)
+        result = {"predictions": encode_predictions(predictions, input_format)}
+        latency = time.perf_counter() - start
+        with self._stats_lock:
+            self.requests += 1
+            self._latencies.append(latency)
+        return result
+
+    def stats(self) -> dict:
+        """This function gives the requests served, their latency, and the
+        loads and swaps of the models
+
+        Returns:
+            dict: requests, p50_s, p95_s, loads, hits, swaps and versions
+        """
+        with self._stats_lock:
+            latencies = sorted(self._latencies)
+            stats = {
+                "requests": self.requests,
+                "p50_s": statistics.median(latencies) if latencies else None,
+                "p95_s": (
+                    latencies[min(len(latencies) - 1, int(0.95 * len(latencies)))]
+                    if latencies
+                    else None
+                ),
+                "swaps": self.swaps,
+                "versions": dict(self._versions),
+            }
+        cache_stats = self._cache.stats if self._cache is not None else {}
+        stats["loads"] = cache_stats.get("downloads", 0)
+        stats["hits"] = cache_stats.get("hits", 0)
+        return stats
+
+
+def local_file_predictor() -> Predictor:
+    """Predictor of models given as local files, like the file inputs of a
+    pipeline: a file is loaded again only when its content changes
+    """
+    return Predictor(
+        ModelCache(
+            revalidate_after_s=0, loader=load_local_joblib, version_fn=file_version
+        )
+    )
@@ -0,0 +1,134 @@
+import numpy as np
+import pyarrow.parquet as pq
+from sklearn.linear_model import Perceptron, SGDClassifier
+from sklearn.naive_bayes import GaussianNB
+from sklearn.pipeline import Pipeline
+from sklearn.preprocessing import StandardScaler
+
+"""
+Out-of-core training on a Parquet file.
+The file is read batch by batch through pyarrow and each row is sent to the
+train or the validation set by a hash of its row number, so the split is
+deterministic and never needs a permutation of the whole index. The
+estimators are fitted with partial_fit: the memory used is bounded by the
+row group size, whatever the size of the file.
+A knn keeps its whole training set, so it cannot be trained this way.
+"""
+
+DEFAULT_BATCH_SIZE = 65536
+HASH_BUCKETS = 10000
+
+INCREMENTAL_ESTIMATORS = {
+    "sgd": lambda seed: SGDClassifier(loss="log_loss", random_state=seed),
+    "perceptron": lambda seed: Perceptron(random_state=seed),
+    "naive_bayes": lambda seed: GaussianNB(),
+}
+
+
+def hash_row_ids(row_ids: np.ndarray, seed: int = 0) -> np.ndarray:
+    """splitmix64 hash of the row numbers, vectorized"""
+    with np.errstate(over="ignore"):
+        z = row_ids.astype(np.uint64)
+        z = z + np.uint64(seed) * np.uint64(0x9E3779B97F4A7C15)
+        z = (z ^ (z >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+        z = (z ^ (z >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+        return z ^ (z >> np.uint64(31))
+
+
+def validation_mask(row_ids: np.ndarray, val_fraction: float, seed: int = 0):
+    """True for the rows of the validation set, always the same for a row"""
+    buckets = hash_row_ids(row_ids, seed) % np.uint64(HASH_BUCKETS)
+    return buckets < np.uint64(round(val_fraction * HASH_BUCKETS))
+
+
+def iter_batches(path: str, features: list, target: str, batch_size: int):
+    """Yield (row numbers, X, y) of a Parquet file, batch by batch.
+    The file is read one row group at a time: iter_batches over the whole
+    file keeps its read buffers until the end and would grow with it.
+    """
+    parquet_file = pq.ParquetFile(path)
+    offset = 0
+    for row_group in range(parquet_file.metadata.num_row_groups):
+        table = parquet_file.read_row_group(row_group, columns=features + [target])
+        for batch in table.to_batches(max_chunksize=batch_size):
+            X = np.column_stack(
+                [
+                    batch.column(name).to_numpy(zero_copy_only=False)
+                    for name in features
+                ]
+            ).astype(np.float64)
+            y = batch.column(target).to_numpy(zero_copy_only=False)
+            yield np.arange(offset, offset + len(y)), X, y
+            offset += len(y)
+        del table
+
+
+def train_streaming(
+    path: str,
+    target: str = "target",
+    estimator: str = "sgd",
+    epochs: int = 5,
+    val_fraction: float = 0.2,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    seed: int = 0,
+):
+    """This function trains a model on a Parquet file without loading it.
+    A first pass fits the scaler and finds the classes, then each epoch
+    is one more pass of partial_fit, and a last pass scores the
+    validation rows.
+
+    Args:
+        path (str): path of the local Parquet file
+        target (str): name of the label column, the others are features
+        estimator (str): one of INCREMENTAL_ESTIMATORS
+        epochs (int): number of passes of partial_fit over the train rows
+        val_fraction (float): share of the rows kept for validation
+        batch_size (int): number of rows converted to NumPy at once, the
+            memory is bounded by the row group size of the file
+        seed (int): seed of the split and of the estimator
+
+    Returns:
+        tuple: the fitted Pipeline(scaler, estimator) and a report with the
+            train_rows, val_rows and mean_accuracy
+    """
+    if estimator not in INCREMENTAL_ESTIMATORS:
+        raise ValueError(
+            f"unknown estimator {estimator}, choose one of "
+            f"{list(INCREMENTAL_ESTIMATORS)}"
+        )
+    names = pq.ParquetFile(path).schema_arrow.names
+    features = [name for name in names if name != target]
+    scaler = StandardScaler()
+    classifier = INCREMENTAL_ESTIMATORS[estimator](seed)
+
+    def batches(validation: bool):
+        for row_ids, X, y in iter_batches(path, features, target, batch_size):
+            keep = validation_mask(row_ids, val_fraction, seed) == validation
+            if keep.any():
+                yield X[keep], y[keep]
+
+    classes = set()
+    train_rows = 0
+    for X, y in batches(validation=False):
+        scaler.partial_fit(X)
+        classes.update(np.unique(y).tolist())
+        train_rows += len(y)
+    classes = np.array(sorted(classes))
+
+    for _ in range(epochs):
+        for X, y in batches(validation=False):
+            classifier.partial_fit(scaler.transform(X), y, classes=classes)
+
+    val_rows = 0
+    correct = 0
+    for X, y in batches(validation=True):
+        correct += int((classifier.predict(scaler.transform(X)) == y).sum())
+        val_rows += len(y)
+
+    model = Pipeline([("scaler", scaler), ("classifier", classifier)])
+    report = {
+        "train_rows": train_rows,
+        "val_rows": val_rows,
+        "mean_accuracy": correct / val_rows if val_rows else None,
+    }
+    return model, report
@@ -0,0 +1,503 @@
+import hashlib
+import io
+import json
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+"""
+Chunked, parallel and resumable transfers of datastore objects.
+An object is split into parts of part_size bytes moved concurrently, each
+part downloaded with a range request or uploaded as one part of a
+multipart upload. The finished parts are recorded in a state file next to
+the local file, so an interrupted transfer only moves the missing parts
+when it is run again. A store that does not serve ranges, or ignores them,
+moves the object in a single stream. An upload also stores the sha256 of
+the object in a small object next to it, with the size and version of
+the object it was computed for: a download checks it only when the object
+is still that version, since the object can be uploaded again without it.
+
+The stores below give the same few methods: SdkObjectStore goes through
+the public datastore calls of the sdk, which move an object in a single
+stream, LocalObjectStore is a fake object store in a local folder, with
+ranges and multipart uploads, to test and benchmark the transfers.
+TransferSdk is opt-in: through the sdk alone, an object still moves in a
+single stream and only pays for the extra information and checksum calls,
+so the pipelines use the sdk itself. Wrap the sdk in a TransferSdk with a
+store serving ranges to chunk its large transfers.
+"""
+
+CHECKSUM_SUFFIX = ".sha256"
+STATE_SUFFIX = ".transfer.json"
+DEFAULT_PART_SIZE = int(os.environ.get("DATASTORE_PART_SIZE_MB", "64")) * 1024**2
+DEFAULT_WORKERS = int(os.environ.get("DATASTORE_TRANSFER_WORKERS", "8"))
+
+
+class RangeNotSupported(IOError):
+    """Raised by a store whose server answered a range request with the
+    whole object"""
+
+
+class LocalObjectStore:
+    """Fake object store keeping its objects in a local folder
+
+    Args:
+        root (str): folder of the objects
+        latency_s (float): delay added to each request, like a network round trip
+        bandwidth_mb_s (float): throughput of one connection, None for no limit
+        ranges (bool): False to answer the range requests with the whole
+            object, like a server ignoring the Range header
+    """
+
+    multipart = True
+
+    def __init__(
+        self, root: str, latency_s: float = 0.0, bandwidth_mb_s=None, ranges=True
+    ):
+        self.root = root
+        self.latency_s = latency_s
+        self.bandwidth_mb_s = bandwidth_mb_s
+        self.ranges = ranges
+        self.requests = 0
+        self._lock = threading.Lock()
+
+    def _path(self, object_path: str) -> str:
+        return os.path.join(self.root, object_path)
+
+    def _request(self, n_bytes: int = 0):
+        with self._lock:
+            self.requests += 1
+        delay = self.latency_s
+        if self.bandwidth_mb_s:
+            delay += n_bytes / (self.bandwidth_mb_s * 1024**2)
+        if delay:
+            time.sleep(delay)
+
+    def information(self, object_path: str):
+        self._request()
+        try:
+            stat = os.stat(self._path(object_path))
+        except FileNotFoundError:
+            return None
+        return {"size": stat.st_size, "version": str(stat.st_mtime_ns)}
+
+    def read_range(self, object_path: str, start: int, end: int) -> bytes:
+        if not self.ranges:
+            self._request()
+            raise RangeNotSupported(f"{object_path} is not served by ranges")
+        self._request(end - start)
+        with open(self._path(object_path), "rb") as f:
+            f.seek(start)
+            return f.read(end - start)
+
+    def get(self, object_path: str):
+        if not os.path.exists(self._path(object_path)):
+            self._request()
+            return None
+        with open(self._path(object_path), "rb") as f:
+            data = f.read()
+        self._request(len(data))
+        return data
+
+    def download(self, object_path: str, local_path: str):
+        with open(local_path, "wb") as f:
+            f.write(self.get(object_path))
+
+    def put(self, object_path: str, data: bytes):
+        self._request(len(data))
+        os.makedirs(os.path.dirname(self._path(object_path)) or ".", exist_ok=True)
+        with open(self._path(object_path), "wb") as f:
+            f.write(data)
+
+    def upload(self, local_path: str, object_path: str):
+        with open(local_path, "rb") as f:
+            self.put(object_path, f.read())
+
+    def start_upload(self, object_path: str) -> str:
+        self._request()
+        return uuid.uuid4().hex
+
+    def upload_part(self, object_path, upload, number, data, part_size, size=None):
+        self._request(len(data))
+        folder = os.path.join(self.root, ".uploads", upload)
+        os.makedirs(folder, exist_ok=True)
+        with open(os.path.join(folder, str(number)), "wb") as f:
+            f.write(data)
+        return hashlib.md5(data).hexdigest()
+
+    def complete_upload(self, object_path: str, upload: str, parts: dict):
+        self._request()
+        folder = os.path.join(self.root, ".uploads", upload)
+        os.makedirs(os.path.dirname(self._path(object_path)) or ".", exist_ok=True)
+        with open(self._path(object_path), "wb") as f:
+            for number in sorted(parts, key=int):
+                with open(os.path.join(folder, str(number)), "rb") as part:
+                    f.write(part.read())
+                os.remove(os.path.join(folder, str(number)))
+        os.rmdir(folder)
+
+
+class SdkObjectStore:
+    """Object store of the platform datastore, through the public calls
+    of the sdk only: an object is downloaded in a single stream, and the
+    sdk switches to its own multipart upload for the large files
+
+    Args:
+        sdk: the CraftAiSdk
+    """
+
+    ranges = False
+    multipart = False
+
+    def __init__(self, sdk):
+        self.sdk = sdk
+
+    def information(self, object_path: str):
+        from craft_ai_sdk.exceptions import SdkException
+
+        from src.model_cache import object_version
+
+        try:
+            information = self.sdk.get_data_store_object_information(object_path)
+        except SdkException:
+            return None
+        return {
+            "size": int(information["size"]),
+            "version": object_version(information),
+        }
+
+    def get(self, object_path: str):
+        from craft_ai_sdk.exceptions import SdkException
+
+        buffer = io.BytesIO()
+        try:
+            self.sdk.download_data_store_object(object_path, buffer)
+        except SdkException:
+            return None
+        return buffer.getvalue()
+
+    def download(self, object_path: str, local_path: str):
+        self.sdk.download_data_store_object(object_path, local_path)
+
+    def put(self, object_path: str, data: bytes):
+        self.sdk.upload_data_store_object(io.BytesIO(data), object_path)
+
+    def upload(self, local_path: str, object_path: str):
+        self.sdk.upload_data_store_object(local_path, object_path)
+
+
+def _file_sha256(path: str) -> str:
+    sha256 = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            sha256.update(block)
+    return sha256.hexdigest()
+
+
+def _load_state(path: str, expected: dict) -> dict:
+    """State of a previous attempt of the same transfer, or a new one"""
+    try:
+        with open(path) as f:
+            state = json.load(f)
+        if all(state.get(key) == value for key, value in expected.items()):
+            return state
+    except (OSError, ValueError):
+        pass
+    return dict(expected, parts={})
+
+
+def _save_state(path: str, state: dict):
+    tmp_path = f"{path}.tmp-{threading.get_ident()}"
+    with open(tmp_path, "w") as f:
+        json.dump(state, f)
+    os.replace(tmp_path, path)
+
+
+def _report(n_bytes, n_parts, resumed_parts, start) -> dict:
+    seconds = time.perf_counter() - start
+    return {
+        "bytes": n_bytes,
+        "parts": n_parts,
+        "resumed_parts": resumed_parts,
+        "seconds": seconds,
+        "throughput_mb_s": n_bytes / 1024**2 / seconds if seconds else None,
+    }
+
+
+def _read_checksum(store, object_path: str, information: dict):
+    """sha256 stored by upload_file for the current version of the object,
+    None when there is none or when the object was uploaded again since
+    """
+    data = store.get(object_path + CHECKSUM_SUFFIX)
+    try:
+        checksum = json.loads(data)
+    except (TypeError, ValueError):
+        return None
+    if not isinstance(checksum, dict) or any(
+        checksum.get(key) != information[key] for key in ("size", "version")
+    ):
+        print(f"The checksum of {object_path} is not the one of its current version")
+        return None
+    return checksum.get("sha256")
+
+
+def _download_parts(
+    store, object_path, tmp_path, state, state_path, part_size, max_workers
+):
+    """Download the missing parts of the object into tmp_path"""
+    size = state["size"]
+    if not os.path.exists(tmp_path):
+        state["parts"] = {}
+    with open(tmp_path, "ab") as f:
+        f.truncate(size)
+    lock = threading.Lock()
+
+    def download_part(offset: int):
+        end = min(offset + part_size, size)
+        data = store.read_range(object_path, offset, end)
+        if len(data) != end - offset:
+            raise IOError(f"part {offset}-{end} of {object_path} is truncated")
+        with open(tmp_path, "r+b") as f:
+            f.seek(offset)
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        with lock:
+            state["parts"][str(offset)] = hashlib.md5(data).hexdigest()
+            _save_state(state_path, state)
+
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        todo = [
+            offset
+            for offset in range(0, size, part_size)
+            if str(offset) not in state["parts"]
+        ]
+        list(pool.map(download_part, todo))
+
+
+def _remove(*paths):
+    for path in paths:
+        if os.path.exists(path):
+            os.remove(path)
+
+
+def download_file(
+    store,
+    object_path: str,
+    local_path: str,
+    part_size: int = DEFAULT_PART_SIZE,
+    max_workers: int = DEFAULT_WORKERS,
+    information: dict = None,
+) -> dict:
+    """This function downloads an object by parts, in parallel, resuming a
+    previous interrupted download of the same object version. A store
+    without ranges, or ignoring them, downloads it in a single stream.
+
+    Args:
+        store: object store, e.g. SdkObjectStore or LocalObjectStore
+        object_path (str): path of the object in the store
+        local_path (str): path of the downloaded file
+        part_size (int): size of a range request, in bytes
+        max_workers (int): number of parts moved at once
+        information (dict): size and version of the object, when the
+            caller already has them
+
+    Returns:
+        dict: bytes, parts, resumed_parts, seconds, throughput_mb_s and
+            verified, True when the sha256 stored by upload_file for this
+            version of the object matched
+    """
+    start = time.perf_counter()
+    information = information or store.information(object_path)
+    if information is None:
+        raise FileNotFoundError(f"{object_path} is not in the datastore")
+    size = information["size"]
+    tmp_path, state_path = local_path + ".part", local_path + STATE_SUFFIX
+    n_parts, resumed_parts = 1, 0
+    ranges = getattr(store, "ranges", False) and size > 0
+    if ranges:
+        state = _load_state(
+            state_path,
+            {
+                "object": object_path,
+                "version": information["version"],
+                "size": size,
+                "part_size": part_size,
+            },
+        )
+        n_parts = len(range(0, size, part_size))
+        if os.path.exists(tmp_path):
+            resumed_parts = len(state["parts"])
+        try:
+            _download_parts(
+                store, object_path, tmp_path, state, state_path, part_size, max_workers
+            )
+        except RangeNotSupported:
+            print(f"Ranges not served for {object_path}, downloaded in one stream")
+            ranges = False
+            n_parts, resumed_parts = 1, 0
+    if not ranges:
+        _remove(state_path)
+        store.download(object_path, tmp_path)
+
+    expected = _read_checksum(store, object_path, information)
+    verified = expected is not None
+    if verified and _file_sha256(tmp_path) != expected:
+        _remove(tmp_path, state_path)
+        raise ValueError(f"checksum mismatch for {object_path}")
+    os.replace(tmp_path, local_path)
+    _remove(state_path)
+    report = _report(size, n_parts, resumed_parts, start)
+    report["verified"] = verified
+    return report
+
+
+def upload_file(
+    store,
+    local_path: str,
+    object_path: str,
+    part_size: int = DEFAULT_PART_SIZE,
+    max_workers: int = DEFAULT_WORKERS,
+) -> dict:
+    """This function uploads a file by parts, in parallel, resuming a
+    previous interrupted upload of the same file, then stores its sha256
+    and the version of the object at object_path + CHECKSUM_SUFFIX.
+    A store without multipart uploads uploads it in a single stream.
+
+    Args:
+        store: object store, e.g. SdkObjectStore or LocalObjectStore
+        local_path (str): path of the file to upload
+        object_path (str): path of the object in the store
+        part_size (int): size of a part, in bytes (at least 5MB on S3)
+        max_workers (int): number of parts moved at once
+
+    Returns:
+        dict: bytes, parts, resumed_parts, seconds, throughput_mb_s, sha256
+    """
+    start = time.perf_counter()
+    stat = os.stat(local_path)
+    size = stat.st_size
+    if getattr(store, "multipart", False):
+        state_path = local_path + STATE_SUFFIX
+        state = _load_state(
+            state_path,
+            {
+                "object": object_path,
+                "version": stat.st_mtime_ns,
+                "size": size,
+                "part_size": part_size,
+            },
+        )
+        if "upload" not in state:
+            state["upload"] = store.start_upload(object_path)
+            _save_state(state_path, state)
+        starts = range(0, max(size, 1), part_size)
+        resumed_parts = sum(str(i + 1) in state["parts"] for i in range(len(starts)))
+        lock = threading.Lock()
+
+        def upload_part(index: int):
+            offset = starts[index]
+            with open(local_path, "rb") as f:
+                f.seek(offset)
+                data = f.read(part_size)
+            last = index == len(starts) - 1
+            etag = store.upload_part(
+                object_path,
+                state["upload"],
+                index + 1,
+                data,
+                part_size,
+                size if last else None,
+            )
+            with lock:
+                state["parts"][str(index + 1)] = etag
+                _save_state(state_path, state)
+
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            todo = [i for i in range(len(starts)) if str(i + 1) not in state["parts"]]
+            list(pool.map(upload_part, todo))
+
+        store.complete_upload(object_path, state["upload"], state["parts"])
+        os.remove(state_path)
+        n_parts = len(starts)
+    else:
+        store.upload(local_path, object_path)
+        n_parts, resumed_parts = 1, 0
+
+    sha256 = _file_sha256(local_path)
+    information = store.information(object_path)
+    checksum = {"sha256": sha256, "size": size, "version": information["version"]}
+    store.put(object_path + CHECKSUM_SUFFIX, json.dumps(checksum).encode())
+    report = _report(size, n_parts, resumed_parts, start)
+    report["sha256"] = sha256
+    return report
+
+
+class TransferSdk:
+    """Drop-in wrapper of the sdk whose datastore downloads and uploads of
+    local files larger than a part go through download_file and upload_file.
+    Buffers, small objects and every other method use the sdk itself.
+
+    Args:
+        sdk: the CraftAiSdk
+        part_size (int): size of a part, in bytes
+        max_workers (int): number of parts moved at once
+        store: object store, SdkObjectStore(sdk) by default
+    """
+
+    def __init__(
+        self,
+        sdk,
+        part_size: int = DEFAULT_PART_SIZE,
+        max_workers: int = DEFAULT_WORKERS,
+        store=None,
+    ):
+        self.sdk = sdk
+        self.part_size = part_size
+        self.max_workers = max_workers
+        self.store = store or SdkObjectStore(sdk)
+        self.last_report = None
+
+    def __getattr__(self, name):
+        return getattr(self.sdk, name)
+
+    def download_data_store_object(self, object_path_in_datastore, filepath_or_buffer):
+        if not isinstance(filepath_or_buffer, str):
+            return self.sdk.download_data_store_object(
+                object_path_in_datastore, filepath_or_buffer
+            )
+        # one information call gives the size and the version of the object
+        information = self.store.information(object_path_in_datastore)
+        if information is None or information["size"] <= self.part_size:
+            return self.sdk.download_data_store_object(
+                object_path_in_datastore, filepath_or_buffer
+            )
+        self.last_report = download_file(
+            self.store,
+            object_path_in_datastore,
+            filepath_or_buffer,
+            self.part_size,
+            self.max_workers,
+            information=information,
+        )
+        print(f"Downloaded {object_path_in_datastore}: {self.last_report}")
+
+    def upload_data_store_object(self, filepath_or_buffer, object_path_in_datastore):
+        if not isinstance(filepath_or_buffer, str) or (
+            os.path.getsize(filepath_or_buffer) <= self.part_size
+        ):
+            # the checksum of a previous upload no longer matches the version
+            # of the object, so it is not checked
+            return self.sdk.upload_data_store_object(
+                filepath_or_buffer, object_path_in_datastore
+            )
+        self.last_report = upload_file(
+            self.store,
+            filepath_or_buffer,
+            object_path_in_datastore,
+            self.part_size,
+            self.max_workers,
+        )
+        print(f"Uploaded {object_path_in_datastore}: {self.last_report}")
@@ -0,0 +1,149 @@
+import base64
+import io
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+from src.batch_scoring import feature_names
+
+"""
+Compact payloads of the prediction endpoints.
+The rows to predict can be sent as:
+- "dict": {row id: {feature: value}}, the historical JSON format
+- "columns": {"columns": {feature: [values]}}, one array per feature
+- "arrow": {"arrow": base64 Arrow IPC stream}
+- "npy": {"npy": base64 .npy buffer of a 2D array, "features": [names]}
+The columnar formats are decoded straight into a NumPy matrix, without
+one Python object per row, and the predictions are sent back in the format
+of the request. The Arrow and NumPy buffers are binary, so they are base64
+encoded to travel inside the JSON body of the endpoint.
+"""
+
+FORMATS = ("dict", "columns", "arrow", "npy")
+
+
+def _b64decode(data: str) -> bytes:
+    return base64.b64decode(data, validate=True)
+
+
+def _b64encode(data) -> str:
+    return base64.b64encode(data).decode("ascii")
+
+
+def _arrow_to_columns(data: str) -> dict:
+    table = pa.ipc.open_stream(pa.py_buffer(_b64decode(data))).read_all()
+    return {name: table.column(name).to_numpy() for name in table.column_names}
+
+
+def _table_to_arrow(table: pa.Table) -> str:
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return _b64encode(sink.getvalue())
+
+
+def _npy_to_array(data: str) -> np.ndarray:
+    return np.load(io.BytesIO(_b64decode(data)), allow_pickle=False)
+
+
+def wire_format(input_data: dict) -> str:
+    """Format of the rows of a request"""
+    if isinstance(input_data.get("columns"), dict):
+        return "columns"
+    if isinstance(input_data.get("arrow"), str):
+        return "arrow"
+    if isinstance(input_data.get("npy"), str):
+        return "npy"
+    return "dict"
+
+
+def decode_features(input_data: dict, model=None) -> tuple:
+    """This function decodes the rows of a request in any of the FORMATS
+
+    Args:
+        input_data (dict): the input of the endpoint
+        model: fitted model, whose feature order is used when it knows it
+
+    Returns:
+        tuple: the rows to predict (a DataFrame for the dict format, a float
+            matrix otherwise) and the format of the request
+    """
+    fmt = wire_format(input_data)
+    if fmt == "dict":
+        return pd.DataFrame.from_dict(input_data, orient="index"), fmt
+    if fmt == "npy":
+        X = _npy_to_array(input_data["npy"])
+        if X.ndim != 2:
+            raise ValueError(f"npy rows must be a 2D array, not {X.ndim}D")
+        names = input_data.get("features")
+        if names is None or not hasattr(model, "feature_names_in_"):
+            return X.astype(np.float64, copy=False), fmt
+        # reorder the columns as the model was fitted
+        order = [names.index(name) for name in feature_names(model, names)]
+        return X[:, order].astype(np.float64, copy=False), fmt
+    if fmt == "arrow":
+        columns = _arrow_to_columns(input_data["arrow"])
+    else:
+        columns = input_data["columns"]
+    names = feature_names(model, list(columns))
+    X = np.column_stack([np.asarray(columns[name], dtype=np.float64) for name in names])
+    return X, fmt
+
+
+def encode_predictions(predictions: np.ndarray, fmt: str = "dict"):
+    """This function encodes the predictions in the format of the request:
+    a JSON list for the dict and columns formats, a base64 buffer otherwise
+    """
+    predictions = np.asarray(predictions)
+    if predictions.dtype.kind in "iu" and predictions.size:
+        # class ids fit in a byte or two
+        predictions = predictions.astype(
+            np.result_type(
+                np.min_scalar_type(predictions.min()),
+                np.min_scalar_type(predictions.max()),
+            )
+        )
+    if fmt == "arrow":
+        return {"arrow": _table_to_arrow(pa.table({"prediction": predictions}))}
+    if fmt == "npy":
+        buffer = io.BytesIO()
+        np.save(buffer, predictions, allow_pickle=False)
+        return {"npy": _b64encode(buffer.getbuffer())}
+    return predictions.tolist()
+
+
+def encode_features(df: pd.DataFrame, fmt: str, dtype=np.float64) -> dict:
+    """This function builds the input of a request from a DataFrame of
+    features, for the clients of the endpoint
+
+    Args:
+        df (pd.DataFrame): rows to predict
+        fmt (str): one of FORMATS
+        dtype: type of the values in the arrow and npy buffers, float32
+            halves their size when its precision is enough
+
+    Returns:
+        dict: the input_data of the request
+    """
+    if fmt == "dict":
+        return df.to_dict(orient="index")
+    if fmt == "columns":
+        return {"columns": {name: df[name].tolist() for name in df.columns}}
+    if fmt == "arrow":
+        table = pa.Table.from_pandas(df.astype(dtype), preserve_index=False)
+        return {"arrow": _table_to_arrow(table)}
+    if fmt == "npy":
+        buffer = io.BytesIO()
+        np.save(buffer, df.to_numpy(dtype=dtype), allow_pickle=False)
+        return {"npy": _b64encode(buffer.getbuffer()), "features": list(df.columns)}
+    raise ValueError(f"unknown format {fmt}, choose one of {FORMATS}")
+
+
+def decode_predictions(predictions) -> np.ndarray:
+    """Predictions of a response, whatever its format"""
+    if isinstance(predictions, dict) and "arrow" in predictions:
+        return _arrow_to_columns(predictions["arrow"])["prediction"]
+    if isinstance(predictions, dict) and "npy" in predictions:
+        return _npy_to_array(predictions["npy"])
+    return np.asarray(predictions)
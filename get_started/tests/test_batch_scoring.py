@@ -0,0 +1,40 @@
+import numpy as np
+import pandas as pd
+import pyarrow.parquet as pq
+from sklearn.neighbors import KNeighborsClassifier
+
+from src.batch_scoring import predict_columns, score_parquet_file
+
+COLUMNS = ["sepal length", "sepal width", "petal length", "petal width"]
+
+
+def fitted_model():
+    rng = np.random.default_rng(0)
+    X = pd.DataFrame(rng.uniform(0, 8, (60, 4)), columns=COLUMNS)
+    return KNeighborsClassifier().fit(X, rng.integers(0, 3, 60)), X
+
+
+def test_parquet_file_is_scored_in_chunks(tmp_path):
+    model, X = fitted_model()
+    X.to_parquet(tmp_path / "input.parquet")
+    output = str(tmp_path / "predictions.parquet")
+    rows = score_parquet_file(model, str(tmp_path / "input.parquet"), output, 7)
+    assert rows == 60
+    predictions = pq.read_table(output).column("prediction").to_numpy()
+    assert (predictions == model.predict(X)).all()
+
+
+def test_empty_parquet_file_gives_empty_predictions(tmp_path):
+    model, X = fitted_model()
+    X.iloc[:0].to_parquet(tmp_path / "input.parquet")
+    output = str(tmp_path / "predictions.parquet")
+    assert score_parquet_file(model, str(tmp_path / "input.parquet"), output) == 0
+    table = pq.read_table(output)
+    assert table.num_rows == 0
+    assert table.schema.field("prediction").type == "int64"
+
+
+def test_columns_are_predicted():
+    model, X = fitted_model()
+    columns = {name: X[name].tolist() for name in COLUMNS}
+    assert (predict_columns(model, columns, 7) == model.predict(X)).all()
@@ -0,0 +1,56 @@
+from cleanup import FakeSdk, clean, fake_tutorial_sdk, sidecar_prefix
+
+
+def tutorial_sdk():
+    return FakeSdk(
+        pipelines=["part-4-iristrain", "part-4-iris-deployment", "other"],
+        deployments={
+            "part-4-iris-deployment-deployment": "part-4-iris-deployment",
+            "other-deployment": "other",
+        },
+        objects=[
+            "get_started/models/iris_knn_model.joblib",
+            "get_started/models/iris_knn_model.joblib.sha256",
+            "get_started/models/iris_knn_model.joblib.train_state.json",
+            "get_started/dataset/iris.parquet",
+        ],
+        latency_s=0,
+    )
+
+
+def test_pipelines_are_deleted_with_their_deployments():
+    sdk = tutorial_sdk()
+    summary = clean(sdk, pipeline_prefixes=["part-4-"])
+    assert sdk.pipelines == {"other"}
+    assert sdk.deployments == {"other-deployment": "other"}
+    assert summary["pipelines_deleted"] == 2
+    assert summary["deployments_deleted"] == 1
+    assert summary["pipelines_failed"] == 0
+
+
+def test_sidecars_are_deleted_not_the_model():
+    sdk = tutorial_sdk()
+    clean(
+        sdk,
+        objects=["get_started/dataset/iris.parquet"],
+        object_prefixes=[sidecar_prefix("get_started/models/iris_knn_model.joblib")],
+    )
+    assert sdk.objects == {"get_started/models/iris_knn_model.joblib"}
+
+
+def test_missing_resources_are_reported_not_raised():
+    sdk = tutorial_sdk()
+    summary = clean(sdk, pipelines=["missing"], objects=["missing.joblib"])
+    assert summary["pipelines_failed"] == 1
+    assert summary["objects_failed"] == 1
+
+
+def test_dry_run_deletes_nothing():
+    sdk = fake_tutorial_sdk(latency_s=0, copies=2)
+    pipelines, objects = set(sdk.pipelines), set(sdk.objects)
+    summary = clean(
+        sdk, pipeline_prefixes=["part-"], object_prefixes=["get_started/"], dry_run=True
+    )
+    assert sdk.pipelines == pipelines and sdk.objects == objects
+    assert len(summary["plan"]["pipelines"]) == len(pipelines)
+    assert len(summary["plan"]["objects"]) == len(objects)
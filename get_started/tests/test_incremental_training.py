@@ -0,0 +1,168 @@
+import json
+import os
+import shutil
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from src import incremental_training
+from src.incremental_training import (
+    STATE_SUFFIX,
+    decode_array,
+    incremental_train,
+    rows_digest,
+)
+from src.mmap_artifacts import load_model, save_model
+from src.neighbors import make_knn
+
+DATASET_PATH = "get_started/dataset/iris.parquet"
+MODEL_PATH = "get_started/models/iris_knn_model.joblib"
+CONFIG = {"neighbors_backend": "brute"}
+
+
+class LocalSdk:
+    """Datastore methods of the sdk on a local folder"""
+
+    def __init__(self, root: str):
+        self.root = root
+
+    def path(self, object_path: str) -> str:
+        return os.path.join(self.root, object_path)
+
+    def get_data_store_object_information(self, object_path):
+        stat = os.stat(self.path(object_path))
+        return {"last_modified": stat.st_mtime_ns, "size": stat.st_size}
+
+    def download_data_store_object(self, object_path_in_datastore, filepath_or_buffer):
+        shutil.copyfile(self.path(object_path_in_datastore), filepath_or_buffer)
+
+    def upload_data_store_object(self, filepath_or_buffer, object_path_in_datastore):
+        path = self.path(object_path_in_datastore)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        shutil.copyfile(filepath_or_buffer, path)
+
+
+def make_rows(n_rows: int, seed: int) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    y = rng.integers(0, 3, n_rows)
+    X = rng.normal(size=(n_rows, 4)) + y[:, None]
+    df = pd.DataFrame(
+        X, columns=["sepal length", "sepal width", "petal length", "petal width"]
+    )
+    df["target"] = y
+    return df
+
+
+@pytest.fixture
+def run(tmp_path):
+    sdk = LocalSdk(str(tmp_path / "datastore"))
+    local_dataset = str(tmp_path / "iris.parquet")
+    local_model = str(tmp_path / "iris_knn_model.joblib")
+
+    def publish(df: pd.DataFrame):
+        os.makedirs(os.path.dirname(sdk.path(DATASET_PATH)), exist_ok=True)
+        df.to_parquet(sdk.path(DATASET_PATH))
+
+    def run(config=CONFIG):
+        def train():
+            df = pd.read_parquet(local_dataset)
+            X, y = df.drop(columns="target").values, df["target"].values
+            return make_knn(config["neighbors_backend"]).fit(X, y), X, y
+
+        report = incremental_train(
+            sdk,
+            train,
+            config,
+            DATASET_PATH,
+            MODEL_PATH,
+            local_dataset,
+            local_model,
+        )
+        # the output mapping of the deployment uploads the model
+        sdk.upload_data_store_object(local_model, MODEL_PATH)
+        return report
+
+    run.publish = publish
+    run.sdk = sdk
+    run.local_model = local_model
+    return run
+
+
+def test_runs_skip_update_or_train(run):
+    df = make_rows(500, seed=0)
+    run.publish(df)
+    assert run()["status"] == "trained"
+    assert os.path.exists(run.sdk.path(MODEL_PATH + STATE_SUFFIX))
+    assert run()["reason"] == "dataset object unchanged"
+    # the same rows uploaded again
+    run.publish(df)
+    assert run()["reason"] == "same rows in a new object"
+    appended = pd.concat([df, make_rows(50, seed=1)], ignore_index=True)
+    run.publish(appended)
+    report = run()
+    assert report["status"] == "incremental"
+    assert report["new_rows"] == 50
+    model = load_model(run.local_model)
+    assert 500 < model.n_samples_fit_ <= 550
+    modified = appended.copy()
+    modified.loc[3, "sepal length"] += 1
+    run.publish(modified)
+    assert run()["reason"] == "dataset changed"
+
+
+def test_new_parameters_train_a_new_model(run):
+    run.publish(make_rows(200, seed=0))
+    run()
+    report = run(config={"neighbors_backend": "kd_tree"})
+    assert report["status"] == "trained"
+
+
+def test_previous_model_not_matching_its_state_is_not_reused(run):
+    df = make_rows(200, seed=0)
+    run.publish(df)
+    run()
+    # another model was uploaded at the same path since
+    save_model(make_knn("brute").fit(np.zeros((3, 4)), [0, 1, 2]), run.local_model)
+    run.sdk.upload_data_store_object(run.local_model, MODEL_PATH)
+    assert run()["status"] == "trained"
+
+
+def test_rows_digest_does_not_depend_on_the_batches(tmp_path, monkeypatch):
+    path = str(tmp_path / "rows.parquet")
+    make_rows(100, seed=0).to_parquet(path)
+    n_rows, digest, prefix = rows_digest(path, prefix_rows=40)
+    monkeypatch.setattr(incremental_training, "DEFAULT_BATCH_SIZE", 7)
+    assert rows_digest(path, prefix_rows=40) == (n_rows, digest, prefix)
+    make_rows(100, seed=0).iloc[:40].to_parquet(path)
+    assert rows_digest(path)[1] == prefix
+
+
+def test_knn_is_extended_from_the_rows_of_its_state(run):
+    df = make_rows(300, seed=0)
+    run.publish(df)
+    run()
+    state_path = run.sdk.path(MODEL_PATH + STATE_SUFFIX)
+    with open(state_path) as f:
+        state = json.load(f)
+    assert len(decode_array(state["fitted_rows"]["y"])) == 300
+    run.publish(pd.concat([df, make_rows(40, seed=1)], ignore_index=True))
+    assert run()["status"] == "incremental"
+    with open(state_path) as f:
+        state = json.load(f)
+    model = load_model(run.local_model)
+    assert model.n_samples_fit_ == len(decode_array(state["fitted_rows"]["y"]))
+
+
+def test_state_without_the_knn_rows_trains_a_new_model(run):
+    df = make_rows(300, seed=0)
+    run.publish(df)
+    run()
+    state_path = run.sdk.path(MODEL_PATH + STATE_SUFFIX)
+    with open(state_path) as f:
+        state = json.load(f)
+    del state["fitted_rows"]
+    with open(state_path, "w") as f:
+        json.dump(state, f)
+    run.publish(pd.concat([df, make_rows(40, seed=1)], ignore_index=True))
+    assert run()["status"] == "trained"
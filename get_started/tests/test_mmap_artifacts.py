@@ -0,0 +1,49 @@
+import json
+
+import joblib
+import numpy as np
+import pytest
+from sklearn.neighbors import KNeighborsClassifier
+
+from src.mmap_artifacts import MANIFEST_SUFFIX, load_model, save_model
+
+
+def fitted_model():
+    rng = np.random.default_rng(0)
+    X = rng.uniform(0, 8, (50, 4))
+    return KNeighborsClassifier(algorithm="brute").fit(X, rng.integers(0, 3, 50)), X
+
+
+def test_saved_model_is_memory_mapped(tmp_path):
+    model, X = fitted_model()
+    path = str(tmp_path / "iris_knn.joblib")
+    save_model(model, path)
+    loaded = load_model(path)
+    assert isinstance(loaded._fit_X, np.memmap)
+    assert not loaded._fit_X.flags.writeable
+    assert (loaded.predict(X) == model.predict(X)).all()
+
+
+def test_manifest_describes_the_arrays(tmp_path):
+    model, _ = fitted_model()
+    path = str(tmp_path / "iris_knn.joblib")
+    manifest = save_model(model, path)
+    with open(path + MANIFEST_SUFFIX) as f:
+        assert json.load(f) == manifest
+    assert manifest["model_class"] == "KNeighborsClassifier"
+    assert manifest["arrays"]["_fit_X"] == {
+        "shape": [50, 4],
+        "dtype": "float64",
+        "nbytes": 50 * 4 * 8,
+    }
+
+
+# joblib warns that it ignores mmap_mode
+@pytest.mark.filterwarnings("ignore:mmap_mode")
+def test_compressed_model_is_loaded_without_mmap(tmp_path):
+    model, X = fitted_model()
+    path = str(tmp_path / "iris_knn.joblib")
+    joblib.dump(model, path, compress=3)
+    loaded = load_model(path)
+    assert not isinstance(loaded._fit_X, np.memmap)
+    assert (loaded.predict(X) == model.predict(X)).all()
@@ -0,0 +1,106 @@
+import hashlib
+import os
+import threading
+import time
+
+from src import model_cache
+from src.model_cache import ModelCache, file_version
+
+
+class VersionedStore:
+    """Models given by version, whose load takes load_s"""
+
+    def __init__(self, load_s: float = 0.0):
+        self.version = 1
+        self.load_s = load_s
+        self.loads = 0
+
+    def version_fn(self, object_path):
+        return self.version
+
+    def loader(self, sdk, object_path):
+        version = self.version
+        time.sleep(self.load_s)
+        self.loads += 1
+        return {"path": object_path, "version": version}
+
+
+def test_cached_model_is_reused_until_its_version_changes():
+    store = VersionedStore()
+    cache = ModelCache(
+        revalidate_after_s=0, loader=store.loader, version_fn=store.version_fn
+    )
+    assert cache.get("model.joblib")["version"] == 1
+    assert cache.get("model.joblib")["version"] == 1
+    assert store.loads == 1
+    store.version = 2
+    model, version = cache.get_versioned("model.joblib")
+    assert model["version"] == version == 2
+    assert store.loads == 2
+
+
+def test_previous_version_is_served_while_the_new_one_loads():
+    store = VersionedStore()
+    cache = ModelCache(
+        revalidate_after_s=0, loader=store.loader, version_fn=store.version_fn
+    )
+    cache.get("model.joblib")
+    store.version, store.load_s = 2, 0.3
+    swap = threading.Thread(target=cache.get, args=("model.joblib",))
+    swap.start()
+    time.sleep(0.05)
+    start = time.perf_counter()
+    model, version = cache.get_versioned("model.joblib")
+    assert time.perf_counter() - start < 0.1
+    assert model["version"] == version == 1
+    swap.join()
+    model, version = cache.get_versioned("model.joblib")
+    assert model["version"] == version == 2
+
+
+def test_model_and_version_come_from_the_same_entry():
+    store = VersionedStore()
+    cache = ModelCache(
+        revalidate_after_s=0, loader=store.loader, version_fn=store.version_fn
+    )
+    stop = threading.Event()
+
+    def publish():
+        while not stop.is_set():
+            store.version += 1
+
+    publisher = threading.Thread(target=publish)
+    publisher.start()
+    try:
+        for _ in range(200):
+            model, version = cache.get_versioned("model.joblib")
+            assert model["version"] == version
+    finally:
+        stop.set()
+        publisher.join()
+
+
+def test_file_version_hashes_the_file_only_when_it_changes(tmp_path, monkeypatch):
+    hashes = []
+
+    def counting_sha256(*args):
+        hashes.append(1)
+        return hashlib.new("sha256", *args)
+
+    monkeypatch.setattr(model_cache.hashlib, "sha256", counting_sha256)
+    path = str(tmp_path / "model.joblib")
+    with open(path, "wb") as f:
+        f.write(b"model 1")
+    first = file_version(path)
+    assert file_version(path) == first
+    assert len(hashes) == 1
+    # written again with the same content, like a file input: same version
+    with open(path, "wb") as f:
+        f.write(b"model 1")
+    os.utime(path, ns=(0, os.stat(path).st_mtime_ns + 1))
+    assert file_version(path) == first
+    assert len(hashes) == 2
+    with open(path, "wb") as f:
+        f.write(b"model 2")
+    os.utime(path, ns=(0, os.stat(path).st_mtime_ns + 2))
+    assert file_version(path) != first
@@ -0,0 +1,52 @@
+import numpy as np
+import pytest
+from sklearn.neighbors import KNeighborsClassifier
+
+from src.neighbors import BACKENDS, IVFKNeighborsClassifier, make_knn
+
+
+def blobs(n: int, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    y = rng.integers(0, 3, n)
+    X = rng.normal(0, 1, (n, 4)) + 3 * y[:, None]
+    return X, y
+
+
+@pytest.mark.parametrize("backend", BACKENDS)
+def test_every_backend_predicts(backend):
+    X, y = blobs(300)
+    X_test, y_test = blobs(100, seed=1)
+    knn = make_knn(backend, leaf_size=10).fit(X, y)
+    assert (knn.predict(X_test) == y_test).mean() > 0.9
+
+
+def test_backend_parameters():
+    knn = make_knn("kd_tree", leaf_size=10, n_neighbors=3)
+    assert (knn.algorithm, knn.leaf_size, knn.n_neighbors) == ("kd_tree", 10, 3)
+    assert make_knn("ivf", n_probe=2).n_probe == 2
+    with pytest.raises(ValueError, match="unknown backend"):
+        make_knn("hnsw")
+
+
+def test_ivf_probing_every_list_is_exact():
+    X, y = blobs(400)
+    X_test, _ = blobs(50, seed=1)
+    ivf = IVFKNeighborsClassifier(n_lists=8, n_probe=8).fit(X, y)
+    exact = KNeighborsClassifier(algorithm="brute").fit(X, y)
+    distances, _ = ivf.kneighbors(X_test)
+    exact_distances, _ = exact.kneighbors(X_test)
+    assert np.allclose(np.sort(np.sqrt(distances), 1), exact_distances)
+    assert (ivf.predict(X_test) == exact.predict(X_test)).all()
+
+
+def test_ivf_partial_fit_adds_points_to_the_lists():
+    X, y = blobs(400)
+    X_test, _ = blobs(50, seed=1)
+    ivf = IVFKNeighborsClassifier(n_lists=8, n_probe=8).fit(X[:300], y[:300])
+    centroids = ivf.centroids_.copy()
+    ivf.partial_fit(X[300:], y[300:])
+    # the clusters are kept, the lists cover all the points
+    assert (ivf.centroids_ == centroids).all()
+    assert ivf.list_offsets_[-1] == 400
+    exact = KNeighborsClassifier(algorithm="brute").fit(X, y)
+    assert (ivf.predict(X_test) == exact.predict(X_test)).all()
@@ -0,0 +1,58 @@
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pytest
+
+from src.streaming_training import iter_batches, train_streaming, validation_mask
+
+FEATURES = ["sepal length", "sepal width", "petal length", "petal width"]
+
+
+@pytest.fixture
+def parquet_path(tmp_path):
+    rng = np.random.default_rng(0)
+    y = rng.integers(0, 3, 1000)
+    data = pd.DataFrame(rng.normal(0, 1, (1000, 4)) + 3 * y[:, None], columns=FEATURES)
+    data["target"] = y
+    path = str(tmp_path / "iris.parquet")
+    # several row groups, read one at a time
+    pq.write_table(pa.Table.from_pandas(data), path, row_group_size=300)
+    return path
+
+
+def test_validation_split_is_deterministic():
+    row_ids = np.arange(100000)
+    mask = validation_mask(row_ids, 0.2)
+    assert abs(mask.mean() - 0.2) < 0.01
+    # a row keeps its set whatever the batch it is read in
+    assert (validation_mask(row_ids[5000:6000], 0.2) == mask[5000:6000]).all()
+    assert (validation_mask(row_ids, 0.2, seed=1) != mask).any()
+
+
+def test_batches_cover_the_rows_in_order(parquet_path):
+    batches = list(iter_batches(parquet_path, FEATURES, "target", batch_size=128))
+    row_ids = np.concatenate([row_ids for row_ids, _, _ in batches])
+    assert (row_ids == np.arange(1000)).all()
+    assert max(len(y) for _, _, y in batches) == 128
+    X = np.concatenate([X for _, X, _ in batches])
+    assert (X == pd.read_parquet(parquet_path)[FEATURES].to_numpy()).all()
+
+
+@pytest.mark.parametrize("estimator", ["sgd", "perceptron", "naive_bayes"])
+def test_streaming_training(parquet_path, estimator):
+    model, report = train_streaming(parquet_path, estimator=estimator, batch_size=128)
+    assert report["train_rows"] + report["val_rows"] == 1000
+    assert report["mean_accuracy"] > 0.9
+    assert model.predict(np.array([[0.0, 0.0, 0.0, 0.0]])) == [0]
+
+
+def test_split_does_not_depend_on_the_batch_size(parquet_path):
+    _, small = train_streaming(parquet_path, epochs=1, batch_size=64)
+    _, large = train_streaming(parquet_path, epochs=1, batch_size=1000)
+    assert small["val_rows"] == large["val_rows"]
+
+
+def test_unknown_estimator(parquet_path):
+    with pytest.raises(ValueError, match="unknown estimator"):
+        train_streaming(parquet_path, estimator="knn")
@@ -0,0 +1,139 @@
+import os
+
+import pytest
+
+from src.transfers import (
+    CHECKSUM_SUFFIX,
+    STATE_SUFFIX,
+    LocalObjectStore,
+    TransferSdk,
+    download_file,
+    upload_file,
+)
+
+PART_SIZE = 1024
+
+
+class FlakyStore(LocalObjectStore):
+    """Store whose connection breaks after a number of range requests"""
+
+    def __init__(self, *args, fail_after: int, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.fail_after = fail_after
+        self.ranges_read = 0
+
+    def read_range(self, object_path, start, end):
+        if self.fail_after <= 0:
+            raise ConnectionError("connection lost")
+        self.fail_after -= 1
+        self.ranges_read += 1
+        return super().read_range(object_path, start, end)
+
+
+class PlainSdk:
+    """Datastore calls of the sdk, on the same folder as the store"""
+
+    def __init__(self, store):
+        self.store = store
+
+    def download_data_store_object(self, object_path_in_datastore, filepath_or_buffer):
+        self.store.download(object_path_in_datastore, filepath_or_buffer)
+
+    def upload_data_store_object(self, filepath_or_buffer, object_path_in_datastore):
+        self.store.upload(filepath_or_buffer, object_path_in_datastore)
+
+
+@pytest.fixture
+def local_file(tmp_path):
+    path = tmp_path / "artifact.bin"
+    path.write_bytes(os.urandom(10 * PART_SIZE + 100))
+    return str(path)
+
+
+def test_round_trip_is_verified(tmp_path, local_file):
+    store = LocalObjectStore(str(tmp_path / "store"))
+    upload = upload_file(store, local_file, "models/a.bin", PART_SIZE, 4)
+    assert upload["parts"] == 11
+    downloaded = str(tmp_path / "downloaded.bin")
+    report = download_file(store, "models/a.bin", downloaded, PART_SIZE, 4)
+    assert report["verified"]
+    with open(downloaded, "rb") as f, open(local_file, "rb") as original:
+        assert f.read() == original.read()
+    assert not os.path.exists(downloaded + STATE_SUFFIX)
+
+
+def test_interrupted_download_resumes(tmp_path, local_file):
+    store = LocalObjectStore(str(tmp_path / "store"))
+    upload_file(store, local_file, "models/a.bin", PART_SIZE, 4)
+    flaky = FlakyStore(store.root, fail_after=4)
+    downloaded = str(tmp_path / "downloaded.bin")
+    with pytest.raises(ConnectionError):
+        download_file(flaky, "models/a.bin", downloaded, PART_SIZE, 1)
+    flaky.fail_after, flaky.ranges_read = 100, 0
+    report = download_file(flaky, "models/a.bin", downloaded, PART_SIZE, 1)
+    assert report["resumed_parts"] == 4
+    assert flaky.ranges_read == 7
+    assert report["verified"]
+
+
+def test_checksum_of_a_previous_version_is_not_checked(tmp_path, local_file):
+    store = LocalObjectStore(str(tmp_path / "store"))
+    upload_file(store, local_file, "models/a.bin", PART_SIZE, 4)
+    # uploaded again without the checksum, like the plain sdk does
+    store.put("models/a.bin", os.urandom(5 * PART_SIZE))
+    downloaded = str(tmp_path / "downloaded.bin")
+    report = download_file(store, "models/a.bin", downloaded, PART_SIZE, 4)
+    assert not report["verified"]
+    assert os.path.getsize(downloaded) == 5 * PART_SIZE
+
+
+def test_plain_upload_of_transfer_sdk_then_chunked_download(tmp_path, local_file):
+    store = LocalObjectStore(str(tmp_path / "store"))
+    upload_file(store, local_file, "models/a.bin", PART_SIZE, 4)
+    # a file smaller than its part size goes through the plain sdk upload
+    large_parts = TransferSdk(PlainSdk(store), part_size=100 * PART_SIZE, store=store)
+    with open(local_file, "wb") as f:
+        f.write(os.urandom(12 * PART_SIZE))
+    large_parts.upload_data_store_object(local_file, "models/a.bin")
+    sdk = TransferSdk(PlainSdk(store), part_size=PART_SIZE, store=store)
+    sdk.download_data_store_object("models/a.bin", str(tmp_path / "downloaded.bin"))
+    assert sdk.last_report["parts"] == 12
+    assert not sdk.last_report["verified"]
+
+
+def test_corrupted_download_is_rejected(tmp_path, local_file):
+    store = LocalObjectStore(str(tmp_path / "store"))
+    upload_file(store, local_file, "models/a.bin", PART_SIZE, 4)
+    information = store.information("models/a.bin")
+    # same size and version, different content
+    checksum = store.get("models/a.bin" + CHECKSUM_SUFFIX)
+    checksum = checksum.replace(b'"sha256": "', b'"sha256": "0')
+    store.put("models/a.bin" + CHECKSUM_SUFFIX, checksum)
+    downloaded = str(tmp_path / "downloaded.bin")
+    with pytest.raises(ValueError, match="checksum mismatch"):
+        download_file(
+            store, "models/a.bin", downloaded, PART_SIZE, 4, information=information
+        )
+    assert not os.path.exists(downloaded + ".part")
+
+
+def test_empty_object(tmp_path):
+    store = LocalObjectStore(str(tmp_path / "store"))
+    empty = tmp_path / "empty.bin"
+    empty.write_bytes(b"")
+    upload_file(store, str(empty), "models/empty.bin", PART_SIZE, 4)
+    downloaded = str(tmp_path / "downloaded.bin")
+    report = download_file(store, "models/empty.bin", downloaded, PART_SIZE, 4)
+    assert report["bytes"] == 0 and report["verified"]
+    assert os.path.getsize(downloaded) == 0
+
+
+def test_ignored_ranges_fall_back_to_one_stream(tmp_path, local_file):
+    store = LocalObjectStore(str(tmp_path / "store"))
+    upload_file(store, local_file, "models/a.bin", PART_SIZE, 4)
+    no_ranges = LocalObjectStore(store.root, ranges=False)
+    downloaded = str(tmp_path / "downloaded.bin")
+    report = download_file(no_ranges, "models/a.bin", downloaded, PART_SIZE, 1)
+    assert report["parts"] == 1 and report["verified"]
+    with open(downloaded, "rb") as f, open(local_file, "rb") as original:
+        assert f.read() == original.read()
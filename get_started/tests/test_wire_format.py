@@ -0,0 +1,75 @@
+import base64
+import binascii
+import io
+import json
+
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn.neighbors import KNeighborsClassifier
+
+from src.wire_format import (
+    FORMATS,
+    decode_features,
+    decode_predictions,
+    encode_features,
+    encode_predictions,
+)
+
+COLUMNS = ["sepal length", "sepal width", "petal length", "petal width"]
+
+
+def fitted_model():
+    rng = np.random.default_rng(0)
+    X = pd.DataFrame(rng.uniform(0, 8, (30, 4)), columns=COLUMNS)
+    return KNeighborsClassifier().fit(X, rng.integers(0, 3, 30)), X
+
+
+@pytest.mark.parametrize("fmt", FORMATS)
+def test_features_round_trip(fmt):
+    model, X = fitted_model()
+    # the request goes through the JSON body of the endpoint
+    input_data = json.loads(json.dumps(encode_features(X, fmt)))
+    decoded, decoded_fmt = decode_features(input_data, model)
+    assert decoded_fmt == fmt
+    assert np.allclose(np.asarray(decoded, dtype=np.float64), X.to_numpy())
+
+
+@pytest.mark.parametrize("fmt", ["columns", "arrow", "npy"])
+def test_columns_are_ordered_as_the_model_was_fitted(fmt):
+    model, X = fitted_model()
+    shuffled = X[COLUMNS[::-1]]
+    decoded, _ = decode_features(encode_features(shuffled, fmt), model)
+    assert np.allclose(decoded, X.to_numpy())
+
+
+@pytest.mark.parametrize("fmt", FORMATS)
+def test_predictions_round_trip(fmt):
+    predictions = np.array([0, 2, 1, 1])
+    encoded = json.loads(json.dumps(encode_predictions(predictions, fmt)))
+    assert (decode_predictions(encoded) == predictions).all()
+
+
+def test_class_ids_are_sent_in_a_byte():
+    encoded = encode_predictions(np.array([0, 2, 1], dtype=np.int64), "npy")
+    buffer = io.BytesIO(base64.b64decode(encoded["npy"]))
+    assert np.load(buffer).dtype == np.uint8
+
+
+def test_float32_buffers():
+    _, X = fitted_model()
+    input_data = encode_features(X, "npy", dtype=np.float32)
+    decoded, _ = decode_features(input_data)
+    assert decoded.dtype == np.float64
+    assert np.allclose(decoded, X.to_numpy(), atol=1e-5)
+
+
+def test_invalid_payloads():
+    buffer = io.BytesIO()
+    np.save(buffer, np.zeros(4))
+    with pytest.raises(ValueError, match="2D array"):
+        decode_features({"npy": base64.b64encode(buffer.getvalue()).decode()})
+    with pytest.raises(binascii.Error):
+        decode_features({"npy": "not base64!"})
+    with pytest.raises(ValueError, match="unknown format"):
+        encode_features(pd.DataFrame(), "csv")